@@ -0,0 +1,84 @@
+"""ノード指標ベンチマーク: NetworkX バックエンド vs 疎行列バックエンド.
+
+Usage:
+    python benchmarks/bench_analytics_backend.py [ユーザー数 ...]
+
+同じグラフから両バックエンドで degree centrality・重み付き次数・PageRank を
+計算し、許容誤差内で一致すること (無向グラフの構造も同じであること) を
+確認したうえで、所要時間とピークメモリ (tracemalloc) を比較する。
+PageRank は両バックエンドで同じ実装 (pagerank_coo) のため、REFERENCE_MAX_NODES 以下の
+グラフでは nx.google_matrix (密行列) のべき乗法とも突き合わせる。
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import networkx as nx
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_build_graph import synthetic_dataframe  # noqa: E402
+from core import build_graph  # noqa: E402
+from graph_metrics import (  # noqa: E402
+    PAGERANK_ALPHA, PAGERANK_MAX_ITER, PAGERANK_TOL, SparseGraph, _edge_weight, networkx_metrics,
+)
+
+PAGERANK_RTOL = 1e-4
+# 密行列の参照 PageRank を計算するノード数の上限 (O(n²) のメモリを使う)
+REFERENCE_MAX_NODES = 2000
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def assert_same_metrics(expected, actual):
+    assert expected.nodes == actual.nodes, "node order mismatch"
+    np.testing.assert_allclose(actual.degree_centrality, expected.degree_centrality, rtol=1e-12)
+    np.testing.assert_array_equal(actual.weighted_degree, expected.weighted_degree)
+    np.testing.assert_allclose(actual.pagerank, expected.pagerank, rtol=PAGERANK_RTOL, atol=1e-9)
+    assert list(expected.undirected.edges) == list(actual.undirected.edges), "undirected edge mismatch"
+
+
+def reference_pagerank(G) -> np.ndarray:
+    weighted = nx.DiGraph()
+    weighted.add_nodes_from(G)
+    weighted.add_weighted_edges_from((u, v, _edge_weight(d)) for u, v, d in G.edges(data=True))
+    google = nx.google_matrix(weighted, alpha=PAGERANK_ALPHA, nodelist=list(G))
+    n = len(G)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_MAX_ITER):
+        previous = rank
+        rank = previous @ google
+        if np.abs(rank - previous).sum() < n * PAGERANK_TOL:
+            break
+    return np.asarray(rank, dtype=float).ravel()
+
+
+def main(user_counts):
+    print(f"{'users':>8} {'nodes':>8} {'edges':>9} {'networkx [s]':>13} {'[MB]':>7} {'sparse [s]':>11} {'[MB]':>7}")
+    for n_users in user_counts:
+        G = build_graph(synthetic_dataframe(n_users * 20, n_users=n_users))
+        expected, nx_time, nx_mem = measure(lambda: networkx_metrics(G))
+        actual, sp_time, sp_mem = measure(lambda: SparseGraph(G).metrics())
+        assert_same_metrics(expected, actual)
+        if G.number_of_nodes() <= REFERENCE_MAX_NODES:
+            np.testing.assert_allclose(expected.pagerank, reference_pagerank(G), rtol=PAGERANK_RTOL, atol=1e-9)
+        print(
+            f"{n_users:>8} {G.number_of_nodes():>8} {G.number_of_edges():>9} "
+            f"{nx_time:>13.3f} {nx_mem:>7.1f} {sp_time:>11.3f} {sp_mem:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [500, 2_000, 5_000])
@@ -0,0 +1,139 @@
+"""build_graph ベンチマーク: 旧 iterrows ループ vs ベクトル化版.
+
+Usage:
+    python benchmarks/bench_build_graph.py [レコード数 ...]
+
+旧実装 (1 行ずつ parse_address_field + G.has_edge) をここに保持し、
+同じ DataFrame から構築したグラフがノード・エッジの属性と順序まで
+一致することを確認したうえで所要時間を比較する。
+"""
+
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import networkx as nx
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import build_graph, load_config_from_env, parse_address_field  # noqa: E402
+
+
+def build_graph_iterrows(df: pd.DataFrame, config: dict | None = None, domain_map: dict | None = None) -> nx.DiGraph:
+    """ベクトル化前の build_graph (比較用の基準実装)."""
+    if config is None:
+        config = load_config_from_env()
+    if domain_map is None:
+        domain_map = {}
+
+    G = nx.DiGraph()
+    company_domains = [d.lower() for d in config.get("company_domains", [])]
+
+    node_stats = defaultdict(lambda: {
+        "name": "", "email": "", "domain": "",
+        "sent": 0, "received": 0, "cc_count": 0,
+    })
+
+    for _, row in df.iterrows():
+        from_id = str(row.get("from_email", "")).strip()
+        from_name = str(row.get("from_name", "")).strip() if pd.notna(row.get("from_name")) else ""
+
+        if not from_id:
+            continue
+
+        from_domain = str(row.get("from_domain", "")).strip() if pd.notna(row.get("from_domain")) else ""
+
+        node_stats[from_id]["name"] = from_name or node_stats[from_id]["name"]
+        node_stats[from_id]["email"] = from_id
+        if from_domain:
+            node_stats[from_id]["domain"] = from_domain
+        node_stats[from_id]["sent"] += 1
+
+        for kind, stat_key, weight_key in (
+            ("to", "received", "to_weight"), ("cc", "cc_count", "cc_weight"),
+        ):
+            for addr_id, addr_name in parse_address_field(row.get(kind, "")):
+                node_stats[addr_id]["name"] = addr_name or node_stats[addr_id]["name"]
+                node_stats[addr_id]["email"] = addr_id
+                if addr_id in domain_map and not node_stats[addr_id]["domain"]:
+                    node_stats[addr_id]["domain"] = domain_map[addr_id]
+                node_stats[addr_id][stat_key] += 1
+
+                if G.has_edge(from_id, addr_id):
+                    G[from_id][addr_id][weight_key] += 1
+                else:
+                    G.add_edge(from_id, addr_id, to_weight=int(kind == "to"), cc_weight=int(kind == "cc"))
+
+    for node_id, stats in node_stats.items():
+        if node_id in G.nodes:
+            domain = stats.get("domain", "")
+            if company_domains:
+                is_internal = any(domain.endswith(d) for d in company_domains)
+            else:
+                is_internal = True
+            G.nodes[node_id].update({
+                "name": stats["name"] or node_id,
+                "email": node_id,
+                "domain": domain,
+                "is_internal": is_internal,
+                "sent": stats["sent"],
+                "received": stats["received"],
+                "cc_count": stats["cc_count"],
+            })
+    return G
+
+
+def synthetic_dataframe(n_records: int, n_users: int = 500, seed: int = 42) -> pd.DataFrame:
+    """Slack 変換後と同じ形式の DataFrame をランダム生成する (送信者は Zipf 風に偏らせる)."""
+    rng = random.Random(seed)
+    users = [f"U{i:05d}" for i in range(n_users)]
+    weights = [1.0 / (i + 1) for i in range(n_users)]
+    domains = {u: rng.choice(["example.co.jp", "partner.com", ""]) for u in users}
+
+    def addresses(k, exclude):
+        picked = {u for u in rng.choices(users, weights=weights, k=k) if u != exclude}
+        return "; ".join(f"Name {u} <{u}>" for u in picked)
+
+    rows = []
+    for _ in range(n_records):
+        sender = rng.choices(users, weights=weights)[0]
+        rows.append({
+            "date": "2025-01-01 00:00:00",
+            "from_email": sender,
+            "from_name": f"Name {sender}",
+            "from_domain": domains[sender],
+            "to": addresses(rng.choice([0, 1, 1, 2, 3, 5]), sender),
+            "cc": addresses(rng.choice([0, 0, 1, 2]), sender),
+            "subject": "",
+        })
+    return pd.DataFrame(rows)
+
+
+def assert_same_graph(expected: nx.DiGraph, actual: nx.DiGraph):
+    assert list(expected.nodes(data=True)) == list(actual.nodes(data=True)), "node mismatch"
+    assert list(expected.edges(data=True)) == list(actual.edges(data=True)), "edge mismatch"
+
+
+def main(sizes):
+    config = load_config_from_env()
+    print(f"{'records':>10} {'iterrows [s]':>14} {'vectorized [s]':>16} {'speedup':>9}")
+    for n in sizes:
+        df = synthetic_dataframe(n)
+
+        start = time.perf_counter()
+        expected = build_graph_iterrows(df, config)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        actual = build_graph(df, config)
+        vec_time = time.perf_counter() - start
+
+        assert_same_graph(expected, actual)
+        print(f"{n:>10} {loop_time:>14.3f} {vec_time:>16.3f} {loop_time / vec_time:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1_000, 10_000, 100_000])
@@ -0,0 +1,95 @@
+"""エクスポート取り込みのベンチマーク: 合成ワークスペースの ZIP を slack_export で読み込む.
+
+Usage:
+    python benchmarks/bench_export.py [--channels 8] [--users 500] [--messages 20000]
+        [--workers 1,4] [--keep export.zip]
+
+synthetic_slack.write_export でチャンネルごとに合成したワークスペースをエクスポート
+形式の ZIP に書き出し、ワーカー数ごとに load_export (DataFrame) と aggregate_export
+(GraphAccumulator) の所要時間と、親プロセスで tracemalloc により計測したピークメモリを
+表示する (子プロセス内のメモリは含まない)。ワーカー数によらず結果が同じことも確認する。
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+_BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(_BENCH_DIR))
+sys.path.insert(0, _BENCH_DIR)
+
+from slack_export import aggregate_export, load_export  # noqa: E402
+from synthetic_slack import generate_workspace, write_export  # noqa: E402
+
+END_TS = 1_700_000_000.0
+
+
+def measure(fn):
+    """所要時間とピークメモリ (別の実行で計測する。tracemalloc 中は処理が遅くなり、fork した子にも引き継がれるため)"""
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak_mb
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=20_000, help="top-level messages per channel")
+    parser.add_argument("--workers", default="1,4", help="comma-separated worker counts")
+    parser.add_argument("--keep", default=None, help="write the export ZIP here and keep it")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    channels = {
+        f"channel-{i}": generate_workspace(
+            n_users=args.users, n_messages=args.messages, end_ts=END_TS, seed=args.seed + i,
+        )
+        for i in range(args.channels)
+    }
+    path = args.keep or os.path.join(tempfile.mkdtemp(), "export.zip")
+    start = time.perf_counter()
+    write_export(path, channels)
+    messages = sum(len(ws.messages) + ws.n_replies for ws in channels.values())
+    print(
+        f"\nexport: {args.channels} channels / {messages} messages, "
+        f"{os.path.getsize(path) / 1024 / 1024:.1f} MB ({time.perf_counter() - start:.1f}s to write)"
+    )
+
+    print(f"  {'mode':<10} {'workers':>7} {'time [s]':>9} {'msgs/s':>9} {'peak [MB]':>10} {'records':>9}")
+    reference = {}
+    failed = False
+    for workers in (int(w) for w in args.workers.split(",")):
+        for mode, fn in (("dataframe", load_export), ("aggregate", aggregate_export)):
+            result, seconds, peak_mb = measure(lambda: fn(path, workers=workers))
+            if mode == "dataframe":
+                records, signature = len(result[0]), result[0]
+            else:
+                records, signature = result[0].total_records, result[0].edge_weights
+            if mode not in reference:
+                reference[mode] = signature
+            elif not (signature.equals(reference[mode]) if mode == "dataframe" else signature == reference[mode]):
+                print(f"  {mode} result with {workers} workers differs from the first run")
+                failed = True
+            print(
+                f"  {mode:<10} {workers:>7} {seconds:>9.2f} {messages / max(seconds, 1e-9):>9.0f}"
+                f" {peak_mb:>10.1f} {records:>9}"
+            )
+
+    if not args.keep:
+        os.remove(path)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""取得処理のベンチマーク: ローカルの Slack API 代替サーバーに対して履歴・スレッド取得を計測.
+
+Usage:
+    python benchmarks/bench_fetch.py [--users 300] [--messages 5000] [--latency 0.02]
+        [--rate-scale 100] [--overdrive 1.0] [--failure-rate 0] [--thread-workers 4] [--profile]
+
+fake_slack_api.FakeSlackServer を起動し、Bot の WebClient を
+MENTION_MAP_SLACK_API_URL で向けてから slack-mention-map.py を import する。
+fetch_messages_with_threads (conversations.history + replies) と build_dataframe
+(users.info による名前解決) の所要時間・スループットと、サーバー側の呼び出し数・429・
+注入した失敗の数、rate limiter の累積待機時間を表示する。
+
+  --rate-scale  サーバーの上限 (Slack の tier) と Bot の予算 (MENTION_MAP_RATE_BUDGETS) を
+                同じ倍率で増やす (1 で実際の Slack と同じ。既定は短時間で終わるよう 100)。
+                サーバーの判定ウィンドウも 60 / rate-scale 秒 (最短 1 秒) に縮める
+  --overdrive   Bot の予算をサーバーの上限の何倍にするか (1 を超えると 429 が増える)
+  --profile     プロファイル付きの実行 (profile_run) の中でストリーミング取得
+                (stream_channel_records) も行い、終わらない・件数が一括取得と違う・
+                スレッド応答の取得がプロファイルに無い場合は終了コード 1 を返す
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+_REPO_DIR = os.path.dirname(_BENCH_DIR)
+sys.path.insert(0, _REPO_DIR)
+sys.path.insert(0, _BENCH_DIR)
+
+from fake_slack_api import DEFAULT_RATE_LIMITS, FakeSlackApi, FakeSlackServer, build_channels  # noqa: E402
+from profiling import ProfileStore  # noqa: E402
+
+# プロファイル付きのストリーミング取得がこの秒数で終わらなければ失敗 (止まったとみなす)
+STREAM_TIMEOUT = 300
+
+
+def load_bot(api_url: str, budgets: dict, thread_workers: int):
+    """環境変数で代替サーバー・予算を設定して slack-mention-map.py を import し、init_app で初期化する."""
+    os.environ.update({
+        "SLACK_BOT_TOKEN": "xoxb-fake",
+        "SLACK_APP_TOKEN": "xapp-fake",
+        "MENTION_MAP_SLACK_API_URL": api_url,
+        "MENTION_MAP_USER_CACHE": "off",
+        "MENTION_MAP_MESSAGE_STORE": "",
+        "MENTION_MAP_RATE_BUDGETS": ",".join(f"{m}={n:g}" for m, n in budgets.items()),
+        "MENTION_MAP_THREAD_WORKERS": str(thread_workers),
+    })
+    spec = importlib.util.spec_from_file_location("slack_mention_map", os.path.join(_REPO_DIR, "slack-mention-map.py"))
+    bot = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(bot)
+    bot.init_app()
+    return bot
+
+
+def profiled_stream(bot, client, channel_id, oldest: str) -> dict | None:
+    """プロファイル付きの実行の中で stream_channel_records を呼ぶ (STREAM_TIMEOUT 秒で終わらなければ None).
+
+    Returns:
+        {"messages", "replies", "seconds", "profiled_replies"}: profiled_replies は
+        スレッド応答の取得 (_fetch_thread_replies) が CPU プロファイルに含まれているか
+    """
+    result = {}
+
+    def stream():
+        with tempfile.TemporaryDirectory(prefix="bench-profile-") as directory:
+            start = time.perf_counter()
+            with bot.start_run("channel") as run, bot.profile_run(
+                run, ProfileStore(directory), "bench-stream", True,
+            ) as profiler:
+                result["messages"], result["replies"] = bot.stream_channel_records(
+                    client, channel_id, float(oldest), bot.GraphAccumulator(), {},
+                )
+            result["seconds"] = time.perf_counter() - start
+            result["profiled_replies"] = any(
+                func[2] == "_fetch_thread_replies" for func in profiler.cpu_stats().stats
+            )
+
+    thread = threading.Thread(target=stream, name="bench-stream", daemon=True)
+    thread.start()
+    thread.join(STREAM_TIMEOUT)
+    return None if thread.is_alive() else result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=300)
+    parser.add_argument("--messages", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.005)
+    parser.add_argument("--rate-scale", type=float, default=100.0)
+    parser.add_argument("--overdrive", type=float, default=1.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--thread-workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profile", action="store_true", help="also run a profiled streaming fetch and check it")
+    args = parser.parse_args(argv)
+
+    end_ts = time.time()
+    channels = build_channels(1, n_users=args.users, n_messages=args.messages, days=args.days, end_ts=end_ts, seed=args.seed)
+    channel_id, workspace = next(iter(channels.items()))
+    limits = {method: n * args.rate_scale for method, n in DEFAULT_RATE_LIMITS.items()}
+    api = FakeSlackApi(
+        channels, latency=args.latency, jitter=args.jitter,
+        rate_limits=limits, failure_rate=args.failure_rate,
+        window=max(1.0, 60.0 / args.rate_scale), seed=args.seed,
+    )
+    server = FakeSlackServer(api).start()
+    try:
+        budgets = {method: n * args.overdrive for method, n in limits.items()}
+        # 進捗投稿などの予算外のメソッドは待たせない
+        budgets["chat.postMessage"] = 60 * args.rate_scale
+        bot = load_bot(server.url, budgets, args.thread_workers)
+        client = bot.app.client
+        oldest = str(end_ts - (args.days + 1) * 24 * 60 * 60)
+        before = api.snapshot()
+
+        start = time.perf_counter()
+        messages, thread_messages = bot.fetch_messages_with_threads(client, channel_id, oldest)
+        fetch_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        df = bot.build_dataframe(messages, thread_messages, client, {})
+        convert_seconds = time.perf_counter() - start
+        after = api.snapshot()
+
+        streamed = profiled_stream(bot, client, channel_id, oldest) if args.profile else None
+    finally:
+        server.stop()
+
+    replies = sum(len(v) for v in thread_messages.values())
+    print(
+        f"\nworkload: users {args.users} / messages {len(workspace.messages)} + replies {workspace.n_replies}"
+        f" (latency {args.latency * 1000:.0f}ms, rate x{args.rate_scale:g}, overdrive {args.overdrive:g},"
+        f" failure rate {args.failure_rate:g})"
+    )
+    print(
+        f"fetch:   {fetch_seconds:7.2f}s  messages {len(messages)}/{len(workspace.messages)}"
+        f"  replies {replies}/{workspace.n_replies}"
+        f"  ({(len(messages) + replies) / max(fetch_seconds, 1e-9):.0f} msgs/s)"
+    )
+    print(f"convert: {convert_seconds:7.2f}s  records {len(df)}")
+    print(f"rate limiter wait: {bot.rate_limiter.total_wait():.2f}s")
+    print(f"  {'method':<24} {'calls':>7} {'429':>6} {'500':>6}")
+    for method in sorted(after["calls"]):
+        calls = after["calls"][method] - before["calls"].get(method, 0)
+        if not calls:
+            continue
+        print(
+            f"  {method:<24} {calls:>7} "
+            f"{after['rate_limited'].get(method, 0) - before['rate_limited'].get(method, 0):>6} "
+            f"{after['failures'].get(method, 0) - before['failures'].get(method, 0):>6}"
+        )
+    if not args.profile:
+        return 0
+
+    if streamed is None:
+        print(f"profiled stream: FAILED (did not finish within {STREAM_TIMEOUT}s)")
+        return 1
+    ok = (
+        streamed["messages"] == len(messages) and streamed["replies"] == replies
+        and streamed["profiled_replies"]
+    )
+    print(
+        f"profiled stream: {streamed['seconds']:7.2f}s  messages {streamed['messages']}/{len(messages)}"
+        f"  replies {streamed['replies']}/{replies}"
+        f"  thread fetch profiled: {streamed['profiled_replies']}  {'OK' if ok else 'FAILED'}"
+    )
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
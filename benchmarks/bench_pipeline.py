@@ -0,0 +1,213 @@
+"""パイプライン全体のベンチマーク: 合成 Slack データで段階ごとの時間とピークメモリを計測.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--scales small,medium,large] [--repeat 3]
+                                        [--check] [--update-baseline] [--tolerance 0.5]
+
+規模ごとに合成ワークスペース (synthetic_slack.generate_workspace) を作り、
+build_dataframe → build_graph → analyze_graph → generate_vis_data → JSON シリアライズ
+の各段階について、所要時間 (repeat 回の最小値) と tracemalloc で計測したピークメモリ
+(段階開始時からの増分。betweenness の子プロセス分は含まない) を表示する。
+
+  --check            baselines/pipeline.json と比較し、所要時間が (1 + tolerance) 倍、
+                     ピークメモリが (1 + memory-tolerance) 倍を超えた段階、または
+                     結果の規模 (レコード・ノード・エッジ・コミュニティ・ハブ数) が
+                     変わった規模があれば終了コード 1 で終わる
+  --update-baseline  今回の結果を baselines/pipeline.json に保存する
+                     (所要時間はマシンに依存するため、計測するマシンで取り直す)
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from core import DEFAULT_CONFIG, analyze_graph, build_graph, generate_vis_data  # noqa: E402
+from slack_convert import SlackRecordConverter  # noqa: E402
+from synthetic_slack import generate_workspace  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "pipeline.json")
+STAGES = ("build_dataframe", "build_graph", "analyze_graph", "generate_vis_data", "serialize_json")
+SCALES = {
+    "small": {"n_users": 100, "n_messages": 2_000},
+    "medium": {"n_users": 500, "n_messages": 10_000},
+    "large": {"n_users": 2_000, "n_messages": 50_000},
+}
+# 日付列・シードを固定して毎回同じデータにする
+END_TS = 1_700_000_000.0
+SEED = 0
+# これより短い差は計測誤差として回帰とみなさない
+MIN_REGRESSION_SECONDS = 0.05
+# スレッド参加者は set で持つため、エッジの追加順 (→ Louvain の分割) が文字列ハッシュに
+# 依存する。記録と比較できるよう、ハッシュのシードを固定して実行し直す
+HASH_SEED = "0"
+
+
+def run_pipeline(workspace, config, measure) -> dict:
+    """measure(stage, fn) で各段階を実行し、結果の規模を返す."""
+    converter = SlackRecordConverter()
+    df = measure("build_dataframe", lambda: converter.build_dataframe(
+        workspace.messages, workspace.thread_messages, None, workspace.user_cache(),
+    ))
+    domains = workspace.domains()
+    G = measure("build_graph", lambda: build_graph(df, config, domains))
+    analysis = measure("analyze_graph", lambda: analyze_graph(G, len(df), config))
+    vis_data = measure("generate_vis_data", lambda: generate_vis_data(G, analysis, config))
+    body = measure("serialize_json", lambda: json.dumps(vis_data, ensure_ascii=False).encode("utf-8"))
+    return {
+        "records": len(df),
+        "nodes": G.number_of_nodes(),
+        "edges": G.number_of_edges(),
+        "communities": len(vis_data["communities"]),
+        "hubs": len(analysis["hubs"]),
+        "json_bytes": len(body),
+    }
+
+
+def benchmark_scale(params: dict, repeat: int) -> dict:
+    workspace = generate_workspace(**params, end_ts=END_TS, seed=SEED)
+    config = copy.deepcopy(DEFAULT_CONFIG)
+
+    seconds = {stage: float("inf") for stage in STAGES}
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        seconds[stage] = min(seconds[stage], time.perf_counter() - start)
+        return result
+
+    for _ in range(repeat):
+        result = run_pipeline(workspace, config, timed)
+
+    # メモリは別の実行で計測する (tracemalloc 中は処理が遅くなるため)
+    peak_mb = {}
+
+    def traced(stage, fn):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        value = fn()
+        peak_mb[stage] = (tracemalloc.get_traced_memory()[1] - current) / 1024 / 1024
+        return value
+
+    tracemalloc.start()
+    try:
+        run_pipeline(workspace, config, traced)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "params": params,
+        "workload": {
+            "messages": len(workspace.messages),
+            "replies": workspace.n_replies,
+        },
+        "result": result,
+        "stages": {
+            stage: {"seconds": round(seconds[stage], 4), "peak_mb": round(peak_mb[stage], 2)}
+            for stage in STAGES
+        },
+    }
+
+
+def compare(name: str, current: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list[str]:
+    """baseline からの回帰の一覧 (無ければ空)."""
+    problems = []
+    if current["params"] != baseline["params"]:
+        return [f"{name}: workload parameters differ from the baseline (re-run --update-baseline)"]
+    if current["result"] != baseline["result"]:
+        problems.append(f"{name}: result changed {baseline['result']} -> {current['result']}")
+    for stage in STAGES:
+        now, before = current["stages"][stage], baseline["stages"].get(stage)
+        if before is None:
+            continue
+        if (
+            now["seconds"] > before["seconds"] * (1 + tolerance)
+            and now["seconds"] - before["seconds"] > MIN_REGRESSION_SECONDS
+        ):
+            problems.append(f"{name}/{stage}: {before['seconds']:.3f}s -> {now['seconds']:.3f}s")
+        if now["peak_mb"] > before["peak_mb"] * (1 + memory_tolerance) and now["peak_mb"] - before["peak_mb"] > 1:
+            problems.append(f"{name}/{stage}: peak {before['peak_mb']:.1f}MB -> {now['peak_mb']:.1f}MB")
+    return problems
+
+
+def print_report(name: str, report: dict, baseline: dict | None):
+    workload = report["workload"]
+    result = report["result"]
+    print(
+        f"\n[{name}] users {report['params']['n_users']} / messages {workload['messages']} "
+        f"+ replies {workload['replies']} -> records {result['records']}, "
+        f"nodes {result['nodes']}, edges {result['edges']}, communities {result['communities']}"
+    )
+    print(f"  {'stage':<18} {'time [s]':>9} {'peak [MB]':>10} {'baseline [s]':>13} {'ratio':>6}")
+    for stage in STAGES:
+        now = report["stages"][stage]
+        before = (baseline or {}).get("stages", {}).get(stage)
+        base_text = ""
+        if before:
+            base_text = f"{before['seconds']:>13.3f} {now['seconds'] / max(before['seconds'], 1e-9):>6.2f}"
+        print(f"  {stage:<18} {now['seconds']:>9.3f} {now['peak_mb']:>10.1f} {base_text}")
+
+
+def main(argv=None) -> int:
+    if os.environ.get("PYTHONHASHSEED") != HASH_SEED:
+        os.environ["PYTHONHASHSEED"] = HASH_SEED
+        args = sys.argv[1:] if argv is None else argv
+        os.execv(sys.executable, [sys.executable, os.path.abspath(__file__), *args])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="small,medium,large", help="comma-separated: " + ",".join(SCALES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown ratio (0.5 = +50%%)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f).get("scales", {})
+
+    reports = {}
+    problems = []
+    for name in args.scales.split(","):
+        name = name.strip()
+        if name not in SCALES:
+            parser.error(f"unknown scale: {name}")
+        reports[name] = benchmark_scale(SCALES[name], max(1, args.repeat))
+        print_report(name, reports[name], baselines.get(name))
+        if args.check:
+            if name in baselines:
+                problems.extend(compare(name, reports[name], baselines[name], args.tolerance, args.memory_tolerance))
+            else:
+                print(f"  (no baseline for {name})")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+                "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "scales": {**baselines, **reports},
+            }, f, indent=2)
+            f.write("\n")
+        print(f"\nbaseline written: {args.baseline}")
+
+    if problems:
+        print("\nREGRESSIONS:")
+        for problem in problems:
+            print(f"  {problem}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,328 @@
+"""Slack Web API のローカル代替サーバー (取得処理の負荷試験用).
+
+synthetic_slack.generate_workspace のデータを、Slack と同じ形のレスポンス
+(カーソルによるページング・ok / error) で返す。Bot の WebClient を
+MENTION_MAP_SLACK_API_URL=http://127.0.0.1:<port>/api/ でここに向けると、
+ワークスペースなしで取得の並行度・リトライ・キャッシュの変更を計測できる。
+
+  - 対応メソッド: auth.test, conversations.history / replies / members / info / open,
+    users.info, users.list, chat.postMessage / postEphemeral (投稿は捨てる)
+  - latency: 1 リクエストあたりの遅延 (秒、±jitter の一様乱数)
+  - rate_limits: メソッドごとの 1 分あたりの上限。window 秒のスライディングウィンドウで
+    per_minute * window / 60 回を超えると 429 + Retry-After (空くまでの秒数) を返す
+  - failure_rate: この確率で 500 (error: internal_error) を返す
+  - GET /stats: メソッドごとの呼び出し数・429・注入した失敗の数 (JSON)
+
+Usage:
+    python benchmarks/fake_slack_api.py [--port 8999] [--channels 3] [--users 500]
+        [--messages 10000] [--latency 0.05] [--failure-rate 0.01]
+        [--rate-limit conversations.replies=50 ...]
+"""
+
+import argparse
+import http.server
+import json
+import math
+import random
+import socketserver
+import threading
+import time
+from collections import Counter, deque
+from urllib.parse import parse_qs, urlsplit
+
+from synthetic_slack import generate_workspace
+
+# Slack の rate limit tier に準拠した 1 分あたりの上限
+DEFAULT_RATE_LIMITS = {
+    "conversations.history": 50,   # Tier 3
+    "conversations.replies": 50,   # Tier 3
+    "conversations.members": 100,  # Tier 4
+    "users.info": 100,             # Tier 4
+    "users.list": 20,              # Tier 2
+}
+RATE_WINDOW_SECONDS = 60.0
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+
+
+class SlackApiError(Exception):
+    def __init__(self, error: str, status: int = 200):
+        super().__init__(error)
+        self.error = error
+        self.status = status
+
+
+def _page(items: list, params: dict, default_limit: int = DEFAULT_PAGE_LIMIT) -> tuple[list, str]:
+    """cursor (先頭からの位置) と limit で切り出し、次のカーソル ("" で終わり) を返す."""
+    try:
+        start = int(params.get("cursor") or 0)
+        limit = min(int(params.get("limit") or default_limit), MAX_PAGE_LIMIT)
+    except ValueError:
+        raise SlackApiError("invalid_cursor")
+    end = start + max(1, limit)
+    return items[start:end], (str(end) if end < len(items) else "")
+
+
+class FakeSlackApi:
+    """チャンネル ID → SyntheticWorkspace のデータを返す Web API の実装 (HTTP 層とは独立)."""
+
+    def __init__(
+        self, channels: dict, latency: float = 0.0, jitter: float = 0.0,
+        rate_limits: dict | None = None, failure_rate: float = 0.0,
+        window: float = RATE_WINDOW_SECONDS, seed: int = 0,
+    ):
+        self.channels = channels
+        self.users = {}
+        for workspace in channels.values():
+            self.users.update((user["id"], user) for user in workspace.users)
+        self.user_list = sorted(self.users.values(), key=lambda u: u["id"])
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS if rate_limits is None else rate_limits)
+        self.failure_rate = failure_rate
+        self.window = window
+        self._random = random.Random(seed)
+        self._calls: dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": Counter(), "rate_limited": Counter(), "failures": Counter()}
+        self._handlers = {
+            "auth.test": self.auth_test,
+            "conversations.history": self.conversations_history,
+            "conversations.replies": self.conversations_replies,
+            "conversations.members": self.conversations_members,
+            "conversations.info": self.conversations_info,
+            "conversations.open": self.conversations_open,
+            "users.info": self.users_info,
+            "users.list": self.users_list,
+            "chat.postMessage": self.chat_post_message,
+            "chat.postEphemeral": self.chat_post_message,
+        }
+
+    def call(self, method: str, params: dict) -> tuple[int, dict, dict]:
+        """(HTTP ステータス, ヘッダー, ボディ) を返す."""
+        handler = self._handlers.get(method)
+        if handler is None:
+            return 404, {}, {"ok": False, "error": "unknown_method"}
+
+        retry_after, failed = self._admit(method)
+        if retry_after is not None:
+            return 429, {"Retry-After": str(retry_after)}, {"ok": False, "error": "ratelimited"}
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._uniform(-self.jitter, self.jitter)))
+        if failed:
+            return 500, {}, {"ok": False, "error": "internal_error"}
+        try:
+            return 200, {}, {"ok": True, **handler(params)}
+        except SlackApiError as e:
+            return e.status, {}, {"ok": False, "error": e.error}
+
+    def _uniform(self, low: float, high: float) -> float:
+        with self._lock:
+            return self._random.uniform(low, high)
+
+    def _admit(self, method: str) -> tuple[int | None, bool]:
+        """rate limit を判定する ((Retry-After 秒 or None, 失敗を注入するか))."""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["calls"][method] += 1
+            per_minute = self.rate_limits.get(method)
+            if per_minute:
+                calls = self._calls.setdefault(method, deque())
+                while calls and calls[0] <= now - self.window:
+                    calls.popleft()
+                if len(calls) >= max(1, int(per_minute * self.window / 60)):
+                    self.stats["rate_limited"][method] += 1
+                    return max(1, math.ceil(calls[0] + self.window - now)), False
+                calls.append(now)
+            failed = self.failure_rate > 0 and self._random.random() < self.failure_rate
+            if failed:
+                self.stats["failures"][method] += 1
+            return None, failed
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(counter) for name, counter in self.stats.items()}
+
+    # --- メソッド ------------------------------------------------------------
+
+    def _workspace(self, params):
+        workspace = self.channels.get(params.get("channel", ""))
+        if workspace is None:
+            raise SlackApiError("channel_not_found")
+        return workspace
+
+    def auth_test(self, params):
+        return {"url": "http://localhost/", "team": "fake", "user": "mention-map", "team_id": "T0", "user_id": "UBOT", "bot_id": "B0"}
+
+    def conversations_history(self, params):
+        workspace = self._workspace(params)
+        oldest = float(params.get("oldest") or 0)
+        latest = float(params.get("latest") or "inf")
+        inclusive = params.get("inclusive") in ("1", "true")
+        selected = [
+            m for m in workspace.messages
+            if (oldest <= float(m["ts"]) if inclusive else oldest < float(m["ts"]))
+            and (float(m["ts"]) <= latest if inclusive else float(m["ts"]) < latest)
+        ]
+        page, cursor = _page(selected, params)
+        return {"messages": page, "has_more": bool(cursor), "response_metadata": {"next_cursor": cursor}}
+
+    def conversations_replies(self, params):
+        workspace = self._workspace(params)
+        ts = params.get("ts", "")
+        parent = next((m for m in workspace.messages if m["ts"] == ts), None)
+        if parent is None:
+            raise SlackApiError("thread_not_found")
+        page, cursor = _page([parent, *workspace.thread_messages.get(ts, [])], params)
+        return {"messages": page, "has_more": bool(cursor), "response_metadata": {"next_cursor": cursor}}
+
+    def conversations_members(self, params):
+        workspace = self._workspace(params)
+        page, cursor = _page([u["id"] for u in workspace.users], params)
+        return {"members": page, "response_metadata": {"next_cursor": cursor}}
+
+    def conversations_info(self, params):
+        channel = params.get("channel", "")
+        self._workspace(params)
+        return {"channel": {"id": channel, "name": f"fake-{channel.lower()}"}}
+
+    def conversations_open(self, params):
+        return {"channel": {"id": "D0"}}
+
+    def users_info(self, params):
+        user = self.users.get(params.get("user", ""))
+        if user is None:
+            raise SlackApiError("user_not_found")
+        return {"user": user}
+
+    def users_list(self, params):
+        page, cursor = _page(self.user_list, params, default_limit=200)
+        return {"members": page, "response_metadata": {"next_cursor": cursor}}
+
+    def chat_post_message(self, params):
+        return {"channel": params.get("channel", ""), "ts": f"{time.time():.6f}"}
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    api: FakeSlackApi = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/stats":
+            self._send(200, {}, self.api.snapshot())
+            return
+        self._dispatch(url, b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self._dispatch(urlsplit(self.path), self.rfile.read(length))
+
+    def _dispatch(self, url, body: bytes):
+        if not url.path.startswith("/api/"):
+            self._send(404, {}, {"ok": False, "error": "not_found"})
+            return
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if body:
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update({k: str(v) for k, v in json.loads(body).items()})
+            else:
+                params.update({k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()})
+        status, headers, payload = self.api.call(url.path[len("/api/"):], params)
+        self._send(status, headers, payload)
+
+    def _send(self, status, headers, payload):
+        encoded = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(encoded)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSlackServer:
+    """FakeSlackApi をバックグラウンドスレッドの HTTP サーバーで公開する."""
+
+    def __init__(self, api: FakeSlackApi, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (_Handler,), {"api": api})
+        self.api = api
+        self.httpd = _ThreadingServer((host, port), handler)
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """WebClient の base_url に渡す URL"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/api/"
+
+    def start(self) -> "FakeSlackServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-slack-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def channel_id(index: int) -> str:
+    return f"C{index:08X}"
+
+
+def build_channels(n_channels: int, **workspace_params) -> dict:
+    """channel_id(i) → 合成ワークスペース (チャンネルごとにシードを変える)."""
+    seed = workspace_params.pop("seed", 0)
+    return {
+        channel_id(i): generate_workspace(**workspace_params, seed=seed + i)
+        for i in range(n_channels)
+    }
+
+
+def parse_rate_limits(items) -> dict:
+    limits = dict(DEFAULT_RATE_LIMITS)
+    for item in items or []:
+        method, _, value = item.partition("=")
+        limits[method.strip()] = float(value)
+    return limits
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local stand-in for the Slack Web API")
+    parser.add_argument("--port", type=int, default=8999)
+    parser.add_argument("--channels", type=int, default=3)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--messages", type=int, default=10_000, help="top-level messages per channel")
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", action="append", metavar="METHOD=PER_MINUTE")
+    args = parser.parse_args(argv)
+
+    channels = build_channels(args.channels, n_users=args.users, n_messages=args.messages)
+    api = FakeSlackApi(
+        channels, latency=args.latency, jitter=args.jitter,
+        rate_limits=parse_rate_limits(args.rate_limit), failure_rate=args.failure_rate,
+    )
+    server = FakeSlackServer(api, port=args.port).start()
+    print(f"Fake Slack API: {server.url}  (stats: {server.url[:-len('api/')]}stats)")
+    for cid, workspace in channels.items():
+        print(f"  {cid}: {len(workspace.messages)} messages, {workspace.n_replies} replies")
+    print("MENTION_MAP_SLACK_API_URL=" + server.url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Slack ワークスペースの合成データ生成 (ベンチマーク用).
+
+conversations.history / conversations.replies / users.list が返すのと同じ形の
+メッセージ・スレッド応答・ユーザーを生成する。シードが同じなら同じデータになる。
+
+  - ユーザーの活動量は Zipf 分布 (skew が大きいほど一部のユーザーに集中する)
+  - ユーザーはチームに属し、メンション・スレッド参加・リアクションの相手は
+    team_affinity の確率で同じチームから選ぶ (コミュニティ構造ができる)
+  - スレッドの応答数は平均 thread_depth の幾何分布
+  - リアクションは reaction_rate の確率で付き、付けるユーザー数は平均 reactions_per_message
+
+Usage (単体で実行すると生成したデータの件数を表示する):
+    python benchmarks/synthetic_slack.py [ユーザー数] [メッセージ数]
+"""
+
+import itertools
+import json
+import sys
+import time
+import zipfile
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+
+DEFAULT_DAYS = 90
+WORDS = (
+    "確認 お願いします 共有 リリース レビュー 対応 資料 会議 修正 調整 "
+    "deploy review fix meeting draft update thanks check"
+).split()
+REACTIONS = ("+1", "eyes", "pray", "tada", "white_check_mark", "bow")
+
+
+class SyntheticWorkspace(NamedTuple):
+    users: list              # users.list の members 形式
+    messages: list           # トップレベルのメッセージ (新しい順、conversations.history と同じ)
+    thread_messages: dict    # {parent_ts: [reply, ...]} (親は含まない)
+
+    def user_cache(self) -> dict:
+        """user_id → 表示名 (resolve_user の実行中キャッシュの形)"""
+        return {u["id"]: u["real_name"] for u in self.users}
+
+    def domains(self) -> dict:
+        return {u["id"]: u["profile"]["email"].split("@")[-1] for u in self.users}
+
+    @property
+    def n_replies(self) -> int:
+        return sum(len(replies) for replies in self.thread_messages.values())
+
+
+def user_id(index: int) -> str:
+    return f"U{index:08X}"
+
+
+def generate_workspace(
+    n_users: int = 200,
+    n_messages: int = 5_000,
+    days: int = DEFAULT_DAYS,
+    skew: float = 1.1,
+    mention_rate: float = 0.6,
+    thread_rate: float = 0.15,
+    thread_depth: float = 4.0,
+    reaction_rate: float = 0.3,
+    reactions_per_message: float = 2.0,
+    team_size: int = 12,
+    team_affinity: float = 0.8,
+    bot_rate: float = 0.03,
+    external_rate: float = 0.05,
+    end_ts: float | None = None,
+    seed: int = 0,
+) -> SyntheticWorkspace:
+    """合成ワークスペースを生成する。
+
+    Args:
+      skew: ユーザー活動量の Zipf 指数 (0 で一様)
+      mention_rate: 1 メッセージあたりのメンション数の平均 (ポアソン分布)
+      thread_rate: トップレベルのメッセージがスレッドになる確率
+      thread_depth: 1 スレッドあたりの応答数の平均
+      reaction_rate: メッセージにリアクションが付く確率
+      external_rate: 社外ドメインのユーザーの割合
+    """
+    rng = np.random.default_rng(seed)
+    end_ts = time.time() if end_ts is None else end_ts
+    start_ts = end_ts - days * 24 * 60 * 60
+
+    # Zipf 重み (順位をシャッフルしてチームと活動量を無関係にする)
+    weights = 1.0 / np.arange(1, n_users + 1) ** skew
+    weights = rng.permutation(weights / weights.sum())
+    teams = np.arange(n_users) // max(1, team_size)
+    members = {team: np.flatnonzero(teams == team) for team in np.unique(teams)}
+    # 重み付きの抽出は累積分布の二分探索で行う (rng.choice(p=...) は呼び出しごとに O(n))
+    cumulative = np.cumsum(weights)
+    member_cumulative = {
+        team: np.cumsum(weights[idx]) / weights[idx].sum() for team, idx in members.items()
+    }
+
+    users = []
+    for i in range(n_users):
+        domain = "partner.example.org" if rng.random() < external_rate else "example.com"
+        users.append({
+            "id": user_id(i),
+            "name": f"user{i}",
+            "real_name": f"User {i:05d}",
+            "deleted": False,
+            "is_bot": False,
+            "profile": {"email": f"user{i}@{domain}"},
+        })
+
+    def pick_users(count, near=None):
+        """count 人 (重複あり) を選ぶ。near を渡すと team_affinity の確率で同じチームから"""
+        if count <= 0:
+            return []
+        picked = np.minimum(np.searchsorted(cumulative, rng.random(count) * cumulative[-1]), n_users - 1)
+        if near is None:
+            return picked.tolist()
+        team = teams[near]
+        same = rng.random(count) < team_affinity
+        n_same = int(same.sum())
+        if n_same:
+            local = np.searchsorted(member_cumulative[team], rng.random(n_same) * member_cumulative[team][-1])
+            picked[same] = members[team][np.minimum(local, len(members[team]) - 1)]
+        return picked.tolist()
+
+    def text(author):
+        words = [WORDS[i] for i in rng.integers(0, len(WORDS), size=int(rng.integers(3, 12)))]
+        for uid in pick_users(int(rng.poisson(mention_rate)), near=author):
+            words.insert(int(rng.integers(0, len(words) + 1)), f"<@{user_id(uid)}>")
+        return " ".join(words)
+
+    def reactions(author):
+        if rng.random() >= reaction_rate:
+            return None
+        reactors = sorted(set(pick_users(max(1, int(rng.poisson(reactions_per_message))), near=author)))
+        return [{
+            "name": REACTIONS[int(rng.integers(0, len(REACTIONS)))],
+            "users": [user_id(u) for u in reactors],
+            "count": len(reactors),
+        }]
+
+    def message(author, ts, **extra):
+        msg = {"type": "message", "user": user_id(author), "text": text(author), "ts": f"{ts:.6f}", **extra}
+        reacted = reactions(author)
+        if reacted:
+            msg["reactions"] = reacted
+        return msg
+
+    # トップレベルの時刻 (昇順、同じ ts にならないよう 1 マイクロ秒単位でずらす)
+    times = np.sort(rng.uniform(start_ts, end_ts, size=n_messages)) + np.arange(n_messages) * 1e-6
+    authors = pick_users(n_messages)
+    messages = []
+    thread_messages = {}
+    for ts, author in zip(times.tolist(), authors):
+        if rng.random() < bot_rate:
+            messages.append({
+                "type": "message", "subtype": "bot_message", "bot_id": "B0001",
+                "text": "build passed", "ts": f"{ts:.6f}",
+            })
+            continue
+        msg = message(author, ts)
+        if rng.random() < thread_rate:
+            n_replies = int(rng.geometric(1.0 / (1.0 + thread_depth))) - 1
+            if n_replies > 0:
+                parent_ts = msg["ts"]
+                offsets = np.sort(rng.exponential(3600, size=n_replies)) + np.arange(1, n_replies + 1) * 1e-4
+                replies = [
+                    message(replier, ts + offset, thread_ts=parent_ts, parent_user_id=msg["user"])
+                    for offset, replier in zip(offsets.tolist(), pick_users(n_replies, near=author))
+                ]
+                thread_messages[parent_ts] = replies
+                msg.update(thread_ts=parent_ts, reply_count=n_replies, latest_reply=replies[-1]["ts"])
+        messages.append(msg)
+
+    messages.reverse()
+    return SyntheticWorkspace(users, messages, thread_messages)
+
+
+def write_export(path: str, channels: dict, users: list | None = None):
+    """チャンネル名 → SyntheticWorkspace を Slack のワークスペースエクスポート形式の ZIP に書き出す.
+
+    users.json / channels.json と <チャンネル名>/<YYYY-MM-DD>.json (親と応答を投稿日ごとに
+    ts 順で並べたもの) を作る。users を省略すると最初のワークスペースのユーザーを使う。
+    """
+    if users is None:
+        users = next(iter(channels.values())).users
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("users.json", json.dumps(users, ensure_ascii=False))
+        archive.writestr("channels.json", json.dumps([
+            {"id": f"C{i:08X}", "name": name, "created": 0} for i, name in enumerate(channels)
+        ]))
+        for name, workspace in channels.items():
+            days = {}
+            for msg in itertools.chain(workspace.messages, *workspace.thread_messages.values()):
+                day = datetime.fromtimestamp(float(msg["ts"])).strftime("%Y-%m-%d")
+                days.setdefault(day, []).append(msg)
+            for day, messages in sorted(days.items()):
+                messages.sort(key=lambda m: float(m["ts"]))
+                archive.writestr(f"{name}/{day}.json", json.dumps(messages, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 5_000
+    start = time.perf_counter()
+    workspace = generate_workspace(n_users, n_messages)
+    print(
+        f"users {len(workspace.users)} / messages {len(workspace.messages)} / "
+        f"threads {len(workspace.thread_messages)} / replies {workspace.n_replies} "
+        f"({time.perf_counter() - start:.2f}s)"
+    )
@@ -0,0 +1,301 @@
+"""Betweenness centrality の計算エンジン (プロセス並列 + 適応サンプリング).
+
+始点ノードをチャンクに分けてプロセスプールで依存度 (dependency) を計算し、
+部分和を足し合わせる。モード:
+
+  - exact:    全ノードを始点にする厳密計算
+  - adaptive: ランダムな始点を 1 ラウンド (ワーカー数 × チャンク) ずつ追加し、
+              ランキング (base + weight × betweenness、ハブスコアと同じ形) の上位 top 件の
+              顔ぶれが前ラウンドから変わらず、かつそのスコアの相対標準誤差が
+              tolerance 以下になったら打ち切る
+  - auto:     exact_max_nodes 以下なら exact、それより大きければ adaptive
+
+相対標準誤差はチャンクごとの推定値 (batch means) の分散から求め、結果と一緒に返す。
+
+プロセスプールはモジュールで 1 つだけ (初回に作成) で、すべての分析ジョブが共有する。
+分析はスレッドから並行に呼ばれるため fork は使わず、forkserver (無ければ spawn) で起動する。
+グラフは計算ごとに 1 回だけ、ノード番号の組 (int32) の配列として共有メモリに書き込む。
+タスクには共有メモリの名前と始点の番号だけを渡し、ワーカーは同じ計算の 2 つ目以降の
+チャンクでは組み立て済みのグラフを使い回す。
+プールを作れない・壊れた場合は同じ計算を逐次実行する。
+"""
+
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
+
+import networkx as nx
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TOLERANCE = 0.1
+DEFAULT_TOP = 20
+# adaptive モードで始点にするノード数の上限 (収束しなくてもここで打ち切り、誤差を報告する)
+DEFAULT_MAX_SAMPLES = 2000
+# auto モードで厳密計算するノード数の上限
+EXACT_MAX_NODES = 500
+# これより小さいグラフはプロセスを起動するより逐次計算のほうが速い
+PARALLEL_MIN_NODES = 300
+# adaptive モードで推定を始めるまでの最小ラウンド数 (分散の推定に 2 チャンク以上必要)
+MIN_ROUNDS = 2
+MODES = ("auto", "exact", "adaptive")
+
+
+class BetweennessResult(NamedTuple):
+    scores: dict           # node → 正規化済み betweenness centrality
+    method: str            # "exact" / "adaptive"
+    samples: int           # 始点にしたノード数
+    error: float           # ランキング上位 top 件のスコアの最大相対標準誤差 (exact なら 0)
+    rounds: int
+    workers: int
+
+
+def default_workers() -> int:
+    """MENTION_MAP_BETWEENNESS_WORKERS (int) 並列プロセス数 (未設定時は CPU 数)。"""
+    val = os.environ.get("MENTION_MAP_BETWEENNESS_WORKERS")
+    if val is not None:
+        try:
+            return max(1, int(val))
+        except ValueError:
+            log.warning("Invalid value for MENTION_MAP_BETWEENNESS_WORKERS: %s", val)
+    return os.cpu_count() or 1
+
+
+# --- ワーカー ---------------------------------------------------------------
+
+# ワーカーが最後に組み立てたグラフ (同じ計算のチャンクが続けば使い回す)
+_worker_graph_ref = None
+_worker_graph = None
+_worker_nodes = None
+
+
+def _build_graph(nodes, edges) -> nx.Graph:
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from(edges)
+    return graph
+
+
+def _dependencies(graph, nodes, sources) -> np.ndarray:
+    """sources を始点とする依存度の和 (正規化前、nodes の順)."""
+    partial = nx.betweenness_centrality_subset(graph, sources, nodes, normalized=False)
+    return np.fromiter((partial[node] for node in nodes), dtype=float, count=len(nodes))
+
+
+def _worker_dependencies(graph_ref, sources) -> np.ndarray:
+    """graph_ref = (共有メモリ名, ノード数, エッジ数)。ノードは 0..n-1 の番号で扱う."""
+    global _worker_graph_ref, _worker_graph, _worker_nodes
+    if graph_ref != _worker_graph_ref:
+        name, n, m = graph_ref
+        shm = SharedMemory(name=name)
+        try:
+            edges = np.ndarray((m, 2), dtype=np.int32, buffer=shm.buf)
+            edge_list = edges.tolist()
+            del edges
+        finally:
+            shm.close()
+        _worker_nodes = list(range(n))
+        _worker_graph = _build_graph(_worker_nodes, edge_list)
+        _worker_graph_ref = graph_ref
+    return _dependencies(_worker_graph, _worker_nodes, sources)
+
+
+# --- 共有プロセスプール -----------------------------------------------------
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _shared_pool():
+    """共有プロセスプールと、その並列数を返す (作れなければ (None, 1))。
+
+    並列数は MENTION_MAP_BETWEENNESS_WORKERS (未設定時は CPU 数) で、呼び出しごとの
+    workers はその範囲に収める。
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            if default_workers() <= 1:
+                return None, 1
+            methods = multiprocessing.get_all_start_methods()
+            method = "forkserver" if "forkserver" in methods else "spawn"
+            context = multiprocessing.get_context(method)
+            if method == "forkserver":
+                # numpy / networkx の読み込みをワーカーごとに繰り返さない
+                context.set_forkserver_preload([__name__])
+            _pool_workers = default_workers()
+            try:
+                _pool = ProcessPoolExecutor(max_workers=_pool_workers, mp_context=context)
+            except (OSError, ValueError) as e:
+                log.warning("Betweenness centrality: プロセスプールを作成できません (%s)。逐次計算します", e)
+                return None, 1
+        return _pool, _pool_workers
+
+
+def _discard_pool(pool):
+    """壊れたプール (ワーカーの異常終了など) を捨てる。次の呼び出しで作り直す。"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Runner:
+    """チャンクの依存度計算を共有プロセスプール (または逐次) で実行する.
+
+    プールを使う場合はグラフを共有メモリに 1 回だけ書き込む。使い終わったら close() で解放する。
+    """
+
+    def __init__(self, graph, nodes, workers):
+        self.graph = graph
+        self.nodes = nodes
+        self.workers = 1
+        self._pool = None
+        self._shm = None
+        if workers > 1:
+            self._pool, pool_workers = _shared_pool()
+            self.workers = min(workers, pool_workers)
+        if self._pool is not None:
+            self._index = {node: i for i, node in enumerate(nodes)}
+            index = self._index
+            edges = np.array([(index[u], index[v]) for u, v in graph.edges], dtype=np.int32).reshape(-1, 2)
+            self._shm = SharedMemory(create=True, size=max(1, edges.nbytes))
+            np.ndarray(edges.shape, dtype=np.int32, buffer=self._shm.buf)[:] = edges
+            self._graph_ref = (self._shm.name, len(nodes), len(edges))
+
+    def map(self, chunks) -> list[np.ndarray]:
+        if self._pool is not None:
+            try:
+                futures = [
+                    self._pool.submit(
+                        _worker_dependencies, self._graph_ref, [self._index[node] for node in chunk])
+                    for chunk in chunks
+                ]
+                return [future.result() for future in futures]
+            except BrokenProcessPool:
+                log.warning("Betweenness centrality: プロセスプールが停止したため逐次計算します")
+                _discard_pool(self._pool)
+                self._pool = None
+        return [_dependencies(self.graph, self.nodes, chunk) for chunk in chunks]
+
+    def close(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+# --- 計算 -------------------------------------------------------------------
+
+def betweenness_centrality(
+    G: nx.Graph, mode: str = "auto", tolerance: float = DEFAULT_TOLERANCE, top: int = DEFAULT_TOP,
+    base: dict | None = None, weight: float = 1.0, workers: int | None = None,
+    max_samples: int = DEFAULT_MAX_SAMPLES, exact_max_nodes: int = EXACT_MAX_NODES, seed: int = 42,
+) -> BetweennessResult:
+    """無向グラフの betweenness centrality を計算する (正規化は nx.betweenness_centrality と同じ)。
+
+    Args:
+      base / weight: adaptive モードの収束判定に使うランキングスコア
+            base[node] + weight × betweenness (例: ハブスコアの degree 項と betweenness の重み)。
+            省略時は betweenness そのもの
+    """
+    if mode not in MODES:
+        log.warning("Unknown betweenness mode %r, using auto", mode)
+        mode = "auto"
+    nodes = list(G.nodes)
+    n = len(nodes)
+    if n < 3:
+        return BetweennessResult({node: 0.0 for node in nodes}, "exact", n, 0.0, 0, 1)
+    if mode == "auto":
+        mode = "exact" if n <= exact_max_nodes else "adaptive"
+    if workers is None:
+        workers = default_workers()
+    if n < PARALLEL_MIN_NODES:
+        workers = 1
+
+    # 属性を持たない軽量なグラフ (子プロセスにはノード番号のエッジ配列を共有メモリで渡す)
+    graph = _build_graph(nodes, G.edges)
+    # 無向グラフの正規化 (nx.betweenness_centrality(normalized=True) と同じ)
+    scale = 2.0 / ((n - 1) * (n - 2))
+
+    runner = _Runner(graph, nodes, workers)
+    try:
+        if mode == "exact":
+            return _exact(runner, nodes, scale)
+        base_scores = np.fromiter(((base or {}).get(node, 0.0) for node in nodes), dtype=float, count=n)
+        return _adaptive(runner, nodes, scale, tolerance, top, base_scores, weight, max_samples, seed)
+    finally:
+        runner.close()
+
+
+def _exact(runner, nodes, scale) -> BetweennessResult:
+    n = len(nodes)
+    chunk_size = math.ceil(n / (runner.workers * 4))
+    chunks = [nodes[i:i + chunk_size] for i in range(0, n, chunk_size)]
+    total = np.sum(runner.map(chunks), axis=0)
+    scores = dict(zip(nodes, (total * scale).tolist()))
+    return BetweennessResult(scores, "exact", n, 0.0, 1, runner.workers)
+
+
+def _adaptive(runner, nodes, scale, tolerance, top, base, weight, max_samples, seed) -> BetweennessResult:
+    n = len(nodes)
+    order = np.random.default_rng(seed).permutation(n)
+    # 1 チャンクの始点数。小さすぎると分散の推定が粗く、大きすぎると打ち切りが遅れる
+    chunk_size = max(8, min(64, n // 100))
+    top = min(top, n)
+
+    total = np.zeros(n)
+    # チャンクごとの推定値 (n / チャンク長 × 依存度和) の平均・二乗和 (Welford)
+    mean = np.zeros(n)
+    m2 = np.zeros(n)
+    batches = 0
+    taken = 0
+    rounds = 0
+    previous_top = None
+    error = float("inf")
+
+    while taken < n:
+        chunks = []
+        for _ in range(runner.workers):
+            if taken >= n:
+                break
+            chunks.append([nodes[i] for i in order[taken:taken + chunk_size]])
+            taken += len(chunks[-1])
+        rounds += 1
+        for chunk, partial in zip(chunks, runner.map(chunks)):
+            total += partial
+            if len(chunk) == chunk_size:
+                batches += 1
+                estimate = partial * (n / chunk_size)
+                delta = estimate - mean
+                mean += delta / batches
+                m2 += delta * (estimate - mean)
+
+        if taken >= n or batches < 2 or rounds < MIN_ROUNDS:
+            continue
+        estimate = total * (n / taken) * scale
+        ranking = base + weight * estimate
+        top_index = np.argsort(-ranking, kind="stable")[:top]
+        standard_error = weight * scale * np.sqrt(m2[top_index] / (batches - 1) / batches)
+        positive = ranking[top_index] > 0
+        error = float(np.max(standard_error[positive] / ranking[top_index][positive])) if positive.any() else 0.0
+        top_nodes = set(top_index.tolist())
+        if (previous_top == top_nodes and error <= tolerance) or taken >= max_samples:
+            if error > tolerance:
+                log.info("Betweenness centrality: 始点 %d 件で打ち切り (相対誤差 %.3f)", taken, error)
+            scores = dict(zip(nodes, estimate.tolist()))
+            return BetweennessResult(scores, "adaptive", taken, error, rounds, runner.workers)
+        previous_top = top_nodes
+
+    # 全ノードを始点にした (厳密値と同じ)
+    scores = dict(zip(nodes, (total * scale).tolist()))
+    return BetweennessResult(scores, "exact", n, 0.0, rounds, runner.workers)
@@ -0,0 +1,106 @@
+"""複数チャンネル分析のチャンネル単位の部分集計 (map-reduce).
+
+  - map:    チャンネルごとに取得したエッジテーブルを GraphAccumulator に畳み込む
+            (ChannelPartial。build_graph の node_stats / エッジ重みと同じ集計)
+  - reduce: 部分集計をチャンネル ID 順に GraphAccumulator.merge で 1 つにまとめる。
+            merge は結合的なので、取得の完了順や並列度によらず同じグラフになる
+
+部分集計は (channel_id, days) ごとに PartialCache に保持する。チャンネルの組み合わせを
+変えて再分析するときは、キャッシュに無い (または古い) チャンネルだけを取得し直す。
+部分集計は分析設定 (閾値など) に依存しないため、キーに設定ハッシュは含めない。
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+from core import GraphAccumulator
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 128
+# 1 回の分析で対象にできるチャンネル数の上限
+MAX_CHANNELS = 50
+
+
+class ChannelPartial(NamedTuple):
+    channel_id: str
+    channel_name: str
+    days: int
+    created_at: float              # 取得完了時刻 (epoch 秒)
+    accumulator: GraphAccumulator
+    names: dict                    # user_id → 表示名
+    messages: int                  # 取得したトップレベルメッセージ数
+
+
+def channel_set_key(channel_ids) -> str:
+    """チャンネルの組み合わせを表すキー (順序・重複によらない。結果キャッシュ・URL で使う)."""
+    return ",".join(sorted(set(channel_ids)))
+
+
+def channel_ids_from_key(key: str) -> list[str]:
+    return key.split(",")
+
+
+def merge_partials(partials) -> tuple[GraphAccumulator, dict]:
+    """部分集計をチャンネル ID 順にまとめた GraphAccumulator と表示名のマップを返す."""
+    merged = GraphAccumulator()
+    names = {}
+    for partial in sorted(partials, key=lambda p: p.channel_id):
+        merged.merge(partial.accumulator)
+        names.update(partial.names)
+    return merged, names
+
+
+class PartialCache:
+    """(channel_id, days) → ChannelPartial の LRU キャッシュ (スレッドセーフ)."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, fresh_seconds: float = 10 * 60):
+        self.max_entries = max(1, max_entries)
+        self.fresh_seconds = fresh_seconds
+        self._entries: OrderedDict[tuple, ChannelPartial] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_fresh(self, channel_id: str, days: int) -> ChannelPartial | None:
+        """fresh_seconds 秒以内に作られた部分集計を返す (無ければ None)。"""
+        key = (channel_id, int(days))
+        with self._lock:
+            partial = self._entries.get(key)
+            if partial is None or time.time() - partial.created_at > self.fresh_seconds:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return partial
+
+    def put(self, partial: ChannelPartial):
+        key = (partial.channel_id, int(partial.days))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = partial
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                log.info("部分集計キャッシュ: %s (%d 日) を破棄", evicted[0], evicted[1])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def load_partial_cache_from_env(fresh_seconds: float) -> PartialCache:
+    """環境変数から部分集計キャッシュを作成する。
+
+    MENTION_MAP_PARTIAL_CACHE_ENTRIES (int) 保持するチャンネル × 期間の数の上限
+    鮮度は結果キャッシュ (MENTION_MAP_RESULT_CACHE_FRESH_MINUTES) と同じものを渡す。
+    """
+    try:
+        max_entries = int(os.environ.get("MENTION_MAP_PARTIAL_CACHE_ENTRIES", str(DEFAULT_MAX_ENTRIES)))
+    except ValueError:
+        log.warning("Invalid value for MENTION_MAP_PARTIAL_CACHE_ENTRIES")
+        max_entries = DEFAULT_MAX_ENTRIES
+    return PartialCache(max_entries=max_entries, fresh_seconds=fresh_seconds)
@@ -0,0 +1,189 @@
+"""Louvain コミュニティ検出 (前回の分割からのウォームスタート + 安定した ID).
+
+analyze_graph から呼ばれ、キー (チャンネル) ごとに前回の分割を覚えておく:
+
+  - キャッシュ: グラフの指紋 (ノードと無向エッジ) が前回と同じなら、
+    計算し直さずに同じ分割を返す
+  - ウォームスタート: 前回の分割を初期状態にしてノード単位の局所移動を行い、
+    その結果を 1 ノードに縮約したグラフに nx.community.louvain_communities を
+    適用する (Louvain の 2 段目以降に相当)。グラフがあまり変わっていなければ
+    縮約後のグラフは小さく、最初から計算するより速い
+  - 安定した ID: 新しいコミュニティを前回のコミュニティと重なりの大きい順に
+    対応付け、前回の ID を引き継ぐ。対応しないものには前回使われていない
+    最小の ID を割り当てる (ID % 色数 でダッシュボードの色が決まる)
+
+前回の分割が無い場合は nx.community.louvain_communities(seed=42) と同じ結果になる。
+"""
+
+import hashlib
+import itertools
+import logging
+import random
+import threading
+from collections import Counter, OrderedDict, defaultdict
+from typing import NamedTuple
+
+import networkx as nx
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 32
+# 局所移動のパス数の上限
+MAX_LOCAL_PASSES = 10
+
+
+class CommunityResult(NamedTuple):
+    communities: list      # [(id, set(node)), ...] (ID 順)
+    method: str            # "cold" / "warm" / "cached"
+
+
+def graph_fingerprint(G: nx.Graph) -> str:
+    """ノードと無向エッジの集合から決まるハッシュ (追加順には依存しない)."""
+    digest = hashlib.sha256()
+    for node in sorted(map(str, G.nodes)):
+        digest.update(node.encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(b"\1")
+    for u, v in sorted(tuple(sorted((str(u), str(v)))) for u, v in G.edges):
+        digest.update(f"{u}\0{v}\0".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _local_moving(G: nx.Graph, membership: dict, seed: int) -> dict:
+    """membership を初期状態に、モジュラリティが増える限りノードを隣接コミュニティへ移す."""
+    degree = dict(G.degree())
+    total = sum(degree.values())
+    if total == 0:
+        return membership
+    community_degree = defaultdict(int)
+    for node, community in membership.items():
+        community_degree[community] += degree[node]
+
+    nodes = list(G.nodes)
+    random.Random(seed).shuffle(nodes)
+    for _ in range(MAX_LOCAL_PASSES):
+        moved = 0
+        for node in nodes:
+            current = membership[node]
+            links = defaultdict(int)
+            for neighbor in G[node]:
+                if neighbor != node:
+                    links[membership[neighbor]] += 1
+            community_degree[current] -= degree[node]
+            scale = degree[node] / total
+            best = current
+            best_gain = links.get(current, 0) - community_degree[current] * scale
+            for community, weight in links.items():
+                gain = weight - community_degree[community] * scale
+                if gain > best_gain:
+                    best, best_gain = community, gain
+            community_degree[best] += degree[node]
+            if best != current:
+                membership[node] = best
+                moved += 1
+        if moved == 0:
+            break
+    return membership
+
+
+class CommunityDetector:
+    """キーごとの前回分割と、指紋 → 分割のキャッシュを持つ Louvain (スレッドセーフ)."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, seed: int = 42):
+        self.max_entries = max_entries
+        self.seed = seed
+        self._partitions: OrderedDict[str, list] = OrderedDict()   # 指紋 → [set(node), ...]
+        self._previous: OrderedDict = OrderedDict()                # キー → {node: id}
+        self.methods: Counter = Counter()                          # cold / warm / cached の回数
+        self._lock = threading.Lock()
+
+    def detect(self, G: nx.Graph, key=None) -> CommunityResult:
+        fingerprint = graph_fingerprint(G)
+        with self._lock:
+            previous = self._previous.get(key) if key is not None else None
+            cached = self._partitions.get(fingerprint)
+            if cached is not None:
+                self._partitions.move_to_end(fingerprint)
+
+        if cached is not None:
+            partition, method = cached, "cached"
+        elif previous:
+            partition, method = self._warm(G, previous), "warm"
+        else:
+            partition, method = list(nx.community.louvain_communities(G, seed=self.seed)), "cold"
+
+        communities = self._assign_ids(partition, previous or {})
+        with self._lock:
+            self._partitions[fingerprint] = partition
+            self._partitions.move_to_end(fingerprint)
+            while len(self._partitions) > self.max_entries:
+                self._partitions.popitem(last=False)
+            self.methods[method] += 1
+            if key is not None:
+                self._previous[key] = {node: cid for cid, members in communities for node in members}
+                self._previous.move_to_end(key)
+                while len(self._previous) > self.max_entries:
+                    self._previous.popitem(last=False)
+        log.info("コミュニティ検出: %s (%d 個)", method, len(communities))
+        return CommunityResult(communities, method)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._partitions), "methods": dict(self.methods)}
+
+    def _warm(self, G: nx.Graph, previous: dict) -> list:
+        # 前回の ID を初期状態に (新しいノードは単独のコミュニティ)
+        membership = {}
+        fresh = itertools.count(max(previous.values(), default=-1) + 1)
+        for node in G.nodes:
+            membership[node] = previous[node] if node in previous else next(fresh)
+        membership = _local_moving(G, membership, self.seed)
+
+        # コミュニティを 1 ノードに縮約したグラフで Louvain の続きを行う
+        aggregated = nx.Graph()
+        aggregated.add_nodes_from(sorted(set(membership.values())))
+        for u, v in G.edges:
+            cu, cv = membership[u], membership[v]
+            if aggregated.has_edge(cu, cv):
+                aggregated[cu][cv]["weight"] += 1
+            else:
+                aggregated.add_edge(cu, cv, weight=1)
+        merged = nx.community.louvain_communities(aggregated, weight="weight", seed=self.seed)
+
+        members = defaultdict(set)
+        for node, community in membership.items():
+            members[community].add(node)
+        return [set().union(*(members[c] for c in group)) for group in merged]
+
+    @staticmethod
+    def _assign_ids(partition: list, previous: dict) -> list:
+        if not previous:
+            return list(enumerate(partition))
+
+        # (重なり, 新コミュニティ番号, 前回 ID) を重なりの大きい順に貪欲に対応付ける
+        overlaps = []
+        for index, members in enumerate(partition):
+            counts = defaultdict(int)
+            for node in members:
+                if node in previous:
+                    counts[previous[node]] += 1
+            overlaps.extend((count, index, cid) for cid, count in counts.items())
+        overlaps.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+        ids = {}
+        taken = set()
+        for _, index, cid in overlaps:
+            if index not in ids and cid not in taken:
+                ids[index] = cid
+                taken.add(cid)
+
+        unavailable = set(previous.values()) | taken
+        next_id = 0
+        for index in range(len(partition)):
+            if index in ids:
+                continue
+            while next_id in unavailable:
+                next_id += 1
+            ids[index] = next_id
+            unavailable.add(next_id)
+        return sorted(((ids[index], members) for index, members in enumerate(partition)), key=lambda item: item[0])
@@ -5,15 +5,41 @@
   - parse_address_field: Slack user ID ("Name <USER_ID>") 形式に対応
   - build_graph: domain → workspace, is_internal デフォルト True
   - load_csv / load_config: 削除 (呼び出し側で DataFrame / config を直接渡す)
+  - build_graph_from_edges: Slack 向けの構造化エッジテーブル入力 (文字列パース不要)
+  - GraphAccumulator: ストリーミング取得向けの逐次集計 (複数チャンネル分析では部分集計として merge)
+  - IncrementalGraph: レコードの追加・削除を差分で反映する長寿命グラフ
+  - analyze_graph: betweenness centrality はプロセス並列 + 適応サンプリング (centrality.py)
+  - analyze_graph: 大規模グラフでは次数・PageRank・ハブスコアを疎行列で計算 (graph_metrics.py)
+  - analyze_graph: CommunityDetector を渡すと Louvain を前回の分割からウォームスタートし、
+    コミュニティ ID (= 色) を実行間で引き継ぐ (communities.py)
+  - generate_vis_data: サーバー側で計算したノード座標 (x / y) を含める
+  - 各段階 (グラフ構築・指標・centrality・Louvain・レイアウト・vis.js JSON) の所要時間を
+    instrumentation.span で記録する
 """
 
+import copy
+import heapq
+import itertools
 import logging
 import re
 from collections import defaultdict
+from typing import NamedTuple
 
 import networkx as nx
+import numpy as np
 import pandas as pd
 
+from centrality import DEFAULT_MAX_SAMPLES as DEFAULT_BETWEENNESS_MAX_SAMPLES
+from centrality import DEFAULT_TOLERANCE as DEFAULT_BETWEENNESS_TOLERANCE
+from centrality import MODES as BETWEENNESS_MODES
+from centrality import betweenness_centrality
+from communities import CommunityDetector
+from graph_metrics import BACKENDS as ANALYTICS_BACKENDS
+from graph_metrics import SPARSE_MIN_NODES, compute_metrics
+from instrumentation import span
+from layout import DEFAULT_ITERATIONS as DEFAULT_LAYOUT_ITERATIONS
+from layout import force_layout
+
 log = logging.getLogger(__name__)
 
 # コミュニティカラーパレット (Dot-connect 準拠)
@@ -41,6 +67,19 @@ DEFAULT_CONFIG = {
         "hub_degree_weight": 0.5,
         "hub_betweenness_weight": 0.5,
     },
+    "layout": {
+        "enabled": True,
+        "iterations": DEFAULT_LAYOUT_ITERATIONS,
+    },
+    "betweenness": {
+        "mode": "auto",
+        "tolerance": DEFAULT_BETWEENNESS_TOLERANCE,
+        "max_samples": DEFAULT_BETWEENNESS_MAX_SAMPLES,
+    },
+    "analytics": {
+        "backend": "auto",
+        "sparse_min_nodes": SPARSE_MIN_NODES,
+    },
 }
 
 
@@ -53,11 +92,21 @@ def load_config_from_env() -> dict:
         MENTION_MAP_HUB_DEGREE_W    (float) ハブスコアの degree 重み
         MENTION_MAP_HUB_BETWEEN_W   (float) ハブスコアの betweenness 重み
         MENTION_MAP_COMPANY_DOMAINS (str)   カンマ区切りのドメインリスト
+        MENTION_MAP_LAYOUT          (str)   サーバー側レイアウト ("off" で無効)
+        MENTION_MAP_LAYOUT_ITERATIONS (int) サーバー側レイアウトの反復回数
+        MENTION_MAP_BETWEENNESS     (str)   betweenness の計算方法 (auto / exact / adaptive)
+        MENTION_MAP_BETWEENNESS_TOLERANCE   (float) adaptive の許容相対誤差
+        MENTION_MAP_BETWEENNESS_MAX_SAMPLES (int)   adaptive で始点にするノード数の上限
+        MENTION_MAP_ANALYTICS_BACKEND       (str)   ノード指標の計算方法 (auto / networkx / sparse)
+        MENTION_MAP_SPARSE_MIN_NODES        (int)   auto で疎行列バックエンドを使うノード数
     """
     import os
     config = {
         "company_domains": DEFAULT_CONFIG["company_domains"][:],
         "thresholds": DEFAULT_CONFIG["thresholds"].copy(),
+        "layout": DEFAULT_CONFIG["layout"].copy(),
+        "betweenness": DEFAULT_CONFIG["betweenness"].copy(),
+        "analytics": DEFAULT_CONFIG["analytics"].copy(),
     }
 
     domains = os.environ.get("MENTION_MAP_COMPANY_DOMAINS")
@@ -78,13 +127,73 @@ def load_config_from_env() -> dict:
             except ValueError:
                 log.warning("Invalid value for %s: %s", env_key, val)
 
+    if os.environ.get("MENTION_MAP_LAYOUT", "on").lower() in ("off", "false", "0", "no"):
+        config["layout"]["enabled"] = False
+    val = os.environ.get("MENTION_MAP_LAYOUT_ITERATIONS")
+    if val is not None:
+        try:
+            config["layout"]["iterations"] = max(0, int(val))
+        except ValueError:
+            log.warning("Invalid value for MENTION_MAP_LAYOUT_ITERATIONS: %s", val)
+
+    mode = os.environ.get("MENTION_MAP_BETWEENNESS")
+    if mode is not None:
+        if mode.lower() in BETWEENNESS_MODES:
+            config["betweenness"]["mode"] = mode.lower()
+        else:
+            log.warning("Invalid value for MENTION_MAP_BETWEENNESS: %s", mode)
+    for env_key, config_key, cast in (
+        ("MENTION_MAP_BETWEENNESS_TOLERANCE", "tolerance", float),
+        ("MENTION_MAP_BETWEENNESS_MAX_SAMPLES", "max_samples", int),
+    ):
+        val = os.environ.get(env_key)
+        if val is not None:
+            try:
+                config["betweenness"][config_key] = cast(val)
+            except ValueError:
+                log.warning("Invalid value for %s: %s", env_key, val)
+
+    backend = os.environ.get("MENTION_MAP_ANALYTICS_BACKEND")
+    if backend is not None:
+        if backend.lower() in ANALYTICS_BACKENDS:
+            config["analytics"]["backend"] = backend.lower()
+        else:
+            log.warning("Invalid value for MENTION_MAP_ANALYTICS_BACKEND: %s", backend)
+    val = os.environ.get("MENTION_MAP_SPARSE_MIN_NODES")
+    if val is not None:
+        try:
+            config["analytics"]["sparse_min_nodes"] = int(val)
+        except ValueError:
+            log.warning("Invalid value for MENTION_MAP_SPARSE_MIN_NODES: %s", val)
+
     return config
 
 
+# 構造化エッジテーブルのカラム定義
+RECORD_COLUMNS = ["sender", "ts", "subject"]
+EDGE_COLUMNS = ["sender", "recipient", "kind", "ts"]   # kind: "to" / "cc"
+USER_COLUMNS = ["user_id", "name", "domain"]
+
+
+class EdgeTables(NamedTuple):
+    """build_graph_from_edges の入力となる構造化中間形式.
+
+    records: 1 メッセージ 1 行 (送信数・総メッセージ数の集計に使う)
+    edges:   1 受信者 1 行 (sender → recipient, kind は "to" / "cc")
+    users:   user_id → 表示名 / ドメイン
+    """
+    records: pd.DataFrame
+    edges: pd.DataFrame
+    users: pd.DataFrame
+
+
 # ---------------------------------------------------------------------------
 # Address parsing (Slack 適応版)
 # ---------------------------------------------------------------------------
 
+_ADDRESS_PATTERN = re.compile(r"^(.*?)\s*<(.+?)>$")
+
+
 def parse_address_field(field: str) -> list[tuple[str, str]]:
     """'Name <id>; Name2 <id2>' 形式のフィールドをパース.
 
@@ -101,7 +210,7 @@ def parse_address_field(field: str) -> list[tuple[str, str]]:
         entry = entry.strip()
         if not entry:
             continue
-        match = re.match(r"^(.*?)\s*<(.+?)>$", entry)
+        match = _ADDRESS_PATTERN.match(entry)
         if match:
             name = match.group(1).strip()
             identifier = match.group(2).strip()
@@ -116,100 +225,427 @@ def parse_address_field(field: str) -> list[tuple[str, str]]:
 # Graph construction
 # ---------------------------------------------------------------------------
 
+def _text_column(df: pd.DataFrame, column: str) -> list[str]:
+    """NaN を "" に、それ以外を strip 済み文字列にしたカラム値のリスト (無いカラムは全行 "")."""
+    if column not in df:
+        return [""] * len(df)
+    col = df[column]
+    return col.where(col.notna(), "").map(str).str.strip().tolist()
+
+
+def dataframe_to_edge_tables(df: pd.DataFrame, domain_map: dict | None = None) -> EdgeTables:
+    """Dot-connect 互換 DataFrame ("Name <ID>; ..." 形式) を EdgeTables に展開する.
+
+    to / cc の各アドレスを 1 行 1 エッジに展開するだけで、集計は
+    build_graph_from_edges の groupby に任せる。名前・ドメインは
+    旧 build_graph のループと同じ規則で決める:
+      - name: 行順 (送信者 → To → CC) で最後に現れた空でない名前
+      - domain: 送信者としての最後の空でない from_domain、
+        無ければ受信者として現れた場合のみ domain_map の値
+    """
+    if domain_map is None:
+        domain_map = {}
+
+    n_rows = len(df)
+    from_ids = df["from_email"].map(str).str.strip().tolist() if "from_email" in df else [""] * n_rows
+    from_names = _text_column(df, "from_name")
+    from_domains = _text_column(df, "from_domain")
+    subjects = _text_column(df, "subject")
+    address_fields = {
+        kind: df[kind].tolist() if kind in df else [""] * n_rows
+        for kind in ("to", "cc")
+    }
+
+    record_senders, record_subjects = [], []
+    edge_senders, edge_recipients, edge_kinds = [], [], []
+    names, domains = {}, {}
+    sender_domains = {}
+
+    for i, from_id in enumerate(from_ids):
+        if not from_id:
+            continue
+        record_senders.append(from_id)
+        record_subjects.append(subjects[i])
+        names.setdefault(from_id, "")
+        if from_names[i]:
+            names[from_id] = from_names[i]
+        if from_domains[i]:
+            sender_domains[from_id] = from_domains[i]
+
+        for kind, fields in address_fields.items():
+            for addr_id, addr_name in parse_address_field(fields[i]):
+                edge_senders.append(from_id)
+                edge_recipients.append(addr_id)
+                edge_kinds.append(kind)
+                if addr_name or addr_id not in names:
+                    names[addr_id] = addr_name or names.get(addr_id, "")
+                if addr_id in domain_map:
+                    domains[addr_id] = domain_map[addr_id]
+
+    domains.update(sender_domains)
+    users = pd.DataFrame({
+        "user_id": list(names),
+        "name": list(names.values()),
+        "domain": [domains.get(uid, "") for uid in names],
+    })
+    records = pd.DataFrame({"sender": record_senders, "ts": None, "subject": record_subjects})
+    edges = pd.DataFrame({
+        "sender": edge_senders, "recipient": edge_recipients, "kind": edge_kinds, "ts": None,
+    })
+    return EdgeTables(records=records, edges=edges, users=users)
+
+
 def build_graph(df: pd.DataFrame, config: dict | None = None, domain_map: dict | None = None) -> nx.DiGraph:
     """メッセージ DataFrame から有向グラフを構築.
 
+    to / cc カラムを EdgeTables に展開し、build_graph_from_edges の
+    groupby 集計でエッジ重み・ノード統計をまとめてからグラフに一括ロードする。
+
     Args:
       domain_map: user_id → email domain のマッピング (省略時は from_domain カラムから取得)
     """
+    return build_graph_from_edges(dataframe_to_edge_tables(df, domain_map), config)
+
+
+def _is_internal(domain: str, company_domains: list[str]) -> bool:
+    if company_domains:
+        return any(domain.endswith(d) for d in company_domains)
+    # Slack 単一ワークスペース: 全員社内扱い
+    return True
+
+
+def build_graph_from_edges(
+    tables: EdgeTables, config: dict | None = None, domain_map: dict | None = None,
+) -> nx.DiGraph:
+    """構造化エッジテーブルから有向グラフを構築 (build_graph と同じ結果).
+
+    エッジ重み・ノードの sent / received / cc_count を groupby で集計し、
+    グラフに一括ロードする。ノード・エッジの追加順は build_graph と同じ
+    (エッジの初出順) になる。
+
+    Args:
+      domain_map: user_id → email domain のマッピング (users テーブルの domain が空の場合に使用)
+    """
     if config is None:
         config = load_config_from_env()
     if domain_map is None:
         domain_map = {}
-
-    G = nx.DiGraph()
     company_domains = [d.lower() for d in config.get("company_domains", [])]
 
-    node_stats = defaultdict(lambda: {
-        "name": "", "email": "", "domain": "",
-        "sent": 0, "received": 0, "cc_count": 0,
-    })
-
-    for _, row in df.iterrows():
-        from_id = str(row.get("from_email", "")).strip()
-        from_name = str(row.get("from_name", "")).strip() if pd.notna(row.get("from_name")) else ""
+    records, edges, users = tables
+    edges = edges[edges["sender"] != ""]
 
-        if not from_id:
-            continue
+    G = nx.DiGraph()
+    if not edges.empty:
+        pairs = edges[["sender", "recipient"]].drop_duplicates()
+        pair_index = pd.MultiIndex.from_frame(pairs)
+        weights = {}
+        for kind in ("to", "cc"):
+            subset = edges[edges["kind"] == kind]
+            weights[kind] = (
+                subset.groupby(["sender", "recipient"], sort=False).size()
+                .reindex(pair_index, fill_value=0).tolist()
+            )
+        G.add_edges_from(
+            (u, v, {"to_weight": to_w, "cc_weight": cc_w})
+            for u, v, to_w, cc_w in zip(
+                pairs["sender"].tolist(), pairs["recipient"].tolist(),
+                weights["to"], weights["cc"],
+            )
+        )
 
-        from_domain = str(row.get("from_domain", "")).strip() if pd.notna(row.get("from_domain")) else ""
-
-        # 送信者ノード
-        node_stats[from_id]["name"] = from_name or node_stats[from_id]["name"]
-        node_stats[from_id]["email"] = from_id
-        if from_domain:
-            node_stats[from_id]["domain"] = from_domain
-        node_stats[from_id]["sent"] += 1
-
-        # To 受信者
-        to_addrs = parse_address_field(row.get("to", ""))
-        for to_id, to_name in to_addrs:
-            node_stats[to_id]["name"] = to_name or node_stats[to_id]["name"]
-            node_stats[to_id]["email"] = to_id
-            if to_id in domain_map and not node_stats[to_id]["domain"]:
-                node_stats[to_id]["domain"] = domain_map[to_id]
-            node_stats[to_id]["received"] += 1
-
-            if G.has_edge(from_id, to_id):
-                G[from_id][to_id]["to_weight"] += 1
-            else:
-                G.add_edge(from_id, to_id, to_weight=1, cc_weight=0)
-
-        # CC 受信者
-        cc_addrs = parse_address_field(row.get("cc", ""))
-        for cc_id, cc_name in cc_addrs:
-            node_stats[cc_id]["name"] = cc_name or node_stats[cc_id]["name"]
-            node_stats[cc_id]["email"] = cc_id
-            if cc_id in domain_map and not node_stats[cc_id]["domain"]:
-                node_stats[cc_id]["domain"] = domain_map[cc_id]
-            node_stats[cc_id]["cc_count"] += 1
-
-            if G.has_edge(from_id, cc_id):
-                G[from_id][cc_id]["cc_weight"] += 1
-            else:
-                G.add_edge(from_id, cc_id, to_weight=0, cc_weight=1)
-
-    # ノード属性を設定
-    for node_id, stats in node_stats.items():
-        if node_id in G.nodes:
-            domain = stats.get("domain", "")
-            if company_domains:
-                is_internal = any(domain.endswith(d) for d in company_domains)
-            else:
-                # Slack 単一ワークスペース: 全員社内扱い
-                is_internal = True
-
-            G.nodes[node_id].update({
-                "name": stats["name"] or node_id,
-                "email": node_id,
-                "domain": domain,
-                "is_internal": is_internal,
-                "sent": stats["sent"],
-                "received": stats["received"],
-                "cc_count": stats["cc_count"],
-            })
+    sent = records.groupby("sender", sort=False).size().to_dict()
+    received = edges[edges["kind"] == "to"].groupby("recipient", sort=False).size().to_dict()
+    cc_count = edges[edges["kind"] == "cc"].groupby("recipient", sort=False).size().to_dict()
+    names = dict(zip(users["user_id"], users["name"]))
+    domains = dict(zip(users["user_id"], users["domain"]))
+    _set_node_attributes(G, names, domains, domain_map, sent, received, cc_count, company_domains)
 
     log.info("グラフ構築: %d ノード, %d エッジ", G.number_of_nodes(), G.number_of_edges())
     return G
 
 
+def _set_node_attributes(G, names, domains, domain_map, sent, received, cc_count, company_domains):
+    """集計済みの統計からノード属性を設定する (グラフ上のノードのみ)."""
+    for node_id in G.nodes:
+        domain = domains.get(node_id) or domain_map.get(node_id, "")
+        G.nodes[node_id].update({
+            "name": names.get(node_id) or node_id,
+            "email": node_id,
+            "domain": domain,
+            "is_internal": _is_internal(domain, company_domains),
+            "sent": int(sent.get(node_id, 0)),
+            "received": int(received.get(node_id, 0)),
+            "cc_count": int(cc_count.get(node_id, 0)),
+        })
+
+
+class GraphAccumulator:
+    """レコードを 1 件ずつ畳み込み、エッジ重みとノード統計だけを保持する.
+
+    ストリーミング取得用: 生メッセージを溜めずに集計し、最後に to_graph() で
+    build_graph_from_edges と同じ形のグラフを作る。レコードを同じ順で
+    追加すれば、ノード・エッジの順序も含めて同じグラフになる。
+    """
+
+    def __init__(self):
+        self.edge_weights: dict[tuple[str, str], list[int]] = {}  # (u, v) → [to, cc] (初出順)
+        self.sent: dict[str, int] = defaultdict(int)
+        self.received: dict[str, int] = defaultdict(int)
+        self.cc_count: dict[str, int] = defaultdict(int)
+        self.total_records = 0
+
+    def add_record(self, sender: str, to_ids, cc_ids):
+        """1 レコード (sender → to / cc) を集計に加える."""
+        if not sender:
+            return
+        self.total_records += 1
+        self.sent[sender] += 1
+        for kind, ids, counter in ((0, to_ids, self.received), (1, cc_ids, self.cc_count)):
+            for uid in ids:
+                counter[uid] += 1
+                weights = self.edge_weights.get((sender, uid))
+                if weights is None:
+                    weights = self.edge_weights[(sender, uid)] = [0, 0]
+                weights[kind] += 1
+
+    def add_tables(self, tables: EdgeTables):
+        """EdgeTables のレコードをまとめて集計に加える (add_record を同じ順で呼ぶのと同じ結果)."""
+        records = tables.records[tables.records["sender"] != ""]
+        self.total_records += len(records)
+        for sender, count in records.groupby("sender", sort=False).size().items():
+            self.sent[sender] += int(count)
+
+        edges = tables.edges[tables.edges["sender"] != ""]
+        if edges.empty:
+            return
+        # sort=False のグループは初出順なので、(sender, recipient) の初出順も保たれる
+        grouped = edges.groupby(["sender", "recipient", "kind"], sort=False).size()
+        for (sender, uid, kind), count in grouped.items():
+            count = int(count)
+            index, counter = (0, self.received) if kind == "to" else (1, self.cc_count)
+            counter[uid] += count
+            weights = self.edge_weights.get((sender, uid))
+            if weights is None:
+                weights = self.edge_weights[(sender, uid)] = [0, 0]
+            weights[index] += count
+
+    def merge(self, other: "GraphAccumulator") -> "GraphAccumulator":
+        """other の集計を加えて self を返す.
+
+        重み・統計の和なので結合的で、エッジの並びも初出順のまま
+        ((a + b) + c と a + (b + c) は同じグラフになる)。
+        """
+        self.total_records += other.total_records
+        for mine, theirs in ((self.sent, other.sent), (self.received, other.received), (self.cc_count, other.cc_count)):
+            for uid, count in theirs.items():
+                mine[uid] += count
+        for pair, (to_w, cc_w) in other.edge_weights.items():
+            weights = self.edge_weights.get(pair)
+            if weights is None:
+                weights = self.edge_weights[pair] = [0, 0]
+            weights[0] += to_w
+            weights[1] += cc_w
+        return self
+
+    def to_graph(
+        self, names: dict, config: dict | None = None, domain_map: dict | None = None,
+    ) -> nx.DiGraph:
+        """集計結果から有向グラフを構築.
+
+        Args:
+          names: user_id → 表示名
+          domain_map: user_id → email domain
+        """
+        if config is None:
+            config = load_config_from_env()
+        company_domains = [d.lower() for d in config.get("company_domains", [])]
+
+        G = nx.DiGraph()
+        G.add_edges_from(
+            (u, v, {"to_weight": to_w, "cc_weight": cc_w})
+            for (u, v), (to_w, cc_w) in self.edge_weights.items()
+        )
+        _set_node_attributes(
+            G, names, {}, domain_map or {},
+            self.sent, self.received, self.cc_count, company_domains,
+        )
+        log.info("グラフ構築 (集計済み): %d ノード, %d エッジ", G.number_of_nodes(), G.number_of_edges())
+        return G
+
+
+class IncrementalGraph:
+    """レコードの追加・削除を差分で反映し続ける有向グラフ (build_graph と同じ属性).
+
+    同じチャンネルを繰り返し分析する場合に、毎回グラフを作り直す代わりに
+    変化したレコードだけを反映する。レコードは「グループ」単位で管理する
+    (Slack ではスレッド親の ts。スレッドのないメッセージは 1 件で 1 グループ)。
+    グループには期間判定用の基準時刻 anchor_ts を持たせ、expire_before() で
+    分析期間から外れたグループをまとめて取り除く。
+
+    エッジ重み・ノード統計は self.graph 上で直接増減し、重みが 0 になったエッジ、
+    次数が 0 になったノードはグラフから取り除く (build_graph と同じく、
+    エッジを持たないノードはグラフに含めない)。統計や名前が変わったノードは
+    changed_nodes に記録され、pop_changed_nodes() で取り出せる。
+    run_analysis_pipeline_from_incremental は、変化したノードが無ければ前回の分析結果
+    (last_result) をそのまま返す。
+
+    ノード・エッジの並び順は反映順になるため、build_graph とは異なる場合がある。
+    """
+
+    def __init__(self, config: dict | None = None, domain_map: dict | None = None):
+        if config is None:
+            config = load_config_from_env()
+        self.graph = nx.DiGraph()
+        self.domain_map = domain_map if domain_map is not None else {}
+        self.names: dict[str, str] = {}
+        self.total_records = 0
+        self.changed_nodes: set[str] = set()
+        self._company_domains = [d.lower() for d in config.get("company_domains", [])]
+        self._groups: dict = {}          # group → (anchor_ts, [(sender, to_ids, cc_ids), ...])
+        self._expiry: list = []          # (anchor_ts, 連番, group) のヒープ (古いエントリは遅延削除)
+        self._expiry_seq = itertools.count()
+        self._stats: dict[str, list[int]] = {}  # user_id → [sent, received, cc_count]
+        self.last_result: tuple[dict, dict] | None = None  # (分析時の config, vis.js 用 JSON)
+
+    # --- レコードの反映 -----------------------------------------------------
+
+    def replace_group(self, group, anchor_ts: float, records):
+        """group のレコードを records で置き換える (未登録なら追加).
+
+        Args:
+          records: (sender, to_ids, cc_ids) の iterable
+        """
+        records = [
+            (sender, tuple(to_ids), tuple(cc_ids))
+            for sender, to_ids, cc_ids in records if sender
+        ]
+        previous = self._groups.get(group)
+        if previous is not None:
+            if previous[1] == records:
+                if previous[0] != anchor_ts:
+                    self._groups[group] = (anchor_ts, records)
+                    heapq.heappush(self._expiry, (anchor_ts, next(self._expiry_seq), group))
+                return
+            self._apply(previous[1], -1)
+        self._groups[group] = (anchor_ts, records)
+        if previous is None or previous[0] != anchor_ts:
+            heapq.heappush(self._expiry, (anchor_ts, next(self._expiry_seq), group))
+        self._apply(records, +1)
+
+    def remove_group(self, group) -> bool:
+        """group のレコードをすべて取り除く。未登録なら False。"""
+        previous = self._groups.pop(group, None)
+        if previous is None:
+            return False
+        self._apply(previous[1], -1)
+        return True
+
+    def add_record(self, key, ts: float, sender: str, to_ids, cc_ids):
+        """1 レコードを 1 グループとして追加・置き換えする。"""
+        self.replace_group(key, ts, [(sender, to_ids, cc_ids)])
+
+    def remove_record(self, key) -> bool:
+        return self.remove_group(key)
+
+    def expire_before(self, cutoff_ts: float) -> int:
+        """anchor_ts が cutoff_ts より前のグループを取り除き、取り除いた数を返す。"""
+        removed = 0
+        while self._expiry and self._expiry[0][0] < cutoff_ts:
+            anchor_ts, _, group = heapq.heappop(self._expiry)
+            current = self._groups.get(group)
+            if current is not None and current[0] == anchor_ts:
+                self.remove_group(group)
+                removed += 1
+        return removed
+
+    def __contains__(self, group) -> bool:
+        return group in self._groups
+
+    def __len__(self) -> int:
+        return len(self._groups)
+
+    # --- ノード属性 ---------------------------------------------------------
+
+    def update_names(self, names: dict):
+        """表示名を更新する (グラフ上のノードで名前が変わったものは changed_nodes に入る)。"""
+        for user_id, name in names.items():
+            if self.names.get(user_id) == name:
+                continue
+            self.names[user_id] = name
+            if user_id in self.graph:
+                self._refresh_node(user_id)
+
+    def pop_changed_nodes(self) -> set[str]:
+        """前回呼び出し以降に変化したノード ID を返し、記録をリセットする。"""
+        changed, self.changed_nodes = self.changed_nodes, set()
+        return changed
+
+    # --- 内部処理 -----------------------------------------------------------
+
+    def _apply(self, records, sign: int):
+        touched = set()
+        for sender, to_ids, cc_ids in records:
+            self.total_records += sign
+            self._bump(sender, 0, sign)
+            touched.add(sender)
+            for kind, ids in ((1, to_ids), (2, cc_ids)):
+                weight_key = "to_weight" if kind == 1 else "cc_weight"
+                for uid in ids:
+                    self._bump(uid, kind, sign)
+                    touched.add(uid)
+                    self._bump_edge(sender, uid, weight_key, sign)
+        for node_id in touched:
+            if self.graph.has_node(node_id) and self.graph.degree(node_id) == 0:
+                self.graph.remove_node(node_id)
+            elif self.graph.has_node(node_id):
+                self._refresh_node(node_id)
+            if not any(self._stats.get(node_id, ())):
+                self._stats.pop(node_id, None)
+        self.changed_nodes |= touched
+
+    def _bump(self, user_id: str, index: int, sign: int):
+        stats = self._stats.get(user_id)
+        if stats is None:
+            stats = self._stats[user_id] = [0, 0, 0]
+        stats[index] += sign
+
+    def _bump_edge(self, u: str, v: str, weight_key: str, sign: int):
+        if sign > 0 and not self.graph.has_edge(u, v):
+            self.graph.add_edge(u, v, to_weight=0, cc_weight=0)
+        data = self.graph[u][v]
+        data[weight_key] += sign
+        if data["to_weight"] == 0 and data["cc_weight"] == 0:
+            self.graph.remove_edge(u, v)
+
+    def _refresh_node(self, node_id: str):
+        sent, received, cc_count = self._stats.get(node_id, (0, 0, 0))
+        domain = self.domain_map.get(node_id, "")
+        self.graph.nodes[node_id].update({
+            "name": self.names.get(node_id) or node_id,
+            "email": node_id,
+            "domain": domain,
+            "is_internal": _is_internal(domain, self._company_domains),
+            "sent": sent,
+            "received": received,
+            "cc_count": cc_count,
+        })
+        self.changed_nodes.add(node_id)
+
+
 # ---------------------------------------------------------------------------
 # Analysis
 # ---------------------------------------------------------------------------
 
-def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -> dict:
+def analyze_graph(
+    G: nx.DiGraph, total_mails: int, config: dict | None = None,
+    community_detector: CommunityDetector | None = None, partition_key=None,
+) -> dict:
     """ネットワーク分析を実行.
 
+    community_detector を渡した場合、partition_key (例: チャンネル ID) ごとの前回の分割から
+    Louvain をウォームスタートし、コミュニティ ID を引き継ぐ。省略時は毎回最初から計算する。
+
     Returns:
         dict with keys: total_mails, cc_key_persons, hubs, communities, community_map
     """
@@ -223,6 +659,7 @@ def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -
             "community_map": {},
             "cc_key_persons": [],
             "hubs": [],
+            "betweenness": {},
         }
 
     thresholds = config.get("thresholds", {})
@@ -245,40 +682,58 @@ def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -
     hub_dw = thresholds.get("hub_degree_weight", 0.5)
     hub_bw = thresholds.get("hub_betweenness_weight", 0.5)
 
-    undirected = G.to_undirected()
-    degree_c = nx.degree_centrality(undirected)
-    # 大規模グラフでは近似計算 (k サンプリング) で高速化
-    n_nodes = len(undirected)
-    if n_nodes > 200:
-        k = min(100, n_nodes)
-        betweenness_c = nx.betweenness_centrality(undirected, k=k)
-        log.info("Betweenness centrality: 近似計算 (k=%d/%d)", k, n_nodes)
-    else:
-        betweenness_c = nx.betweenness_centrality(undirected)
-
-    hub_scores = {}
-    for node in G.nodes:
-        hub_scores[node] = (
-            hub_dw * degree_c.get(node, 0)
-            + hub_bw * betweenness_c.get(node, 0)
+    # 次数・PageRank (大規模グラフでは疎行列バックエンド)
+    analytics_config = config.get("analytics", DEFAULT_CONFIG["analytics"])
+    with span("node_metrics"):
+        metrics = compute_metrics(
+            G, analytics_config.get("backend", "auto"),
+            analytics_config.get("sparse_min_nodes", SPARSE_MIN_NODES),
+        )
+    undirected = metrics.undirected
+    nodes = metrics.nodes
+    degree_c = metrics.degree_centrality
+
+    # 大規模グラフでは適応サンプリングで近似し、ハブ上位 20 件が安定したら打ち切る
+    betweenness_config = config.get("betweenness", DEFAULT_CONFIG["betweenness"])
+    with span("centrality"):
+        betweenness = betweenness_centrality(
+            undirected,
+            mode=betweenness_config.get("mode", "auto"),
+            tolerance=betweenness_config.get("tolerance", DEFAULT_BETWEENNESS_TOLERANCE),
+            max_samples=betweenness_config.get("max_samples", DEFAULT_BETWEENNESS_MAX_SAMPLES),
+            base=dict(zip(nodes, (hub_dw * degree_c).tolist())),
+            weight=hub_bw,
         )
+    betweenness_c = np.fromiter((betweenness.scores[node] for node in nodes), dtype=float, count=len(nodes))
+    log.info(
+        "Betweenness centrality: %s (始点 %d/%d, 相対誤差 %.3f, %d プロセス), 指標: %s",
+        betweenness.method, betweenness.samples, len(undirected), betweenness.error, betweenness.workers,
+        metrics.backend,
+    )
 
-    top_hubs = sorted(hub_scores.items(), key=lambda x: x[1], reverse=True)[:20]
+    hub_scores = hub_dw * degree_c + hub_bw * betweenness_c
     hubs = []
-    for node_id, score in top_hubs:
+    for i in np.argsort(-hub_scores, kind="stable")[:20].tolist():
+        node_id = nodes[i]
         data = G.nodes[node_id]
         hubs.append({
             "email": node_id,
             "name": data.get("name", node_id),
-            "score": round(score, 4),
-            "degree_centrality": round(degree_c.get(node_id, 0), 4),
-            "betweenness_centrality": round(betweenness_c.get(node_id, 0), 4),
+            "score": round(float(hub_scores[i]), 4),
+            "degree_centrality": round(float(degree_c[i]), 4),
+            "betweenness_centrality": round(float(betweenness_c[i]), 4),
+            "weighted_degree": int(metrics.weighted_degree[i]),
+            "pagerank": round(float(metrics.pagerank[i]), 6),
         })
 
     # --- Louvain コミュニティ ---
-    communities = list(nx.community.louvain_communities(undirected, seed=42))
+    with span("louvain"):
+        if community_detector is not None:
+            communities = community_detector.detect(undirected, partition_key).communities
+        else:
+            communities = list(enumerate(nx.community.louvain_communities(undirected, seed=42)))
     community_map = {}
-    for idx, comm in enumerate(communities):
+    for idx, comm in communities:
         for node in comm:
             community_map[node] = idx
 
@@ -286,7 +741,7 @@ def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -
         G.nodes[node]["community"] = community_map.get(node, 0)
 
     community_info = []
-    for idx, comm in enumerate(communities):
+    for idx, comm in communities:
         members = [
             {"email": n, "name": G.nodes[n].get("name", n)}
             for n in comm if n in G.nodes
@@ -309,6 +764,11 @@ def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -
         "hubs": hubs,
         "communities": community_info,
         "community_map": community_map,
+        "betweenness": {
+            "method": betweenness.method,
+            "samples": betweenness.samples,
+            "error": round(betweenness.error, 4),
+        },
     }
 
 
@@ -316,8 +776,32 @@ def analyze_graph(G: nx.DiGraph, total_mails: int, config: dict | None = None) -
 # vis.js data generation
 # ---------------------------------------------------------------------------
 
+def compute_layout(G: nx.DiGraph, community_map: dict, iterations: int = DEFAULT_LAYOUT_ITERATIONS) -> dict:
+    """コミュニティを初期配置にした力学モデルでノード座標を計算する.
+
+    ノードは ID 順に並べて計算するため、グラフへの追加順が違っても同じ座標になる。
+
+    Returns:
+        {node_id: (x, y)}
+    """
+    index = {node: i for i, node in enumerate(sorted(G.nodes))}
+    edge_count = G.number_of_edges()
+    sources = np.fromiter((index[u] for u, _ in G.edges), dtype=np.intp, count=edge_count)
+    targets = np.fromiter((index[v] for _, v in G.edges), dtype=np.intp, count=edge_count)
+    weights = np.fromiter(
+        (d.get("to_weight", 0) + d.get("cc_weight", 0) for _, _, d in G.edges(data=True)),
+        dtype=float, count=edge_count,
+    )
+    communities = np.fromiter((community_map.get(node, 0) for node in index), dtype=np.intp, count=len(index))
+    positions = force_layout(sources, targets, weights, communities, iterations=iterations)
+    return {node: (round(float(x), 1), round(float(y), 1)) for node, (x, y) in zip(index, positions)}
+
+
 def generate_vis_data(G: nx.DiGraph, analysis: dict, config: dict | None = None) -> dict:
-    """vis.js 用の JSON データを生成."""
+    """vis.js 用の JSON データを生成.
+
+    config["layout"]["enabled"] のとき、ノードにサーバー側で計算した座標 (x / y) を含める。
+    """
     if config is None:
         config = load_config_from_env()
     thresholds = config.get("thresholds", {})
@@ -325,6 +809,12 @@ def generate_vis_data(G: nx.DiGraph, analysis: dict, config: dict | None = None)
     community_map = analysis["community_map"]
     communities = analysis["communities"]
 
+    layout_config = config.get("layout", DEFAULT_CONFIG["layout"])
+    positions = {}
+    if layout_config.get("enabled") and G.number_of_nodes():
+        with span("layout"):
+            positions = compute_layout(G, community_map, layout_config.get("iterations", DEFAULT_LAYOUT_ITERATIONS))
+
     # ノードデータ
     nodes = []
     cc_key_emails = {p["email"] for p in analysis["cc_key_persons"]}
@@ -357,6 +847,8 @@ def generate_vis_data(G: nx.DiGraph, analysis: dict, config: dict | None = None)
             "is_cc_key": node in cc_key_emails,
             "is_hub": node in hub_emails,
         })
+        if node in positions:
+            nodes[-1]["x"], nodes[-1]["y"] = positions[node]
 
     # エッジデータ
     edges = []
@@ -399,6 +891,7 @@ def generate_vis_data(G: nx.DiGraph, analysis: dict, config: dict | None = None)
             "total_edges": len(edges),
             "cc_key_persons": analysis["cc_key_persons"],
             "hubs": analysis["hubs"],
+            "betweenness": analysis.get("betweenness", {}),
         },
         "wordcloud_data": wordcloud_data,
     }
@@ -413,8 +906,94 @@ def run_analysis_pipeline(df: pd.DataFrame, config: dict | None = None, domain_m
     if config is None:
         config = load_config_from_env()
 
-    G = build_graph(df, config, domain_map)
+    with span("build_graph"):
+        G = build_graph(df, config, domain_map)
     total_mails = len(df)
     analysis = analyze_graph(G, total_mails, config)
-    vis_data = generate_vis_data(G, analysis, config)
+    with span("vis_data"):
+        vis_data = generate_vis_data(G, analysis, config)
     return vis_data
+
+
+def run_analysis_pipeline_from_edges(
+    tables: EdgeTables, config: dict | None = None, domain_map: dict | None = None,
+    community_detector: CommunityDetector | None = None, partition_key=None,
+) -> dict:
+    """EdgeTables → グラフ構築 → 分析 → vis.js JSON の一括実行 (Slack 入力向け).
+
+    community_detector / partition_key は analyze_graph に渡す。
+
+    Returns:
+        run_analysis_pipeline と同じ vis.js 用 JSON データ
+    """
+    if config is None:
+        config = load_config_from_env()
+
+    with span("build_graph"):
+        G = build_graph_from_edges(tables, config, domain_map)
+    total_mails = len(tables.records)
+    analysis = analyze_graph(G, total_mails, config, community_detector, partition_key)
+    with span("vis_data"):
+        vis_data = generate_vis_data(G, analysis, config)
+    return vis_data
+
+
+def run_analysis_pipeline_from_accumulator(
+    accumulator: GraphAccumulator, names: dict,
+    config: dict | None = None, domain_map: dict | None = None,
+    community_detector: CommunityDetector | None = None, partition_key=None,
+) -> dict:
+    """GraphAccumulator → グラフ構築 → 分析 → vis.js JSON の一括実行 (ストリーミング取得向け).
+
+    community_detector / partition_key は analyze_graph に渡す。
+
+    Returns:
+        run_analysis_pipeline と同じ vis.js 用 JSON データ
+    """
+    if config is None:
+        config = load_config_from_env()
+
+    with span("build_graph"):
+        G = accumulator.to_graph(names, config, domain_map)
+    analysis = analyze_graph(G, accumulator.total_records, config, community_detector, partition_key)
+    with span("vis_data"):
+        vis_data = generate_vis_data(G, analysis, config)
+    return vis_data
+
+
+def run_analysis_pipeline_from_incremental(
+    incremental: IncrementalGraph, config: dict | None = None,
+    community_detector: CommunityDetector | None = None, partition_key=None,
+) -> dict:
+    """IncrementalGraph → 分析 → vis.js JSON の一括実行 (差分更新向け).
+
+    グラフの構築は済んでいるため、分析と vis.js JSON の生成のみを行う。前回の分析から
+    変化したノードが無く設定も同じなら、指標・centrality・Louvain・レイアウトを
+    計算し直さずに前回の結果を返す。分析に失敗した場合は変化したノードを戻し、
+    前回の結果を捨てる (次回は必ず分析し直す)。
+    community_detector / partition_key は analyze_graph に渡す。
+
+    Returns:
+        run_analysis_pipeline と同じ vis.js 用 JSON データ
+    """
+    if config is None:
+        config = load_config_from_env()
+
+    G = incremental.graph
+    changed = incremental.pop_changed_nodes()
+    log.info("差分更新グラフ: 変化したノード %d / %d", len(changed), G.number_of_nodes())
+    if not changed and incremental.last_result is not None and incremental.last_result[0] == config:
+        log.info("差分更新グラフ: 変化が無いため前回の分析結果を再利用")
+        return dict(incremental.last_result[1])
+
+    try:
+        analysis = analyze_graph(G, incremental.total_records, config, community_detector, partition_key)
+        with span("vis_data"):
+            vis_data = generate_vis_data(G, analysis, config)
+    except BaseException:
+        # 失敗した分析の変化は次回に持ち越し、前回の結果は使わせない
+        incremental.changed_nodes |= changed
+        incremental.last_result = None
+        raise
+    incremental.last_result = (copy.deepcopy(config), vis_data)
+    return dict(vis_data)
@@ -0,0 +1,167 @@
+"""ハブ検出用のノード指標 (NetworkX バックエンド / 疎行列バックエンド).
+
+どちらのバックエンドも、ノード順 (G.nodes の順) に並べた numpy 配列で
+degree centrality・重み付き次数 (to + cc)・PageRank を返す。
+
+  - networkx: G.to_undirected() と nx.degree_centrality。小さなグラフ向け
+  - sparse:   ユーザーを整数インデックスにした隣接行列を COO 形式の配列
+              (行・列・重み) で 1 度だけ作り、次数は bincount、PageRank は
+              疎行列 × ベクトルのべき乗法で計算する。属性をコピーしないため
+              大規模グラフでもメモリが増えにくい
+
+PageRank はどちらも辺の配列 (行・列・重み) に対するべき乗法 (pagerank_coo) で計算する
+(nx.google_matrix の密行列は O(n²) のメモリを使い、nx.pagerank は scipy を必要とするため)。
+
+auto は SPARSE_MIN_NODES ノード以上で sparse を選ぶ。
+"""
+
+from typing import NamedTuple
+
+import networkx as nx
+import numpy as np
+
+SPARSE_MIN_NODES = 2000
+BACKENDS = ("auto", "networkx", "sparse")
+# PageRank のパラメータ (nx.pagerank のデフォルトと同じ)
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOL = 1e-6
+PAGERANK_MAX_ITER = 100
+
+
+class GraphMetrics(NamedTuple):
+    backend: str
+    nodes: list                    # 配列の並び (G.nodes の順)
+    degree_centrality: np.ndarray  # 無向グラフでの次数 / (n - 1)
+    weighted_degree: np.ndarray    # 送受信したメンションの重み (to + cc) の合計
+    pagerank: np.ndarray           # 重み (to + cc) 付き有向グラフの PageRank
+    undirected: nx.Graph           # betweenness / Louvain 用の無向グラフ
+
+
+def _edge_weight(data: dict) -> int:
+    return data.get("to_weight", 0) + data.get("cc_weight", 0)
+
+
+def select_backend(G: nx.DiGraph, backend: str = "auto", sparse_min_nodes: int = SPARSE_MIN_NODES) -> str:
+    if backend == "auto":
+        return "sparse" if G.number_of_nodes() >= sparse_min_nodes else "networkx"
+    return backend
+
+
+def compute_metrics(G: nx.DiGraph, backend: str = "auto", sparse_min_nodes: int = SPARSE_MIN_NODES) -> GraphMetrics:
+    if select_backend(G, backend, sparse_min_nodes) == "sparse":
+        return SparseGraph(G).metrics()
+    return networkx_metrics(G)
+
+
+# --- NetworkX バックエンド ----------------------------------------------------
+
+def networkx_metrics(G: nx.DiGraph) -> GraphMetrics:
+    nodes = list(G.nodes)
+    n = len(nodes)
+    undirected = G.to_undirected()
+    degree_c = nx.degree_centrality(undirected)
+
+    weighted = dict.fromkeys(nodes, 0)
+    for u, v, data in G.edges(data=True):
+        weighted[u] += _edge_weight(data)
+        weighted[v] += _edge_weight(data)
+
+    index = {node: i for i, node in enumerate(nodes)}
+    m = G.number_of_edges()
+    rows = np.fromiter((index[u] for u, _ in G.edges), dtype=np.int64, count=m)
+    cols = np.fromiter((index[v] for _, v in G.edges), dtype=np.int64, count=m)
+    weights = np.fromiter((_edge_weight(d) for _, _, d in G.edges(data=True)), dtype=float, count=m)
+    rank = pagerank_coo(n, rows, cols, weights)
+
+    return GraphMetrics(
+        backend="networkx",
+        nodes=nodes,
+        degree_centrality=np.fromiter((degree_c[node] for node in nodes), dtype=float, count=n),
+        weighted_degree=np.fromiter((weighted[node] for node in nodes), dtype=float, count=n),
+        pagerank=rank,
+        undirected=undirected,
+    )
+
+
+def pagerank_coo(n: int, rows: np.ndarray, cols: np.ndarray, weights: np.ndarray,
+                 alpha: float = PAGERANK_ALPHA) -> np.ndarray:
+    """辺の配列 (rows → cols、重み weights) に対する PageRank.
+
+    nx.pagerank と同じ定義 (出次数 0 のノードの分は全ノードへ一様に配る)。
+    """
+    out_weight = np.bincount(rows, weights, minlength=n)
+    dangling = out_weight == 0
+    # 行を出次数の重みで正規化した遷移確率
+    transition = weights / np.where(out_weight == 0, 1.0, out_weight)[rows]
+    rank = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_MAX_ITER):
+        previous = rank
+        rank = alpha * np.bincount(cols, previous[rows] * transition, minlength=n)
+        rank += (alpha * previous[dangling].sum() + 1 - alpha) / n
+        if np.abs(rank - previous).sum() < n * PAGERANK_TOL:
+            break
+    return rank
+
+
+# --- 疎行列バックエンド -------------------------------------------------------
+
+class SparseGraph:
+    """メンショングラフの整数インデックス化した隣接行列 (COO 形式)."""
+
+    def __init__(self, G: nx.DiGraph):
+        self.nodes = list(G.nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        m = G.number_of_edges()
+        self.rows = np.empty(m, dtype=np.int64)
+        self.cols = np.empty(m, dtype=np.int64)
+        self.weights = np.empty(m, dtype=float)
+        for i, (u, v, data) in enumerate(G.edges(data=True)):
+            self.rows[i] = self.index[u]
+            self.cols[i] = self.index[v]
+            self.weights[i] = _edge_weight(data)
+
+    @property
+    def n(self) -> int:
+        return len(self.nodes)
+
+    def undirected_pairs(self) -> tuple[np.ndarray, np.ndarray]:
+        """向きを無視した重複のない辺 (u <= v)."""
+        low = np.minimum(self.rows, self.cols)
+        high = np.maximum(self.rows, self.cols)
+        pairs = np.unique(low * self.n + high)
+        return pairs // self.n, pairs % self.n
+
+    def degree_centrality(self) -> np.ndarray:
+        # nx.degree と同じく自己ループは次数 2 と数える
+        if self.n <= 1:
+            return np.ones(self.n)
+        low, high = self.undirected_pairs()
+        degree = np.bincount(low, minlength=self.n) + np.bincount(high, minlength=self.n)
+        return degree / (self.n - 1)
+
+    def weighted_degree(self) -> np.ndarray:
+        return (
+            np.bincount(self.rows, self.weights, minlength=self.n)
+            + np.bincount(self.cols, self.weights, minlength=self.n)
+        )
+
+    def pagerank(self, alpha: float = PAGERANK_ALPHA) -> np.ndarray:
+        return pagerank_coo(self.n, self.rows, self.cols, self.weights, alpha)
+
+    def undirected_graph(self) -> nx.Graph:
+        """属性を持たない無向グラフ (ノード・隣接の順序は G.to_undirected() と同じ)."""
+        graph = nx.Graph()
+        graph.add_nodes_from(self.nodes)
+        nodes = self.nodes
+        graph.add_edges_from(zip((nodes[i] for i in self.rows), (nodes[j] for j in self.cols)))
+        return graph
+
+    def metrics(self) -> GraphMetrics:
+        return GraphMetrics(
+            backend="sparse",
+            nodes=self.nodes,
+            degree_centrality=self.degree_centrality(),
+            weighted_degree=self.weighted_degree(),
+            pagerank=self.pagerank(),
+            undirected=self.undirected_graph(),
+        )
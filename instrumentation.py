@@ -0,0 +1,221 @@
+"""処理段階の計測と /metrics (Prometheus テキスト形式) 用のメトリクス.
+
+  - span(stage): 段階 (履歴取得・スレッド応答・ユーザー解決・変換・centrality・Louvain など) の
+    所要時間を mention_map_stage_seconds{stage} に記録する。分析ジョブの実行中
+    (start_run の内側) なら、その実行の内訳にも加える
+  - record_api_call: Slack API の呼び出し 1 回 (リトライは別に数える) の結果と
+    rate limiter の待機時間を記録する
+  - start_run: 1 回の分析の内訳 (RunMetrics) を contextvars で現在のスレッドに結び付ける。
+    ワーカープールに渡す関数は propagate で包むと、同じ実行の内訳に記録される
+  - RunMetrics.profiler: プロファイル付きの実行 (profiling.profile_run) のときだけ設定され、
+    span の境界と propagate したワーカーの実行を通知する
+
+段階は入れ子にできる (convert の時間は user_resolution を含む)。並行に実行した段階
+(複数チャンネル・スレッド応答の取得) の時間は各スレッドの合計になる。
+メトリクスはプロセス内のレジストリ (REGISTRY) に集め、render() でテキスト形式に書き出す。
+"""
+
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """counter / gauge / summary (count と sum のみ) を保持するレジストリ (スレッドセーフ).
+
+    collector (registry を受け取る関数) は render の直前に呼ばれ、キャッシュなどの
+    統計値を set で書き込む。
+    """
+
+    def __init__(self):
+        self._families: dict[str, tuple[str, str]] = {}   # name → (type, help)
+        self._values: dict[str, dict[tuple, float]] = defaultdict(dict)
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str):
+        with self._lock:
+            self._families[name] = (kind, help_text)
+
+    def add_collector(self, collector):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            values = self._values[name]
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name: str, value: float, **labels):
+        """summary に 1 件加える (name_count / name_sum として出力する)"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._values[name + "_count"]
+            sums = self._values[name + "_sum"]
+            counts[key] = counts.get(key, 0) + 1
+            sums[key] = sums.get(key, 0) + value
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            collector(self)
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._families.items()):
+                series = [name + "_count", name + "_sum"] if kind == "summary" else [name]
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for series_name in series:
+                    for labels, value in sorted(self._values.get(series_name, {}).items()):
+                        label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+                        suffix = f"{{{label_text}}}" if label_text else ""
+                        lines.append(f"{series_name}{suffix} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("mention_map_stage_seconds", "summary", "Time spent in each pipeline stage.")
+REGISTRY.describe("mention_map_slack_api_calls_total", "counter", "Slack Web API requests by method and outcome (ok / rate_limited / error).")
+REGISTRY.describe("mention_map_slack_rate_limit_wait_seconds_total", "counter", "Time spent waiting on the shared rate limiter, including Retry-After pauses.")
+REGISTRY.describe("mention_map_runs_total", "counter", "Analysis runs by kind (channel / trend / multi) and outcome (ok / empty / error).")
+REGISTRY.describe("mention_map_run_seconds", "summary", "Wall-clock time of analysis runs.")
+REGISTRY.describe("mention_map_last_graph_records", "gauge", "Records in the most recent analysis.")
+REGISTRY.describe("mention_map_last_graph_nodes", "gauge", "Nodes in the most recent analysis.")
+REGISTRY.describe("mention_map_last_graph_edges", "gauge", "Edges (above the weight threshold) in the most recent analysis.")
+REGISTRY.describe("mention_map_last_graph_communities", "gauge", "Communities in the most recent analysis.")
+
+
+class RunMetrics:
+    """1 回の分析の段階ごとの時間・API 呼び出し・グラフの規模 (スレッドセーフ)."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = defaultdict(float)
+        self.api: dict[str, dict] = {}
+        self.graph: dict[str, int] = {}
+        self.outcome = "ok"            # ok / empty / error
+        self.profiler = None           # profiling.RunProfiler (プロファイル付きの実行のみ)
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] += seconds
+
+    def add_api_call(self, method: str, outcome: str, wait: float):
+        with self._lock:
+            counts = self.api.get(method)
+            if counts is None:
+                counts = self.api[method] = {"calls": 0, "rate_limited": 0, "errors": 0, "wait_seconds": 0.0}
+            counts["calls"] += 1
+            if outcome == "rate_limited":
+                counts["rate_limited"] += 1
+            elif outcome == "error":
+                counts["errors"] += 1
+            counts["wait_seconds"] += wait
+
+    def set_graph(self, records: int, nodes: int, edges: int, communities: int):
+        """グラフの規模を記録する (直近の実行として gauge にも反映する)"""
+        self.graph = {"records": records, "nodes": nodes, "edges": edges, "communities": communities}
+        for name, value in self.graph.items():
+            REGISTRY.set(f"mention_map_last_graph_{name}", value)
+
+    def to_dict(self) -> dict:
+        """vis_data["metrics"] に加える内訳"""
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "elapsed_seconds": round(time.perf_counter() - self.started, 3),
+                "stages": {stage: round(seconds, 3) for stage, seconds in self.stages.items()},
+                "api": {
+                    method: {**counts, "wait_seconds": round(counts["wait_seconds"], 3)}
+                    for method, counts in sorted(self.api.items())
+                },
+                "graph": dict(self.graph),
+            }
+
+
+_current_run: contextvars.ContextVar[RunMetrics | None] = contextvars.ContextVar("mention_map_run", default=None)
+
+
+def current_run() -> RunMetrics | None:
+    return _current_run.get()
+
+
+@contextmanager
+def start_run(kind: str):
+    """分析 1 回分の RunMetrics を作り、終了時に件数と所要時間を記録する.
+
+    戻り値が無い (分析対象が無い) 場合は呼び出し側で run.outcome = "empty" にする。
+    """
+    run = RunMetrics(kind)
+    token = _current_run.set(run)
+    try:
+        yield run
+    except BaseException:
+        run.outcome = "error"
+        raise
+    finally:
+        _current_run.reset(token)
+        REGISTRY.inc("mention_map_runs_total", kind=kind, outcome=run.outcome)
+        REGISTRY.observe("mention_map_run_seconds", time.perf_counter() - run.started, kind=kind)
+
+
+def propagate(fn):
+    """現在の実行 (start_run) をワーカースレッドに引き継ぐラッパーを返す"""
+    run = _current_run.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current_run.set(run)
+        try:
+            if run is not None and run.profiler is not None:
+                return run.profiler.run_in_thread(fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+
+    return wrapper
+
+
+@contextmanager
+def span(stage: str):
+    """ブロックの所要時間を stage として記録する"""
+    run = _current_run.get()
+    profiler = run.profiler if run is not None else None
+    token = profiler.stage_started(stage) if profiler is not None else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        REGISTRY.observe("mention_map_stage_seconds", seconds, stage=stage)
+        if run is not None:
+            run.add_stage(stage, seconds)
+        if profiler is not None:
+            profiler.stage_finished(token)
+
+
+def record_api_call(method: str, outcome: str, wait: float = 0.0):
+    """Slack API の呼び出し 1 回 (outcome: ok / rate_limited / error) と事前の待機時間を記録する"""
+    REGISTRY.inc("mention_map_slack_api_calls_total", method=method, outcome=outcome)
+    if wait > 0:
+        REGISTRY.inc("mention_map_slack_rate_limit_wait_seconds_total", wait, method=method)
+    run = _current_run.get()
+    if run is not None:
+        run.add_api_call(method, outcome, wait)
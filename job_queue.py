@@ -0,0 +1,171 @@
+"""分析ジョブのキュー (有界ワーカープール + 同一リクエストの相乗り).
+
+- ジョブキー (チャンネル × 期間 × 設定) が同じリクエストが実行中・待機中なら
+  新しいジョブを作らず、同じ Future を返す (coalescing)
+- 同じグループ (チャンネル) のジョブは同時に 1 件まで実行する
+  (メッセージストアや差分更新グラフをチャンネル単位で共有しているため)。
+  グループをタプルで渡したジョブ (複数チャンネル) は、すべてのグループが空いたときに実行する
+- 待機中のジョブが max_pending に達したら QueueFull を送出する (バックプレッシャー)
+- バックグラウンドジョブ (定期的な事前計算) は対話的なジョブが待っていないときだけ、
+  同時に max_background 件まで実行する
+
+Slack のリスナースレッドはジョブを投入するだけで、取得・分析はワーカーで実行する。
+"""
+
+import logging
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_PENDING = 8
+
+
+class QueueFull(Exception):
+    """待機中のジョブが上限に達している。"""
+
+
+class _Job:
+    __slots__ = ("key", "groups", "fn", "args", "kwargs", "future", "background")
+
+    def __init__(self, key, group, fn, args, kwargs, background):
+        self.key = key
+        self.groups = tuple(group) if isinstance(group, tuple) else (group,)
+        self.background = background
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+
+
+class JobQueue:
+    """キー単位で相乗りし、グループ単位で直列化するジョブキュー (スレッドセーフ)."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, max_pending: int = DEFAULT_MAX_PENDING,
+                 name: str = "analysis", max_background: int = 1):
+        self.max_pending = max_pending
+        self.max_background = max_background
+        self._running_background = 0
+        self._pending: deque[_Job] = deque()
+        self._jobs: dict = {}              # key → 待機中または実行中の _Job
+        self._running_groups: set = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        self.coalesced = 0
+        self.rejected = 0
+        self._workers = [
+            threading.Thread(target=self._work, name=f"{name}-worker-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, key, group, fn, *args, background: bool = False, **kwargs) -> tuple[Future, bool]:
+        """ジョブを投入する。
+
+        group はタプルで複数指定できる (すべてのグループのジョブと直列化する)。
+        background=True のジョブは対話的なジョブより後回しにする。待機中の
+        バックグラウンドジョブに対話的なリクエストが相乗りした場合は優先度を上げる。
+
+        Returns:
+            (future, coalesced): coalesced は既存ジョブに相乗りした場合 True
+
+        Raises:
+            QueueFull: 待機中のジョブが max_pending 件に達している
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("job queue is shut down")
+            job = self._jobs.get(key)
+            if job is not None:
+                self.coalesced += 1
+                if not background and job.background and job in self._pending:
+                    job.background = False
+                    self._cond.notify()
+                return job.future, True
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f"{len(self._pending)} jobs pending")
+            job = _Job(key, group, fn, args, kwargs, background)
+            self._jobs[key] = job
+            self._pending.append(job)
+            self._cond.notify()
+            return job.future, False
+
+    def position(self, key) -> int | None:
+        """待機中のジョブより前にある対話的なジョブの数。実行中・未登録なら None。"""
+        with self._cond:
+            ahead = 0
+            for job in self._pending:
+                if job.key == key:
+                    return ahead
+                if not job.background:
+                    ahead += 1
+        return None
+
+    def has_pending(self, background: bool | None = None) -> bool:
+        """待機中のジョブがあるか (background で種類を絞り込む)。"""
+        with self._cond:
+            return any(background is None or job.background == background for job in self._pending)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "running": len(self._jobs) - len(self._pending),
+                "running_background": self._running_background,
+                "coalesced": self.coalesced,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, wait: bool = True):
+        """新規投入を止め、待機中のジョブを実行し終えたらワーカーを終了する。"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
+
+    # --- ワーカー -----------------------------------------------------------
+
+    def _next_job(self) -> _Job | None:
+        # 実行中でないグループのうち、最も古い対話的なジョブ → バックグラウンドジョブの順に取り出す
+        runnable = [job for job in self._pending if self._running_groups.isdisjoint(job.groups)]
+        job = next((j for j in runnable if not j.background), None)
+        if job is None and self._running_background < self.max_background:
+            job = next(iter(runnable), None)
+        if job is None:
+            return None
+        self._pending.remove(job)
+        self._running_groups.update(job.groups)
+        if job.background:
+            self._running_background += 1
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait()
+                    job = self._next_job()
+
+            if job.future.set_running_or_notify_cancel():
+                try:
+                    job.future.set_result(job.fn(*job.args, **job.kwargs))
+                except BaseException as e:
+                    log.exception("ジョブ %s が失敗しました", job.key)
+                    job.future.set_exception(e)
+
+            with self._cond:
+                self._jobs.pop(job.key, None)
+                self._running_groups.difference_update(job.groups)
+                if job.background:
+                    self._running_background -= 1
+                # 同じグループの待機ジョブが実行可能になった
+                self._cond.notify_all()
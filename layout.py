@@ -0,0 +1,132 @@
+"""サーバー側のグラフレイアウト (コミュニティを初期配置にした力学モデル).
+
+ブラウザ (vis.js) で毎回 barnesHut の安定化を走らせる代わりに、分析時に
+ノード座標を計算して vis.js 用 JSON に x / y として含める。
+
+  - 初期配置: コミュニティごとに円盤を割り当て、大きいコミュニティほど中心に
+    置く (ひまわり配置)。コミュニティ内のノードも円盤内にひまわり配置する
+  - 本計算: Fruchterman-Reingold をエッジ配列・座標配列の演算でベクトル化。
+    ノード数が REPULSION_SAMPLE を超える場合、斥力は毎反復ランダムに選んだ
+    ノードとの間だけで計算し、選ばなかった分を倍率で補う (O(n × sample))
+
+同じ入力からは同じ座標を返す (乱数のシードは固定)。
+"""
+
+import numpy as np
+
+# vis.js の barnesHut.springLength と揃えたノード間距離の目安 (px)
+SPRING_LENGTH = 120.0
+DEFAULT_ITERATIONS = 60
+# 斥力を全ノード対で計算するノード数の上限
+REPULSION_SAMPLE = 500
+# 1 回のレイアウトで計算する斥力のノード対の上限 (大規模グラフでは反復回数を減らす)
+MAX_PAIR_EVALUATIONS = 100_000_000
+MIN_ITERATIONS = 15
+# 斥力計算で一度に扱う (ノード × 相手) の要素数
+_BLOCK_ELEMENTS = 1_000_000
+# 原点へ引き戻す力の係数。斥力 (k² / d) と釣り合って、ノードが
+# 半径 k √n / 2 の円盤にほぼ一様に広がる強さ (連結成分が離れていかないように)
+GRAVITY = 4.0
+_GOLDEN_ANGLE = np.pi * (3 - np.sqrt(5))
+
+
+def _sunflower(count: int, radius: float) -> np.ndarray:
+    """半径 radius の円盤に count 点をほぼ等間隔に並べる."""
+    j = np.arange(count) + 0.5
+    rho = radius * np.sqrt(j / count)
+    theta = j * _GOLDEN_ANGLE
+    return np.column_stack((rho * np.cos(theta), rho * np.sin(theta)))
+
+
+def community_seed_positions(
+    communities: np.ndarray, spring_length: float = SPRING_LENGTH, seed: int = 42,
+) -> np.ndarray:
+    """コミュニティ番号の配列から初期座標 (n, 2) を作る."""
+    n = len(communities)
+    positions = np.zeros((n, 2))
+    if n == 0:
+        return positions
+    labels, inverse, sizes = np.unique(communities, return_inverse=True, return_counts=True)
+    order = np.argsort(-sizes, kind="stable")
+
+    # 大きい順にひまわり配置の外側へ。面積はノード数に比例させる
+    cumulative = np.cumsum(sizes[order])
+    centre_rho = spring_length * 0.6 * np.sqrt(cumulative - sizes[order] / 2)
+    centre_theta = np.arange(len(order)) * _GOLDEN_ANGLE
+    centres = np.empty((len(labels), 2))
+    centres[order] = np.column_stack((centre_rho * np.cos(centre_theta), centre_rho * np.sin(centre_theta)))
+
+    for label_index in range(len(labels)):
+        members = np.flatnonzero(inverse == label_index)
+        radius = spring_length * 0.5 * np.sqrt(len(members))
+        positions[members] = centres[label_index] + _sunflower(len(members), radius)
+
+    rng = np.random.default_rng(seed)
+    positions += rng.uniform(-0.05, 0.05, size=positions.shape) * spring_length
+    return positions
+
+
+def force_layout(
+    sources: np.ndarray, targets: np.ndarray, weights: np.ndarray, communities: np.ndarray,
+    iterations: int = DEFAULT_ITERATIONS, spring_length: float = SPRING_LENGTH, seed: int = 42,
+) -> np.ndarray:
+    """Fruchterman-Reingold でノード座標 (n, 2) を計算する.
+
+    反復回数は MAX_PAIR_EVALUATIONS に収まるよう減らす (ただし MIN_ITERATIONS 回は行う)。
+
+    Args:
+      sources / targets: エッジ両端のノード番号 (向きは無視する)
+      weights: エッジの重み (引力は log(1 + weight) 倍)
+      communities: ノードごとのコミュニティ番号 (初期配置に使う)
+    """
+    n = len(communities)
+    positions = community_seed_positions(communities, spring_length, seed)
+    if n <= 1 or iterations <= 0:
+        return positions - positions.mean(axis=0) if n else positions
+
+    k = spring_length
+    k2 = k * k
+    strength = np.log1p(np.asarray(weights, dtype=float))
+    rng = np.random.default_rng(seed)
+    sample_size = min(n, REPULSION_SAMPLE)
+    block = max(1, _BLOCK_ELEMENTS // sample_size)
+    iterations = min(iterations, max(MIN_ITERATIONS, MAX_PAIR_EVALUATIONS // (n * sample_size)))
+
+    # 初期配置が既にまとまっているので、温度 (1 反復の最大移動量) は小さめから線形に下げる
+    temperature = k * 2.0
+    cooling = temperature / (iterations + 1)
+
+    for _ in range(iterations):
+        if sample_size < n:
+            others = positions[rng.choice(n, sample_size, replace=False)]
+            scale = n / sample_size
+        else:
+            others = positions
+            scale = 1.0
+
+        # 斥力: k² / d (ベクトルは delta × k² / d²)
+        displacement = np.empty_like(positions)
+        other_x, other_y = others[:, 0], others[:, 1]
+        for start in range(0, n, block):
+            dx = positions[start:start + block, 0, None] - other_x
+            dy = positions[start:start + block, 1, None] - other_y
+            inverse = (k2 * scale) / np.maximum(dx * dx + dy * dy, 1e-2)
+            displacement[start:start + block, 0] = (dx * inverse).sum(axis=1)
+            displacement[start:start + block, 1] = (dy * inverse).sum(axis=1)
+
+        # 引力: d² / k × 重み (ベクトルは delta × d / k × 重み)
+        if len(sources):
+            delta = positions[sources] - positions[targets]
+            dist = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+            pull = delta * (dist * strength / k)[:, None]
+            for axis in (0, 1):
+                displacement[:, axis] -= np.bincount(sources, pull[:, axis], minlength=n)
+                displacement[:, axis] += np.bincount(targets, pull[:, axis], minlength=n)
+
+        displacement -= positions * GRAVITY
+
+        length = np.maximum(np.sqrt(np.einsum("ij,ij->i", displacement, displacement)), 1e-9)
+        positions += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    return positions - positions.mean(axis=0)
@@ -0,0 +1,191 @@
+"""Slack メッセージのローカル永続ストア (SQLite).
+
+チャンネル履歴とスレッド応答を (channel_id, parent_ts, ts) 単位で保存し、
+チャンネルごとに取得済み範囲 (oldest / high-watermark) を記録する。
+2 回目以降の実行では watermark より新しいメッセージだけを Slack API から取得し、
+残りはディスクから読み出す。
+
+保存するのは分析に必要なフィールド (_STORED_FIELDS) のみで、
+添付ファイルや blocks などは保存しない。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+
+log = logging.getLogger(__name__)
+
+# 分析 (build_dataframe) とスレッド差分判定に必要なフィールドのみ保存する
+_STORED_FIELDS = (
+    "type", "subtype", "user", "ts", "thread_ts", "text",
+    "reactions", "reply_count", "latest_reply",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id TEXT NOT NULL,
+    parent_ts  TEXT NOT NULL,   -- トップレベルは '' / スレッド応答は親の ts
+    ts         TEXT NOT NULL,
+    ts_num     REAL NOT NULL,
+    payload    TEXT NOT NULL,
+    PRIMARY KEY (channel_id, parent_ts, ts)
+);
+CREATE INDEX IF NOT EXISTS idx_messages_range ON messages (channel_id, parent_ts, ts_num);
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id TEXT PRIMARY KEY,
+    oldest_ts  REAL NOT NULL,   -- 取得済み範囲の下端 (リクエストした oldest)
+    latest_ts  REAL NOT NULL,   -- high-watermark (取得済みメッセージの最大 ts)
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    channel_id   TEXT NOT NULL,
+    parent_ts    TEXT NOT NULL,
+    latest_reply TEXT NOT NULL, -- 最後に取得成功した時点の親メッセージの latest_reply
+    PRIMARY KEY (channel_id, parent_ts)
+);
+"""
+
+
+def _trim(message: dict) -> dict:
+    return {k: message[k] for k in _STORED_FIELDS if k in message}
+
+
+class MessageStore:
+    """チャンネル単位の増分取得を支えるメッセージストア。
+
+    スレッドセーフ (接続は操作ごとに開き、書き込みはロックで直列化する)。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        with self._lock, closing(sqlite3.connect(self.path)) as conn:
+            with conn:
+                yield conn
+
+    # --- 取得済み範囲 -------------------------------------------------------
+
+    def get_coverage(self, channel_id: str) -> tuple[float, float] | None:
+        """(oldest_ts, latest_ts) を返す。未取得のチャンネルは None。"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT oldest_ts, latest_ts FROM channels WHERE channel_id = ?",
+                (channel_id,),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def update_coverage(self, channel_id: str, oldest_ts: float, latest_ts: float):
+        """取得済み範囲を広げる (既存範囲より狭くはしない)。"""
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO channels (channel_id, oldest_ts, latest_ts, updated_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (channel_id) DO UPDATE SET
+                    oldest_ts = MIN(oldest_ts, excluded.oldest_ts),
+                    latest_ts = MAX(latest_ts, excluded.latest_ts),
+                    updated_at = excluded.updated_at
+                """,
+                (channel_id, oldest_ts, latest_ts, time.time()),
+            )
+
+    # --- 書き込み -----------------------------------------------------------
+
+    def upsert_messages(self, channel_id: str, messages: list[dict]):
+        """トップレベルメッセージを保存 (同じ ts は上書き)。"""
+        rows = [
+            (channel_id, "", m["ts"], float(m["ts"]), json.dumps(_trim(m), ensure_ascii=False))
+            for m in messages if m.get("ts")
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)", rows,
+            )
+
+    def replace_thread(self, channel_id: str, parent_ts: str, replies: list[dict], latest_reply: str):
+        """スレッド応答を丸ごと置き換え、取得済みの latest_reply を記録する。"""
+        rows = [
+            (channel_id, parent_ts, r["ts"], float(r["ts"]), json.dumps(_trim(r), ensure_ascii=False))
+            for r in replies if r.get("ts")
+        ]
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM messages WHERE channel_id = ? AND parent_ts = ?",
+                (channel_id, parent_ts),
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?)", rows,
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO threads VALUES (?, ?, ?)",
+                (channel_id, parent_ts, latest_reply or ""),
+            )
+
+    # --- 読み出し -----------------------------------------------------------
+
+    def get_thread_states(self, channel_id: str) -> dict[str, str]:
+        """{parent_ts: latest_reply} — 取得済みスレッドの状態。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT parent_ts, latest_reply FROM threads WHERE channel_id = ?",
+                (channel_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def load_messages(self, channel_id: str, oldest_ts: float) -> list[dict]:
+        """oldest_ts 以降のトップレベルメッセージを新しい順で返す (conversations.history と同順)。"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT payload FROM messages
+                WHERE channel_id = ? AND parent_ts = '' AND ts_num >= ?
+                ORDER BY ts_num DESC
+                """,
+                (channel_id, oldest_ts),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def load_threads(self, channel_id: str, parent_ts_list) -> dict[str, list[dict]]:
+        """{parent_ts: [reply, ...]} を返す。応答は古い順。"""
+        wanted = set(parent_ts_list)
+        if not wanted:
+            return {}
+        thread_messages = {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                """
+                SELECT parent_ts, payload FROM messages
+                WHERE channel_id = ? AND parent_ts != ''
+                ORDER BY parent_ts, ts_num
+                """,
+                (channel_id,),
+            ).fetchall()
+        for parent_ts, payload in rows:
+            if parent_ts in wanted:
+                thread_messages.setdefault(parent_ts, []).append(json.loads(payload))
+        return thread_messages
+
+
+def open_store_from_env() -> MessageStore | None:
+    """MENTION_MAP_MESSAGE_STORE が設定されていればストアを開く (未設定時は無効)。"""
+    path = os.environ.get("MENTION_MAP_MESSAGE_STORE", "").strip()
+    if not path:
+        return None
+    try:
+        store = MessageStore(path)
+    except (OSError, sqlite3.Error) as e:
+        log.warning("メッセージストアを開けませんでした (%s): %s", path, e)
+        return None
+    log.info("メッセージストア: %s", path)
+    return store
@@ -0,0 +1,348 @@
+"""分析の実行単位のプロファイル (CPU: cProfile / メモリ: tracemalloc).
+
+`/mention-map ... profile` または MENTION_MAP_PROFILE=true の実行だけを対象にする。
+profile_run が instrumentation.RunMetrics に RunProfiler を結び付けると、
+
+  - CPU: ジョブのスレッドと、propagate で包んだワーカー (スレッド応答・チャンネルの取得) を
+    それぞれ cProfile で計測し、実行の終わりにまとめる。Python 3.12 以降の cProfile は
+    プロセス全体で 1 つしか有効にできない (sys.monitoring) ため、ジョブのスレッドで開始した
+    プロファイラーがワーカーも含めて計測する (同時に動くプロファイルなしのジョブも含まれる)
+  - メモリ: span の境界ごとに tracemalloc のピークを読み、段階ごとのピーク (段階開始時からの
+    増分) を記録する。ピークを更新した段階の終了時点と実行の終了時点で、確保量の多い行を記録する
+
+成果物 (cpu.prof / cpu.txt / memory.txt / memory.json) は ProfileStore のディレクトリに
+実行ごとに保存し、ダッシュボードの HTTP サーバーから /profiles でダウンロードできる。
+プロファイルを取らない実行では RunMetrics.profiler が None のままで、計測は行わない。
+
+tracemalloc (確保量とピーク) はプロセス全体で 1 つのため、プロファイル付きの実行は
+同時に 1 件ずつ行う。プロファイルなしのジョブと並行した場合はその確保も含まれる (MEMORY_NOTE)。
+"""
+
+import cProfile
+import io
+import itertools
+import json
+import logging
+import os
+import pstats
+import re
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+DEFAULT_KEEP = 20
+# 確保量の記録に使うスタックの深さ / 出力する行数
+TRACE_FRAMES = 1
+TOP_ALLOCATIONS = 25
+TOP_FUNCTIONS = 60
+# ピークがこの割合以上増えたときだけスナップショットを取り直す
+PEAK_SNAPSHOT_GROWTH = 1.1
+ARTIFACTS = ("cpu.txt", "memory.txt", "cpu.prof", "memory.json")
+_RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.,-]+$")
+# cProfile がプロセス全体を計測する (スレッドごとのプロファイラーを作れない) バージョン
+_PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+# メモリの計測範囲の注記 (memory.json / memory.txt と /profiles に載せる)
+MEMORY_NOTE = (
+    "Memory figures are process-wide (tracemalloc): they include allocations by jobs "
+    "running without profiling at the same time. Profiled runs are serialized."
+)
+
+# プロファイル付きの実行は同時に 1 件まで (reset_peak / get_traced_memory がプロセス全体で共有のため)
+_profile_lock = threading.Lock()
+# 既に tracemalloc を動かしていた場合 (外部から開始) は止めない
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_owned
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+        _tracing_owned = True
+
+
+def _stop_tracing():
+    global _tracing_owned
+    if _tracing_owned:
+        tracemalloc.stop()
+        _tracing_owned = False
+
+
+def _top_allocations(snapshot, limit: int = TOP_ALLOCATIONS) -> list[dict]:
+    if snapshot is None:
+        return []
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ))
+    return [
+        {
+            "file": stat.traceback[0].filename,
+            "line": stat.traceback[0].lineno,
+            "size_kb": round(stat.size / 1024, 1),
+            "count": stat.count,
+        }
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+
+
+class RunProfiler:
+    """1 回の実行の CPU プロファイルと段階ごとのメモリのピークを集める (スレッドセーフ)."""
+
+    def __init__(self, run_id: str, label: str):
+        self.run_id = run_id
+        self.label = label
+        self.started_at = time.time()
+        self.duration = 0.0
+        self._main = cProfile.Profile()
+        self._thread_profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._tokens = itertools.count()
+        self._open = {}            # token → [stage, 開始時の確保量, 区間内のピーク]
+        self.stages = {}           # stage → {"calls", "peak_bytes"}
+        self.peak_bytes = 0
+        self.peak_stage = None
+        self._snapshot_peak = 0
+        self._peak_snapshot = None
+        self._final_snapshot = None
+
+    def start(self):
+        _start_tracing()
+        tracemalloc.reset_peak()
+        self._local.active = True
+        self._main.enable()
+
+    def stop(self):
+        self._main.disable()
+        self._local.active = False
+        with self._lock:
+            self._checkpoint()
+        self._final_snapshot = tracemalloc.take_snapshot()
+        _stop_tracing()
+        self.duration = time.time() - self.started_at
+
+    def run_in_thread(self, fn, *args, **kwargs):
+        """ワーカースレッドで fn を実行し、そのスレッドの CPU プロファイルに加える
+
+        Python 3.12 以降はジョブのスレッドのプロファイラーが計測するため、そのまま実行する。
+        """
+        if _PROCESS_WIDE_PROFILER or getattr(self._local, "active", False):
+            return fn(*args, **kwargs)
+        profile = getattr(self._local, "profile", None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._thread_profiles.append(profile)
+        try:
+            profile.enable()
+        except ValueError as e:
+            # 別の計測ツールが有効 — プロファイルなしで実行する
+            log.debug("ワーカースレッドをプロファイルできません: %s", e)
+            return fn(*args, **kwargs)
+        self._local.active = True
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            self._local.active = False
+
+    # --- 段階ごとのメモリ (instrumentation.span から呼ばれる) ----------------
+
+    def _checkpoint(self) -> int:
+        """前回からのピークを開いている段階すべてに反映し、ピークをリセットする (要ロック)"""
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for entry in self._open.values():
+            entry[2] = max(entry[2], peak)
+        self.peak_bytes = max(self.peak_bytes, peak)
+        return current
+
+    def stage_started(self, stage: str) -> int:
+        with self._lock:
+            current = self._checkpoint()
+            token = next(self._tokens)
+            self._open[token] = [stage, current, current]
+        return token
+
+    def stage_finished(self, token: int):
+        with self._lock:
+            self._checkpoint()
+            stage, base, peak = self._open.pop(token)
+            entry = self.stages.setdefault(stage, {"calls": 0, "peak_bytes": 0})
+            entry["calls"] += 1
+            entry["peak_bytes"] = max(entry["peak_bytes"], peak - base)
+            if peak > self._snapshot_peak * PEAK_SNAPSHOT_GROWTH and tracemalloc.is_tracing():
+                # 段階の終了時点の確保状況 (ピークそのものの瞬間ではない)
+                self._snapshot_peak = peak
+                self.peak_stage = stage
+                self._peak_snapshot = tracemalloc.take_snapshot()
+
+    # --- 成果物 --------------------------------------------------------------
+
+    def cpu_stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self._main)
+        for profile in self._thread_profiles:
+            try:
+                stats.add(profile)
+            except TypeError:
+                # 何も計測しなかったスレッド
+                continue
+        return stats
+
+    def memory_report(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "label": self.label,
+            "duration_seconds": round(self.duration, 3),
+            "peak_mb": round(self.peak_bytes / 1024 / 1024, 2),
+            "stages": {
+                stage: {"calls": entry["calls"], "peak_mb": round(entry["peak_bytes"] / 1024 / 1024, 2)}
+                for stage, entry in self.stages.items()
+            },
+            "peak_stage": self.peak_stage,
+            "note": MEMORY_NOTE,
+            "top_allocations_at_peak": _top_allocations(self._peak_snapshot),
+            "top_allocations_at_end": _top_allocations(self._final_snapshot),
+        }
+
+    def write(self, directory: str):
+        """cpu.prof (pstats 形式) / cpu.txt / memory.json / memory.txt を書き出す"""
+        os.makedirs(directory, exist_ok=True)
+        stats = self.cpu_stats()
+        stats.dump_stats(os.path.join(directory, "cpu.prof"))
+
+        buffer = io.StringIO()
+        buffer.write(f"{self.label}  ({self.duration:.2f}s, {len(self._thread_profiles)} worker threads)\n")
+        stats.stream = buffer
+        stats.strip_dirs()
+        buffer.write("\n=== cumulative ===\n")
+        stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        buffer.write("\n=== tottime ===\n")
+        stats.sort_stats("tottime").print_stats(TOP_FUNCTIONS // 2)
+        with open(os.path.join(directory, "cpu.txt"), "w", encoding="utf-8") as f:
+            f.write(buffer.getvalue())
+
+        report = self.memory_report()
+        with open(os.path.join(directory, "memory.json"), "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        with open(os.path.join(directory, "memory.txt"), "w", encoding="utf-8") as f:
+            f.write(_format_memory_report(report))
+
+
+def _format_memory_report(report: dict) -> str:
+    lines = [
+        f"{report['label']}  ({report['duration_seconds']:.2f}s, peak {report['peak_mb']:.1f} MB)",
+        report["note"],
+        "",
+        f"{'stage':<20} {'calls':>7} {'peak [MB]':>10}",
+    ]
+    for stage, entry in sorted(report["stages"].items(), key=lambda item: -item[1]["peak_mb"]):
+        lines.append(f"{stage:<20} {entry['calls']:>7} {entry['peak_mb']:>10.1f}")
+    for title, key in (
+        (f"top allocations after {report['peak_stage']} (highest peak)", "top_allocations_at_peak"),
+        ("top allocations at the end of the run", "top_allocations_at_end"),
+    ):
+        lines += ["", title]
+        for item in report[key]:
+            lines.append(f"{item['size_kb']:>10.1f} KB {item['count']:>8}  {item['file']}:{item['line']}")
+    return "\n".join(lines) + "\n"
+
+
+class ProfileStore:
+    """実行ごとのプロファイルの保存先 (新しいものから keep 件を残す)."""
+
+    def __init__(self, directory: str, keep: int = DEFAULT_KEEP, always: bool = False):
+        self.directory = directory
+        self.keep = max(1, keep)
+        self.always = always       # すべての実行をプロファイルする (MENTION_MAP_PROFILE)
+        self._lock = threading.Lock()
+
+    def new_run_id(self, label: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_.,-]+", "_", label)[:60]
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}-{uuid.uuid4().hex[:6]}"
+
+    def save(self, profiler: RunProfiler):
+        with self._lock:
+            profiler.write(os.path.join(self.directory, profiler.run_id))
+            for run_id in self.run_ids()[self.keep:]:
+                shutil.rmtree(os.path.join(self.directory, run_id), ignore_errors=True)
+
+    def run_ids(self) -> list[str]:
+        """保存済みの実行 ID (新しい順)"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((name for name in names if _RUN_ID_PATTERN.match(name)), reverse=True)
+
+    def list_runs(self) -> list[dict]:
+        runs = []
+        for run_id in self.run_ids():
+            directory = os.path.join(self.directory, run_id)
+            files = [name for name in ARTIFACTS if os.path.exists(os.path.join(directory, name))]
+            if files:
+                runs.append({"id": run_id, "created_at": os.path.getmtime(directory), "files": files})
+        return runs
+
+    def artifact_path(self, run_id: str, name: str) -> str | None:
+        """ダウンロード対象のファイルのパス (実行 ID・ファイル名が不正、または存在しなければ None)"""
+        if name not in ARTIFACTS or not _RUN_ID_PATTERN.match(run_id) or run_id in (".", ".."):
+            return None
+        path = os.path.join(self.directory, run_id, name)
+        return path if os.path.isfile(path) else None
+
+
+@contextmanager
+def profile_run(run, store: ProfileStore, label: str, enabled: bool):
+    """enabled のとき、ブロックの間 run (instrumentation.RunMetrics) をプロファイルして保存する.
+
+    RunProfiler (保存前でも run_id は参照できる) を、無効なら None を返す。
+    別のプロファイル付きの実行が動いている間は、それが終わるまで待つ。
+    """
+    if not enabled:
+        yield None
+        return
+    if not _profile_lock.acquire(blocking=False):
+        log.info("プロファイル付きの実行が終わるまで待機します: %s", label)
+        _profile_lock.acquire()
+    try:
+        profiler = RunProfiler(store.new_run_id(label), label)
+        run.profiler = profiler
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
+            run.profiler = None
+            try:
+                store.save(profiler)
+                log.info("プロファイルを保存しました: %s", profiler.run_id)
+            except OSError as e:
+                log.warning("プロファイルを保存できませんでした (%s): %s", profiler.run_id, e)
+    finally:
+        _profile_lock.release()
+
+
+def load_profile_store_from_env(default_dir: str) -> ProfileStore:
+    """環境変数からプロファイルの保存先を作成する。
+
+    MENTION_MAP_PROFILE       (bool) すべての分析をプロファイルする (既定は `profile` 指定時のみ)
+    MENTION_MAP_PROFILE_DIR   (str)  保存先ディレクトリ (既定: <default_dir>/profiles)
+    MENTION_MAP_PROFILE_KEEP  (int)  残す実行の数
+    """
+    always = os.environ.get("MENTION_MAP_PROFILE", "").strip().lower() in ("1", "true", "yes")
+    directory = os.environ.get("MENTION_MAP_PROFILE_DIR") or os.path.join(default_dir, "profiles")
+    try:
+        keep = int(os.environ.get("MENTION_MAP_PROFILE_KEEP", str(DEFAULT_KEEP)))
+    except ValueError:
+        log.warning("Invalid value for MENTION_MAP_PROFILE_KEEP")
+        keep = DEFAULT_KEEP
+    return ProfileStore(directory, keep=keep, always=always)
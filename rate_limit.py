@@ -0,0 +1,145 @@
+"""Slack Web API 用の共有 rate limiter.
+
+メソッドごとに 1 分あたりの呼び出し予算を持ち、呼び出し前に間隔を空けて
+429 を未然に防ぐ。429 を受けた場合は Retry-After の間そのメソッドを止め、
+呼び出し間隔を一時的に広げる (record_success で成功を報告するたびに元の予算へ戻していく)。
+
+全スレッドで 1 つのインスタンスを共有する想定 (スレッドセーフ)。
+"""
+
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# 1 分あたりの呼び出し予算 (Slack の rate limit tier に準拠)
+DEFAULT_BUDGETS = {
+    "conversations.history": 50,   # Tier 3
+    "conversations.replies": 50,   # Tier 3
+    "conversations.members": 100,  # Tier 4
+    "users.info": 100,             # Tier 4
+    "users.list": 20,              # Tier 2
+    "chat.postMessage": 60,        # Special (1 件/秒/チャンネル)
+}
+# 予算が未定義のメソッド (Tier 2 相当)
+DEFAULT_PER_MINUTE = 20
+
+# 予算を超えて連続で呼べる回数
+BURST = 3
+# 429 を受けたときに呼び出し間隔を広げる倍率と上限
+BACKOFF_FACTOR = 1.5
+MAX_BACKOFF = 8.0
+# 成功 1 回ごとに広げた間隔を戻す割合
+RECOVERY_FACTOR = 0.95
+
+
+class _MethodState:
+    __slots__ = (
+        "base_interval", "interval", "tat", "blocked_until", "calls", "waited", "rate_limited",
+    )
+
+    def __init__(self, per_minute: float):
+        self.base_interval = 60.0 / per_minute
+        self.interval = self.base_interval
+        self.tat = 0.0            # 次の呼び出しの理論到着時刻 (GCRA)
+        self.blocked_until = 0.0  # Retry-After による停止期限
+        self.calls = 0
+        self.waited = 0.0
+        self.rate_limited = 0
+
+
+class RateLimiter:
+    """メソッド単位の予算で呼び出しを事前にペーシングする."""
+
+    def __init__(self, budgets: dict | None = None, default_per_minute: float = DEFAULT_PER_MINUTE):
+        self._budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self._default_per_minute = default_per_minute
+        self._states: dict[str, _MethodState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, method: str) -> _MethodState:
+        state = self._states.get(method)
+        if state is None:
+            state = _MethodState(self._budgets.get(method, self._default_per_minute))
+            self._states[method] = state
+        return state
+
+    def acquire(self, method: str) -> float:
+        """method を呼び出せるまで待機する。待機した秒数を返す。"""
+        with self._lock:
+            state = self._state(method)
+            now = time.monotonic()
+            tat = max(state.tat, now)
+            start = max(now, tat - BURST * state.interval, state.blocked_until)
+            tat = max(tat, start)
+            state.tat = tat + state.interval
+            state.calls += 1
+            wait = start - now
+            state.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def delay(self, method: str) -> float:
+        """今 method を呼んだ場合に待つことになる秒数 (予約はしない)。"""
+        with self._lock:
+            state = self._states.get(method)
+            if state is None:
+                return 0.0
+            now = time.monotonic()
+            start = max(now, state.tat - BURST * state.interval, state.blocked_until)
+            return start - now
+
+    def record_success(self, method: str):
+        """429 以外の応答を受けたことを反映する: 広げた呼び出し間隔を少し元に戻す。"""
+        with self._lock:
+            state = self._states.get(method)
+            if state is not None and state.interval > state.base_interval:
+                state.interval = max(state.base_interval, state.interval * RECOVERY_FACTOR)
+
+    def report_retry_after(self, method: str, retry_after: float):
+        """429 の Retry-After を反映する: その間 method を止め、間隔を広げる。"""
+        with self._lock:
+            state = self._state(method)
+            state.rate_limited += 1
+            state.blocked_until = max(state.blocked_until, time.monotonic() + retry_after)
+            state.interval = min(state.base_interval * MAX_BACKOFF, state.interval * BACKOFF_FACTOR)
+        log.info("%s: rate limited, pausing %.1fs (interval %.2fs)", method, retry_after, state.interval)
+
+    def total_wait(self) -> float:
+        """全メソッド・全スレッドの累積待機秒数 (Retry-After による待機を含む)。"""
+        with self._lock:
+            return sum(s.waited for s in self._states.values())
+
+    def stats(self) -> dict:
+        """{method: {calls, waited, rate_limited, per_minute}} を返す。"""
+        with self._lock:
+            return {
+                method: {
+                    "calls": s.calls,
+                    "waited": round(s.waited, 3),
+                    "rate_limited": s.rate_limited,
+                    "per_minute": round(60.0 / s.interval, 1),
+                }
+                for method, s in self._states.items()
+            }
+
+
+def load_budgets_from_env() -> dict:
+    """MENTION_MAP_RATE_BUDGETS ("method=回数/分,...") で予算を上書きする。"""
+    budgets = dict(DEFAULT_BUDGETS)
+    raw = os.environ.get("MENTION_MAP_RATE_BUDGETS", "")
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        method, _, value = item.partition("=")
+        try:
+            per_minute = float(value)
+        except ValueError:
+            log.warning("Invalid value for MENTION_MAP_RATE_BUDGETS: %s", item)
+            continue
+        if per_minute > 0:
+            budgets[method.strip()] = per_minute
+    return budgets
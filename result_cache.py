@@ -0,0 +1,226 @@
+"""分析結果 (vis.js 用 JSON) のキャッシュ.
+
+(channel_id, days, 設定ハッシュ) をキーに、シリアライズ済みの JSON を保持する。
+エントリ数とバイト数の上限を超えると最も長く使われていないものから捨てる (LRU)。
+ダッシュボードはチャンネル (+ 期間) を指定して結果を引けるため、
+別チャンネルの分析で他のユーザーのダッシュボードが上書きされることはない。
+
+JSON のシリアライズ・gzip 圧縮・ETag の計算は格納時に 1 回だけ行い、
+HTTP サーバーはリクエストごとに同じバイト列を返す。
+トレンド分析の結果 (vis_data["timeline"]) は /timeline 用に別のボディとして保持する。
+ノード数が default_node_limit を超える結果は、活動量の多いノードに絞った最初のページを
+事前エンコードしておき、ダッシュボードの最初の読み込みでもそのまま返せるようにする。
+バイト数には索引 (VisIndex の応答キャッシュを含む) のメモリも算入する。
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 16
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_FRESH_SECONDS = 10 * 60
+# 引数なしの /vis-data で返すノード数の上限 (活動量の多い順)
+DEFAULT_NODE_LIMIT = 1500
+# 圧縮率と速度のバランス (JSON は 6 で 9 とほぼ同じ圧縮率になる)
+GZIP_LEVEL = 6
+
+
+def config_hash(config: dict) -> str:
+    """分析設定 (core.load_config_from_env の結果) の短いハッシュ."""
+    encoded = json.dumps(config, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:12]
+
+
+class EncodedBody(NamedTuple):
+    """HTTP レスポンス用に事前エンコードしたボディ."""
+    raw: bytes
+    gzipped: bytes
+    etag: str              # 引用符付きの強い ETag
+
+    @property
+    def size(self) -> int:
+        return len(self.raw) + len(self.gzipped)
+
+
+def encode_body(raw: bytes) -> EncodedBody:
+    """gzip 圧縮と ETag (内容の SHA-256) を計算する."""
+    digest = hashlib.sha256(raw).hexdigest()[:32]
+    return EncodedBody(raw, gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0), f'"{digest}"')
+
+
+class CacheEntry(NamedTuple):
+    channel_id: str
+    days: int
+    config_hash: str
+    created_at: float      # 分析完了時刻 (epoch 秒)
+    body: EncodedBody      # /vis-data でそのまま返す JSON (raw / gzip。大きなグラフは最初のページ)
+    summary: dict          # Slack 通知用の件数 (nodes / edges / communities / hubs)
+    index: object = None   # index_factory で構築した索引 (絞り込み・ego グラフ用)
+    timeline: EncodedBody | None = None   # /timeline で返す JSON (トレンド分析のみ)
+
+    @property
+    def size(self) -> int:
+        # 索引の応答キャッシュは格納後も増減するため、毎回数え直す
+        return (
+            self.body.size + (self.timeline.size if self.timeline else 0)
+            + getattr(self.index, "size", 0)
+        )
+
+
+class ResultCache:
+    """分析結果の LRU キャッシュ (スレッドセーフ)."""
+
+    def __init__(
+        self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+        fresh_seconds: float = DEFAULT_FRESH_SECONDS, index_factory=None,
+        default_node_limit: int = DEFAULT_NODE_LIMIT,
+    ):
+        self.max_entries = max(1, max_entries)
+        # (vis_data, meta) → 索引。格納時に 1 回だけ呼ぶ (例: vis_index.VisIndex)
+        self.index_factory = index_factory
+        self.max_bytes = max_bytes
+        self.fresh_seconds = fresh_seconds
+        # 0 なら常に全ノードを返す。絞り込みには索引の page() を使う
+        self.default_node_limit = default_node_limit
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(channel_id: str, days: int, config: dict) -> tuple:
+        return (channel_id, int(days), config_hash(config))
+
+    def put(self, key: tuple, vis_data: dict, channel_name: str) -> CacheEntry:
+        """分析結果をシリアライズして保存し、上限を超えた分を LRU で捨てる。
+
+        vis_data に "timeline" があれば /vis-data のボディから外して別に保存する。
+        ノード数が default_node_limit を超えれば、ボディは活動量の上位ノードとその間のエッジ
+        (と "page") に絞る。全体は索引の query で取得できる。
+        """
+        channel_id, days, digest = key
+        created_at = time.time()
+        meta = {"channel_name": channel_name, "days": days, "timestamp": created_at}
+        timeline = vis_data.get("timeline")
+        if timeline is not None:
+            vis_data = {name: value for name, value in vis_data.items() if name != "timeline"}
+        index = self.index_factory(vis_data, meta) if self.index_factory else None
+        payload = {**vis_data, **meta}
+        if (
+            index is not None and hasattr(index, "page")
+            and 0 < self.default_node_limit < len(vis_data["nodes"])
+        ):
+            payload.update(index.page(node_limit=self.default_node_limit))
+        body = encode_body(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+        entry = CacheEntry(
+            channel_id=channel_id, days=days, config_hash=digest,
+            created_at=created_at, body=body,
+            summary={
+                "nodes": vis_data["analysis"]["total_nodes"],
+                "edges": vis_data["analysis"]["total_edges"],
+                "communities": len(vis_data["communities"]),
+                "hubs": len(vis_data["analysis"]["hubs"]),
+            },
+            index=index,
+            timeline=(
+                encode_body(json.dumps({**timeline, **meta}, ensure_ascii=False).encode("utf-8"))
+                if timeline is not None else None
+            ),
+        )
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            self._evict()
+        return entry
+
+    def _total_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def _evict(self):
+        # 最新のエントリ 1 件は上限を超えていても残す。
+        # 索引の応答キャッシュは参照のたびに増えるため、参照時にも呼ぶ
+        total = self._total_bytes()
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or total > self.max_bytes
+        ):
+            key, entry = self._entries.popitem(last=False)
+            total -= entry.size
+            log.info("結果キャッシュ: %s (%d 日) を破棄", key[0], key[1])
+
+    def get_fresh(self, key: tuple, max_age: float | None = None) -> CacheEntry | None:
+        """max_age 秒 (省略時は fresh_seconds) 以内に作られたエントリを返す (無ければ None)。"""
+        if max_age is None:
+            max_age = self.fresh_seconds
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry.created_at > max_age:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._evict()
+            return entry
+
+    def find(
+        self, channel_id: str | None = None, days: int | None = None, timeline: bool = False,
+    ) -> CacheEntry | None:
+        """ダッシュボード用: 条件に合う最新のエントリを返す (鮮度は問わない)。
+
+        channel_id / days を省略した場合はその条件で絞り込まない。
+        timeline=True の場合はトレンド分析のエントリに限る。
+        """
+        with self._lock:
+            matches = [
+                (key, entry) for key, entry in self._entries.items()
+                if (channel_id is None or entry.channel_id == channel_id)
+                and (days is None or entry.days == days)
+                and (not timeline or entry.timeline is not None)
+            ]
+            if not matches:
+                return None
+            key, entry = max(matches, key=lambda item: item[1].created_at)
+            self._entries.move_to_end(key)
+            self._evict()
+            return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes(),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def load_result_cache_from_env(index_factory=None) -> ResultCache:
+    """環境変数から結果キャッシュを作成する。
+
+    MENTION_MAP_RESULT_CACHE_ENTRIES       (int)   保持するエントリ数の上限
+    MENTION_MAP_RESULT_CACHE_MB            (float) 保持する JSON の合計サイズ上限 (MB)
+    MENTION_MAP_RESULT_CACHE_FRESH_MINUTES (float) 再実行時にキャッシュを返す鮮度 (分、0 で常に再分析)
+    MENTION_MAP_DASHBOARD_NODE_LIMIT       (int)   ダッシュボードが最初に読み込むノード数の上限 (0 で全ノード)
+    """
+    def read(name, default, cast):
+        try:
+            return cast(os.environ.get(name, default))
+        except ValueError:
+            log.warning("Invalid value for %s", name)
+            return cast(default)
+
+    return ResultCache(
+        max_entries=read("MENTION_MAP_RESULT_CACHE_ENTRIES", str(DEFAULT_MAX_ENTRIES), int),
+        max_bytes=int(read("MENTION_MAP_RESULT_CACHE_MB", "64", float) * 1024 * 1024),
+        fresh_seconds=read("MENTION_MAP_RESULT_CACHE_FRESH_MINUTES", "10", float) * 60,
+        index_factory=index_factory,
+        default_node_limit=read("MENTION_MAP_DASHBOARD_NODE_LIMIT", str(DEFAULT_NODE_LIMIT), int),
+    )
@@ -0,0 +1,138 @@
+"""監視チャンネルの定期的な事前計算 (バックグラウンドスケジューラー).
+
+設定したチャンネル × 期間 (例: 7 / 30 / 90 日) を一定間隔で分析し直し、
+結果キャッシュに格納しておく。スラッシュコマンドは最新の事前計算結果を
+すぐに返せる。
+
+対話的な実行を妨げないよう:
+  - 周期と各ジョブの投入間隔にジッターを入れ、API 呼び出しが一度に集中しないようにする
+  - should_defer() が True の間 (対話的なジョブが待っている、rate limit の
+    待ち時間が長いなど) は投入を見送り、少し待ってから再判定する
+  - 投入したジョブの完了を待ってから次を投入する (事前計算は常に 1 件ずつ)
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import NamedTuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL_SECONDS = 60 * 60
+DEFAULT_WATCH_DAYS = (7, 30, 90)
+# 周期に対するジッターの割合 (±)
+JITTER_RATIO = 0.1
+# 投入を見送ったときの再判定間隔
+DEFER_SECONDS = 30.0
+
+
+class WatchTarget(NamedTuple):
+    channel_id: str
+    days: int
+
+
+class WatchScheduler:
+    """監視対象を周期的に submit() するスケジューラー (デーモンスレッド).
+
+    Args:
+      submit: (channel_id, days) を受け取り、投入したジョブの Future を返す
+              (投入できなかった場合は None)
+      should_defer: True を返す間は投入を見送る
+    """
+
+    def __init__(
+        self, targets, submit, should_defer=lambda: False,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS, jitter_ratio: float = JITTER_RATIO,
+    ):
+        self.targets = list(targets)
+        self.interval_seconds = interval_seconds
+        self.jitter_ratio = jitter_ratio
+        self._submit = submit
+        self._should_defer = should_defer
+        self._stop = threading.Event()
+        self._thread = None
+        self._rng = random.Random()
+        self.runs = 0
+        self.failures = 0
+
+    def start(self):
+        if not self.targets or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="watch-scheduler", daemon=True)
+        self._thread.start()
+        log.info(
+            "事前計算スケジューラー: %d 件を %.0f 分ごとに更新",
+            len(self.targets), self.interval_seconds / 60,
+        )
+
+    def stop(self):
+        self._stop.set()
+
+    def _jittered(self, seconds: float) -> float:
+        return seconds * (1 + self._rng.uniform(-self.jitter_ratio, self.jitter_ratio))
+
+    def _loop(self):
+        # 起動直後の API 呼び出しと重ならないよう、最初の実行もずらす
+        if self._stop.wait(self._rng.uniform(0, min(60.0, self.interval_seconds * self.jitter_ratio))):
+            return
+        while not self._stop.is_set():
+            cycle_started = time.monotonic()
+            for target in self.targets:
+                if not self._run_target(target):
+                    return
+            elapsed = time.monotonic() - cycle_started
+            if self._stop.wait(max(0.0, self._jittered(self.interval_seconds) - elapsed)):
+                return
+
+    def _run_target(self, target: WatchTarget) -> bool:
+        """1 件投入して完了を待つ。停止要求があれば False。"""
+        while self._should_defer():
+            if self._stop.wait(self._jittered(DEFER_SECONDS)):
+                return False
+        try:
+            future = self._submit(target.channel_id, target.days)
+        except Exception as e:
+            log.warning("事前計算 %s (%d 日) を投入できませんでした: %s", target.channel_id, target.days, e)
+            self.failures += 1
+            return not self._stop.is_set()
+        if future is not None:
+            try:
+                future.result()
+                self.runs += 1
+            except Exception as e:
+                log.warning("事前計算 %s (%d 日) が失敗しました: %s", target.channel_id, target.days, e)
+                self.failures += 1
+        # 次のジョブとの間隔を少し空ける
+        return not self._stop.wait(self._rng.uniform(1.0, 5.0))
+
+
+def load_watch_targets_from_env() -> list[WatchTarget]:
+    """MENTION_MAP_WATCH_CHANNELS × MENTION_MAP_WATCH_DAYS の監視対象を返す。
+
+    MENTION_MAP_WATCH_CHANNELS  (str) 事前計算するチャンネル ID (カンマ区切り、未設定で無効)
+    MENTION_MAP_WATCH_DAYS      (str) 事前計算する期間 (日数、カンマ区切り)
+    """
+    channels = [c.strip() for c in os.environ.get("MENTION_MAP_WATCH_CHANNELS", "").split(",") if c.strip()]
+    days_list = []
+    for item in os.environ.get("MENTION_MAP_WATCH_DAYS", ",".join(map(str, DEFAULT_WATCH_DAYS))).split(","):
+        try:
+            days = int(item)
+        except ValueError:
+            if item.strip():
+                log.warning("Invalid value for MENTION_MAP_WATCH_DAYS: %s", item)
+            continue
+        if 0 < days <= 730 and days not in days_list:
+            days_list.append(days)
+    return [WatchTarget(channel_id, days) for channel_id in channels for days in days_list]
+
+
+def load_interval_from_env() -> float:
+    """MENTION_MAP_WATCH_INTERVAL_MINUTES (float) 事前計算の間隔 (分)。"""
+    try:
+        minutes = float(os.environ.get("MENTION_MAP_WATCH_INTERVAL_MINUTES", "60"))
+    except ValueError:
+        log.warning("Invalid value for MENTION_MAP_WATCH_INTERVAL_MINUTES")
+        minutes = 60.0
+    return max(1.0, minutes) * 60
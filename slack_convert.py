@@ -0,0 +1,269 @@
+"""Slack メッセージ → Dot-connect 互換レコードへの変換.
+
+slack-mention-map.py から切り出したもの (Bot のトークンや Slack App なしで import できる)。
+ユーザー名は SlackRecordConverter に渡したユーザーディレクトリと API 呼び出し関数で
+解決する。ベンチマークやオフラインの取り込みでは directory を省略し、user_cache に
+名前を入れておけば Slack API を呼ばずに変換できる (client=None の場合、未知のユーザーは
+"User <ID>" になる)。
+
+レコードの形式:
+  - to: メンション先 + スレッド参加者 (案B)
+  - cc: リアクションしたユーザー (to と重複しないもの)
+"""
+
+import itertools
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from core import EDGE_COLUMNS, RECORD_COLUMNS, USER_COLUMNS, EdgeTables
+from instrumentation import span
+
+# メンションを抽出する正規表現パターン
+MENTION_PATTERN = re.compile(r"<@([A-Z0-9]+)>")
+
+
+def _direct_call(api_method, **kwargs):
+    return api_method(**kwargs)
+
+
+def message_subject(msg):
+    """メッセージ先頭 50 文字 (改行はスペースに置換)"""
+    text = msg.get("text", "")
+    return text[:50].replace("\n", " ") if text else ""
+
+
+class SlackRecordConverter:
+    """ユーザー名の解決方法 (ディレクトリ + API 呼び出し) を持つ変換器."""
+
+    def __init__(self, directory=None, api_call=_direct_call):
+        self.directory = directory   # user_directory.UserDirectory (省略可)
+        self.api_call = api_call     # rate limiter 経由の呼び出し (例: slack_api_call)
+
+    @property
+    def domains(self) -> dict:
+        return self.directory.domains if self.directory is not None else {}
+
+    def resolve_user(self, client, user_id, user_cache):
+        """Slack user ID からユーザー名を解決する。
+
+        実行中のキャッシュ → ユーザーディレクトリ (永続キャッシュ) → users.info の順に参照する。
+        """
+        if user_id in user_cache:
+            return user_cache[user_id]
+        name = self.directory.get_name(user_id) if self.directory is not None else None
+        if name is None and client is None:
+            name = f"User {user_id}"
+        elif name is None:
+            try:
+                with span("user_resolution"):
+                    user_info = self.api_call(client.users_info, user=user_id)
+                name = user_info["user"]["real_name"]
+                email = user_info["user"].get("profile", {}).get("email", "")
+                if self.directory is not None:
+                    self.directory.put(user_id, name, email)
+            except Exception as e:
+                print(f"Warning: Could not get user info for {user_id}: {e}")
+                name = f"User {user_id}"
+        user_cache[user_id] = name
+        return name
+
+    def slack_record(self, msg, thread_users, subject, client, user_cache):
+        """1 メッセージ分の構造化レコードを作る。対象外 (bot / ユーザーなし / ts 不正) は None。
+
+        to: メンション先 → thread_users (スレッド参加者) の順、cc: リアクションしたユーザー
+        """
+        if msg.get("subtype") == "bot_message" or not msg.get("user"):
+            return None
+
+        sender_id = msg["user"]
+        self.resolve_user(client, sender_id, user_cache)
+
+        try:
+            ts = float(msg["ts"])
+            date_str = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        except Exception:
+            return None
+
+        # To: メンション先 + スレッド参加者
+        to_ids = []
+        seen_to = {sender_id}
+        for uid in itertools.chain(MENTION_PATTERN.findall(msg.get("text", "")), thread_users):
+            if uid not in seen_to:
+                self.resolve_user(client, uid, user_cache)
+                to_ids.append(uid)
+                seen_to.add(uid)
+
+        # CC: リアクションしたユーザー
+        cc_ids = []
+        for reaction in msg.get("reactions", []):
+            for uid in reaction.get("users", []):
+                if uid not in seen_to:
+                    self.resolve_user(client, uid, user_cache)
+                    cc_ids.append(uid)
+                    seen_to.add(uid)
+
+        return {
+            "ts": ts,
+            "date": date_str,
+            "sender": sender_id,
+            "to": to_ids,
+            "cc": cc_ids,
+            "subject": subject,
+        }
+
+    def thread_records(self, parent, replies, client, user_cache):
+        """スレッド親 + 応答をレコードに変換するジェネレーター (replies が空なら親のみ)。"""
+        participants = set()
+        if replies:
+            if parent.get("user"):
+                participants.add(parent["user"])
+            participants.update(r["user"] for r in replies if r.get("user"))
+
+        subject = message_subject(parent)
+        for msg in itertools.chain([parent], replies):
+            record = self.slack_record(msg, participants, subject, client, user_cache)
+            if record:
+                yield record
+
+    def iter_slack_records(
+        self, messages, thread_messages, client, user_cache,
+        thread_ts=None, dm_channel_id=None,
+    ):
+        """Slack メッセージを 1 件ずつ構造化レコードに変換するジェネレーター。
+
+        build_dataframe / build_edge_tables の共通部分。送信者・受信者の名前は
+        resolve_user で解決され、user_cache に格納される。
+        親メッセージは ts → message のインデックスで引くため、
+        コストはメッセージ数 + スレッド応答数に比例する。
+
+        Yields:
+            dict: ts (float), date, sender, to (user_id のリスト), cc (同上), subject
+              - to: メンション先 + スレッド参加者 (案B)
+              - cc: リアクションしたユーザー (to と重複しないもの)
+        """
+        total = len(messages)
+        progress_interval = max(1, total // 10)
+        messages_by_ts = {m["ts"]: m for m in messages}
+
+        # スレッド内の全参加者マップを事前構築
+        thread_participants = {}
+        for parent_ts, replies in thread_messages.items():
+            participants = set()
+            parent_msg = messages_by_ts.get(parent_ts)
+            if parent_msg and parent_msg.get("user"):
+                participants.add(parent_msg["user"])
+            for reply in replies:
+                if reply.get("user"):
+                    participants.add(reply["user"])
+            thread_participants[parent_ts] = participants
+
+        # トップレベルメッセージの変換
+        for i, msg in enumerate(messages):
+            if thread_ts and dm_channel_id and i > 0 and (i % progress_interval == 0):
+                pct = (i / total) * 100
+                self.api_call(
+                    client.chat_postMessage,
+                    channel=dm_channel_id, thread_ts=thread_ts,
+                    text=f"DataFrame 変換中: {i}/{total} ({pct:.0f}%)",
+                )
+
+            record = self.slack_record(
+                msg, thread_participants.get(msg.get("ts"), ()), message_subject(msg), client, user_cache,
+            )
+            if record:
+                yield record
+
+        # スレッド応答の変換 (To: スレッド内の他の参加者全員 = 案B)
+        for parent_ts, replies in thread_messages.items():
+            all_users = thread_participants[parent_ts]
+            parent_msg = messages_by_ts.get(parent_ts)
+            parent_text = message_subject(parent_msg) if parent_msg else ""
+
+            for reply in replies:
+                record = self.slack_record(reply, all_users, parent_text, client, user_cache)
+                if record:
+                    yield record
+
+    @staticmethod
+    def dataframe_row(rec, user_cache, domains) -> dict:
+        """slack_record のレコード → build_dataframe の 1 行 (名前は resolve_user 済みであること)"""
+        return {
+            "date": rec["date"],
+            "from_email": rec["sender"],
+            "from_name": user_cache[rec["sender"]],
+            "from_domain": domains.get(rec["sender"], ""),
+            "to": "; ".join(f"{user_cache[uid]} <{uid}>" for uid in rec["to"]),
+            "cc": "; ".join(f"{user_cache[uid]} <{uid}>" for uid in rec["cc"]),
+            "subject": rec["subject"],
+        }
+
+    def build_dataframe(
+        self, messages, thread_messages, client, user_cache,
+        thread_ts=None, dm_channel_id=None,
+    ):
+        """Slack メッセージを Dot-connect 互換の DataFrame に変換する。
+
+        カラム: date, from_email, from_name, to, cc, subject
+        - from_email: Slack user ID
+        - to: メンション先 + スレッド参加者 (案B) — "Name <user_id>; ..." 形式
+        - cc: リアクションしたユーザー — 同上
+        - subject: メッセージ先頭 50 文字
+        """
+        domains = self.domains
+        records = [
+            self.dataframe_row(rec, user_cache, domains)
+            for rec in self.iter_slack_records(
+                messages, thread_messages, client, user_cache, thread_ts, dm_channel_id,
+            )
+        ]
+
+        df = pd.DataFrame(records)
+
+        if thread_ts and dm_channel_id:
+            self.api_call(
+                client.chat_postMessage,
+                channel=dm_channel_id, thread_ts=thread_ts,
+                text=f"DataFrame 変換完了: {len(df)} レコード生成",
+            )
+
+        return df
+
+    def build_edge_tables(
+        self, messages, thread_messages, client, user_cache,
+        thread_ts=None, dm_channel_id=None,
+    ):
+        """Slack メッセージを構造化エッジテーブル (core.EdgeTables) に変換する。
+
+        build_dataframe と同じレコードを生成するが、"Name <ID>" 文字列を経由せず
+        core.build_graph_from_edges が直接集計できる形で返す。
+        """
+        record_rows = []
+        edge_rows = []
+        for rec in self.iter_slack_records(
+            messages, thread_messages, client, user_cache, thread_ts, dm_channel_id,
+        ):
+            sender, ts = rec["sender"], rec["ts"]
+            record_rows.append((sender, ts, rec["subject"]))
+            edge_rows.extend((sender, uid, "to", ts) for uid in rec["to"])
+            edge_rows.extend((sender, uid, "cc", ts) for uid in rec["cc"])
+
+        domains = self.domains
+        tables = EdgeTables(
+            records=pd.DataFrame(record_rows, columns=RECORD_COLUMNS),
+            edges=pd.DataFrame(edge_rows, columns=EDGE_COLUMNS),
+            users=pd.DataFrame(
+                [(uid, name, domains.get(uid, "")) for uid, name in user_cache.items()],
+                columns=USER_COLUMNS,
+            ),
+        )
+
+        if thread_ts and dm_channel_id:
+            self.api_call(
+                client.chat_postMessage,
+                channel=dm_channel_id, thread_ts=thread_ts,
+                text=f"レコード変換完了: {len(tables.records)} レコード / {len(tables.edges)} エッジ生成",
+            )
+
+        return tables
@@ -0,0 +1,397 @@
+"""Slack のワークスペースエクスポート (ZIP) からのオフライン取り込み.
+
+管理者が出力した標準のエクスポート (users.json / channels.json などと
+<チャンネル名>/<YYYY-MM-DD>.json の日別ファイル) を読み、Slack API を呼ばずに
+build_dataframe と同じ形のレコードを作る。Slack のトークンは不要。
+
+  - JSON 配列は iter_json_array で要素ごとに読み、ファイル全体を展開しない
+  - チャンネルごとに日別ファイルを 2 回走査する。1 回目でスレッドの参加者と親メッセージの
+    件名だけを集め、2 回目でメッセージを 1 件ずつレコードに変換する。保持するのは
+    スレッドごとの参加者と件名のみ (生メッセージは溜めない)
+  - チャンネル単位でプロセスプールに分配する (fork が使え、呼び出し元がシングルスレッドの
+    とき (CLI) のみ。それ以外は逐次)。
+    結果はチャンネルの並び順にまとめるので、並列度によらず同じ DataFrame・グラフになる
+  - aggregate_export はレコードを保持せずチャンネルごとの GraphAccumulator に畳み込む
+    (数年分の履歴など、DataFrame を作るとメモリに載らない場合)
+
+スレッド参加者の扱いは API 経由の取得 (fetch_messages_with_threads) と同じ
+(親 + 応答者全員を to に加える)。エクスポートでは応答が投稿日のファイルに入るため、
+期間内の応答は親が期間外でも取り込む (親が無い場合の件名は空)。
+
+Usage:
+    python slack_export.py export.zip [--channels general,dev] [--days 365] [--until 2024-12-31]
+                           [--workers 4] [--aggregate] [--output vis_data.json]
+"""
+
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+import pandas as pd
+
+from core import (
+    GraphAccumulator, load_config_from_env, run_analysis_pipeline,
+    run_analysis_pipeline_from_accumulator,
+)
+from instrumentation import span
+from slack_convert import SlackRecordConverter, message_subject
+from user_directory import UserDirectory
+
+log = logging.getLogger(__name__)
+
+# チャンネル一覧のメタデータ (公開 / 非公開 / グループ DM / DM)
+CHANNEL_LISTS = ("channels.json", "groups.json", "mpims.json", "dms.json")
+DAY_FILE_PATTERN = re.compile(r"^(?:(.+)/)?([^/]+)/(\d{4}-\d{2}-\d{2})\.json$")
+DATAFRAME_COLUMNS = ["date", "from_email", "from_name", "from_domain", "to", "cc", "subject"]
+# iter_json_array が 1 回に読む文字数
+READ_CHUNK = 64 * 1024
+
+
+def iter_json_array(fp, chunk_size: int = READ_CHUNK):
+    """テキストストリーム上の JSON 配列を要素ごとに返すジェネレーター.
+
+    バッファに保持するのは未処理の部分と読みかけの要素のみ。
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    started = False
+    read_size = chunk_size
+    while True:
+        while pos < len(buf) and (buf[pos] in " \t\r\n\ufeff" or (started and buf[pos] == ",")):
+            pos += 1
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError(f"expected a JSON array, got {buf[pos]!r}")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # バッファの末尾で終わる値は途中で切れている可能性があるので読み足してからにする
+                if end < len(buf) or eof:
+                    yield value
+                    pos = end
+                    read_size = chunk_size
+                    if pos >= chunk_size:
+                        buf, pos = buf[pos:], 0
+                    continue
+        elif eof:
+            raise ValueError("unexpected end of JSON array")
+        # 要素の途中でバッファが尽きた: 読み足して同じ位置から解析し直す。
+        # 大きな要素では読む量を倍にしていき、解析し直す回数を抑える
+        chunk = fp.read(read_size)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+        read_size *= 2
+
+
+class ExportChannel(NamedTuple):
+    id: str
+    name: str                # エクスポート内のディレクトリ名 (DM では ID)
+    files: tuple             # 日別ファイル (日付順)
+
+
+class SlackExport:
+    """エクスポート ZIP の読み取り (with 文で閉じる)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self.prefix, self.channels = self._scan()
+
+    def close(self):
+        self._zip.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _scan(self) -> tuple[str, list[ExportChannel]]:
+        """日別ファイルをディレクトリごとにまとめ、チャンネル一覧のメタデータと対応付ける."""
+        names = self._zip.namelist()
+        # ZIP を作り直すとトップレベルのディレクトリが付くことがある
+        prefix = next(
+            (name[: -len("users.json")] for name in names if name.rsplit("/", 1)[-1] == "users.json"), "",
+        )
+        folders: dict[str, list[str]] = {}
+        for name in names:
+            match = DAY_FILE_PATTERN.match(name)
+            if match and (match.group(1) + "/" if match.group(1) else "") == prefix:
+                folders.setdefault(match.group(2), []).append(name)
+
+        # ディレクトリ名は公開・非公開チャンネルとグループ DM では名前、DM では ID
+        ids = {}
+        for list_name in CHANNEL_LISTS:
+            for entry in self._read_array(prefix + list_name, missing_ok=True):
+                if entry.get("id"):
+                    ids[entry.get("name") or entry["id"]] = entry["id"]
+        channels = [
+            ExportChannel(ids.get(folder, folder), folder, tuple(sorted(files)))
+            for folder, files in sorted(folders.items())
+        ]
+        return prefix, channels
+
+    def _read_array(self, name: str, missing_ok: bool = False):
+        try:
+            fp = self._zip.open(name)
+        except KeyError:
+            if missing_ok:
+                return
+            raise
+        with io.TextIOWrapper(fp, encoding="utf-8") as text:
+            yield from iter_json_array(text)
+
+    def load_users(self) -> UserDirectory:
+        """users.json を表示名とメールドメインのディレクトリ (ディスクには保存しない) に読み込む."""
+        directory = UserDirectory(path=None, ttl_seconds=float("inf"))
+        for member in self._read_array(self.prefix + "users.json", missing_ok=True):
+            user_id = member.get("id")
+            if not user_id:
+                continue
+            profile = member.get("profile") or {}
+            name = member.get("real_name") or profile.get("real_name") or member.get("name") or f"User {user_id}"
+            directory.put(user_id, name, profile.get("email", ""))
+        return directory
+
+    def select(self, refs) -> list[ExportChannel]:
+        """チャンネル ID・名前 (# は省略可) で絞り込む (見つからない参照は ValueError)."""
+        if not refs:
+            return list(self.channels)
+        by_ref = {}
+        for channel in self.channels:
+            by_ref[channel.id] = by_ref[channel.name] = channel
+        selected = []
+        for ref in refs:
+            channel = by_ref.get(ref.lstrip("#"))
+            if channel is None:
+                raise ValueError(f"channel not found in export: {ref}")
+            if channel not in selected:
+                selected.append(channel)
+        return selected
+
+    def iter_messages(self, channel: ExportChannel, oldest: float | None = None, latest: float | None = None):
+        """チャンネルのメッセージを日付順に 1 件ずつ返す (ts が [oldest, latest) の範囲のもの)."""
+        # ファイル名の日付はワークスペースのタイムゾーンなので、前後 1 日の余裕をもって絞る
+        first = _day(oldest - 86400) if oldest is not None else None
+        last = _day(latest + 86400) if latest is not None else None
+        for name in channel.files:
+            day = name.rsplit("/", 1)[-1][:-len(".json")]
+            if (first and day < first) or (last and day > last):
+                continue
+            for msg in self._read_array(name):
+                try:
+                    ts = float(msg.get("ts", ""))
+                except (TypeError, ValueError):
+                    continue
+                if (oldest is None or ts >= oldest) and (latest is None or ts < latest):
+                    yield msg
+
+
+def _day(ts: float) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def _is_reply(msg) -> bool:
+    thread_ts = msg.get("thread_ts")
+    return bool(thread_ts) and thread_ts != msg.get("ts")
+
+
+def iter_channel_records(export: SlackExport, channel: ExportChannel, converter, user_cache,
+                         oldest: float | None = None, latest: float | None = None):
+    """1 チャンネルのメッセージを slack_record のレコードに変換するジェネレーター.
+
+    1 回目の走査でスレッドごとの参加者 (親 + 応答者) と親の件名を集め、
+    2 回目でメッセージを日付順に変換する。
+    """
+    participants: dict[str, set] = {}   # 期間内に応答があるスレッドのみ
+    subjects: dict[str, str] = {}
+    for msg in export.iter_messages(channel, oldest, latest):
+        if _is_reply(msg):
+            users = participants.get(msg["thread_ts"])
+            if users is None:
+                # 親 → 応答者の順に加える (API 経由の取得と同じ順序の集合にする)
+                parent = msg.get("parent_user_id")
+                users = participants[msg["thread_ts"]] = {parent} if parent else set()
+            if msg.get("user"):
+                users.add(msg["user"])
+        elif msg.get("thread_ts"):
+            subjects[msg["ts"]] = message_subject(msg)
+
+    for msg in export.iter_messages(channel, oldest, latest):
+        if _is_reply(msg):
+            thread_users = participants[msg["thread_ts"]]
+            subject = subjects.get(msg["thread_ts"], "")
+        else:
+            thread_users = participants.get(msg.get("ts"), ())
+            subject = message_subject(msg)
+        record = converter.slack_record(msg, thread_users, subject, None, user_cache)
+        if record:
+            yield record
+
+
+# --- チャンネル単位の並列処理 -------------------------------------------------
+
+# 子プロセスが fork 時に引き継ぐ取り込み条件
+_path = None
+_directory = None
+_window = (None, None)
+
+
+def _init_worker(path, directory, window):
+    global _path, _directory, _window
+    _path = path
+    _directory = directory
+    _window = window
+
+
+def _channel_rows(channel: ExportChannel) -> list[tuple]:
+    """1 チャンネル分の build_dataframe の行 (DATAFRAME_COLUMNS の順のタプル)."""
+    converter = SlackRecordConverter(_directory)
+    domains = converter.domains
+    user_cache = {}
+    with SlackExport(_path) as export:
+        return [
+            tuple(SlackRecordConverter.dataframe_row(rec, user_cache, domains).values())
+            for rec in iter_channel_records(export, channel, converter, user_cache, *_window)
+        ]
+
+
+def _channel_accumulator(channel: ExportChannel) -> tuple[GraphAccumulator, dict]:
+    """1 チャンネル分のレコードを畳み込んだ GraphAccumulator と表示名."""
+    converter = SlackRecordConverter(_directory)
+    user_cache = {}
+    accumulator = GraphAccumulator()
+    with SlackExport(_path) as export:
+        for rec in iter_channel_records(export, channel, converter, user_cache, *_window):
+            accumulator.add_record(rec["sender"], rec["to"], rec["cc"])
+    return accumulator, user_cache
+
+
+def _map_channels(fn, path, channels, directory, window, workers):
+    """fn をチャンネルごとに実行し、チャンネルの並び順で結果を返す."""
+    workers = min(workers or os.cpu_count() or 1, len(channels))
+    # 他のスレッドが動いているプロセス (ボットなど) で fork すると、そのスレッドが持っていた
+    # ロックが子プロセスで解放されないままになるため、fork はシングルスレッドのときだけ使う
+    if workers > 1 and threading.active_count() > 1:
+        log.info("エクスポート取り込み: 他のスレッドが動いているため逐次処理します")
+        workers = 1
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        # ユーザーディレクトリは fork で子プロセスに引き継ぐ (pickle しない)
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker, initargs=(path, directory, window),
+        ) as pool:
+            return list(pool.map(fn, channels))
+    _init_worker(path, directory, window)
+    return [fn(channel) for channel in channels]
+
+
+def load_export(path: str, channels=None, oldest: float | None = None, latest: float | None = None,
+                workers: int | None = None) -> tuple[pd.DataFrame, dict]:
+    """エクスポートを build_dataframe と同じ形の DataFrame にする.
+
+    Returns:
+        (DataFrame, user_id → メールドメイン)
+    """
+    with SlackExport(path) as export:
+        selected = export.select(channels)
+        directory = export.load_users()
+    with span("convert"):
+        parts = _map_channels(_channel_rows, path, selected, directory, (oldest, latest), workers)
+    rows = [row for part in parts for row in part]
+    log.info("エクスポート取り込み: %d チャンネル, %d レコード", len(selected), len(rows))
+    return pd.DataFrame.from_records(rows, columns=DATAFRAME_COLUMNS), directory.domains
+
+
+def aggregate_export(path: str, channels=None, oldest: float | None = None, latest: float | None = None,
+                     workers: int | None = None) -> tuple[GraphAccumulator, dict, dict]:
+    """エクスポートをレコードを保持せずに集計する.
+
+    Returns:
+        (GraphAccumulator, user_id → 表示名, user_id → メールドメイン)
+    """
+    with SlackExport(path) as export:
+        selected = export.select(channels)
+        directory = export.load_users()
+    with span("convert"):
+        parts = _map_channels(_channel_accumulator, path, selected, directory, (oldest, latest), workers)
+    merged = GraphAccumulator()
+    names = {}
+    for accumulator, part_names in parts:
+        merged.merge(accumulator)
+        names.update(part_names)
+    log.info("エクスポート集計: %d チャンネル, %d レコード", len(selected), merged.total_records)
+    return merged, names, directory.domains
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Analyse a Slack workspace export (ZIP) without a Slack token.")
+    parser.add_argument("export", help="path to the export ZIP")
+    parser.add_argument("--channels", default="", help="comma-separated channel names or IDs (default: all)")
+    parser.add_argument("--days", type=int, default=None, help="only the last N days before --until")
+    parser.add_argument("--until", default=None, help="end date YYYY-MM-DD (exclusive; default: no limit)")
+    parser.add_argument("--workers", type=int, default=None, help="parallel processes (default: CPU count)")
+    parser.add_argument("--aggregate", action="store_true", help="aggregate per channel without keeping records")
+    parser.add_argument("--output", default="vis_data.json")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    latest = datetime.strptime(args.until, "%Y-%m-%d").timestamp() if args.until else None
+    oldest = None
+    if args.days is not None:
+        end = datetime.fromtimestamp(latest) if latest is not None else datetime.now()
+        oldest = (end - timedelta(days=args.days)).timestamp()
+    channels = [c.strip() for c in args.channels.split(",") if c.strip()]
+
+    config = load_config_from_env()
+    start = time.perf_counter()
+    try:
+        if args.aggregate:
+            accumulator, names, domains = aggregate_export(args.export, channels, oldest, latest, args.workers)
+            records = accumulator.total_records
+        else:
+            df, domains = load_export(args.export, channels, oldest, latest, args.workers)
+            records = len(df)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    loaded = time.perf_counter() - start
+    if not records:
+        print("Error: no messages in the selected channels and period", file=sys.stderr)
+        return 1
+
+    if args.aggregate:
+        vis_data = run_analysis_pipeline_from_accumulator(accumulator, names, config, domains)
+    else:
+        vis_data = run_analysis_pipeline(df, config, domains)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(vis_data, f, ensure_ascii=False)
+    print(
+        f"{records} records -> {len(vis_data['nodes'])} nodes / {len(vis_data['edges'])} edges "
+        f"(load {loaded:.1f}s, total {time.perf_counter() - start:.1f}s): {args.output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""期間スライスによる時系列分析 (1 回の取得から週次・日次のトレンドを作る).
+
+EdgeTables のレコード・エッジをタイムスタンプで日次 / 週次のスライスに分け、
+スライスごとにエッジの重み (送信者 → 宛先) とノードの送受信数を集計する。
+タイムラインは window スライス分の窓を 1 スライスずつずらしながら、
+窓の集計に新しいスライスを足し、窓から外れたスライスを引くだけで更新する
+(窓ごとにグラフを作り直さない)。
+
+窓ごとの指標: メッセージ数・メンション数 (to / cc)・アクティブユーザー数・
+エッジ数・相互エッジの割合・前の窓から増えた / 消えたエッジ数・活動量の上位ユーザー。
+"""
+
+import heapq
+from collections import Counter
+from datetime import datetime
+
+import pandas as pd
+
+DAY_SECONDS = 24 * 60 * 60
+SLICE_SECONDS = {"day": DAY_SECONDS, "week": 7 * DAY_SECONDS}
+DEFAULT_WINDOW = {"day": 7, "week": 4}
+TOP_USERS = 5
+
+
+class _Slice:
+    __slots__ = ("records", "edges", "to_count", "cc_count", "activity")
+
+    def __init__(self):
+        self.records = 0
+        self.edges: Counter = Counter()      # (sender, recipient) → to + cc
+        self.to_count = 0
+        self.cc_count = 0
+        self.activity: Counter = Counter()   # user → sent + received + cc
+
+
+class TemporalAggregator:
+    """[start, start + n_slices × スライス長) をスライスに分けて集計する."""
+
+    def __init__(self, start_ts: float, n_slices: int, unit: str = "week"):
+        if unit not in SLICE_SECONDS:
+            raise ValueError(f"unknown slice unit: {unit}")
+        self.start_ts = start_ts
+        self.unit = unit
+        self.slice_seconds = SLICE_SECONDS[unit]
+        self.slices = [_Slice() for _ in range(n_slices)]
+
+    def _slice_index(self, ts: pd.Series) -> pd.Series:
+        return ((ts.astype(float) - self.start_ts) // self.slice_seconds).astype(int)
+
+    def add_tables(self, tables) -> None:
+        """EdgeTables のレコードとエッジをスライスに振り分ける (範囲外は無視)."""
+        n = len(self.slices)
+        if not tables.records.empty:
+            records = tables.records.assign(slice=self._slice_index(tables.records["ts"]))
+            records = records[(records["slice"] >= 0) & (records["slice"] < n)]
+            for (index, sender), count in records.groupby(["slice", "sender"], sort=False).size().items():
+                self.slices[index].records += count
+                self.slices[index].activity[sender] += count
+
+        if not tables.edges.empty:
+            edges = tables.edges.assign(slice=self._slice_index(tables.edges["ts"]))
+            edges = edges[(edges["slice"] >= 0) & (edges["slice"] < n)]
+            grouped = edges.groupby(["slice", "sender", "recipient", "kind"], sort=False).size()
+            for (index, sender, recipient, kind), count in grouped.items():
+                bucket = self.slices[index]
+                bucket.edges[(sender, recipient)] += count
+                bucket.activity[recipient] += count
+                if kind == "to":
+                    bucket.to_count += count
+                else:
+                    bucket.cc_count += count
+
+    def timeline(self, window: int | None = None, names: dict | None = None) -> dict:
+        """window スライスの窓をずらした指標の一覧 (最初の窓は先頭スライスだけ)."""
+        window = max(1, window or DEFAULT_WINDOW[self.unit])
+        names = names or {}
+        edges: Counter = Counter()
+        activity: Counter = Counter()
+        records = to_count = cc_count = 0
+        reciprocal = 0   # 逆向きのエッジも窓内にあるエッジの数
+
+        def add(pair, weight):
+            nonlocal reciprocal
+            previous = edges[pair]
+            edges[pair] = previous + weight
+            if previous == 0 and weight > 0:
+                if edges.get(pair[::-1], 0) > 0 and pair[0] != pair[1]:
+                    reciprocal += 2
+                return 1
+            if previous > 0 and edges[pair] == 0:
+                del edges[pair]
+                if edges.get(pair[::-1], 0) > 0 and pair[0] != pair[1]:
+                    reciprocal -= 2
+                return -1
+            return 0
+
+        windows = []
+        for end, bucket in enumerate(self.slices):
+            appeared = disappeared = 0
+            records += bucket.records
+            to_count += bucket.to_count
+            cc_count += bucket.cc_count
+            activity.update(bucket.activity)
+            for pair, weight in bucket.edges.items():
+                appeared += add(pair, weight) == 1
+
+            leaving = end - window
+            if leaving >= 0:
+                old = self.slices[leaving]
+                records -= old.records
+                to_count -= old.to_count
+                cc_count -= old.cc_count
+                activity.subtract(old.activity)
+                for user in old.activity:
+                    if activity[user] <= 0:
+                        del activity[user]
+                for pair, weight in old.edges.items():
+                    disappeared += add(pair, -weight) == -1
+
+            first = max(0, end - window + 1)
+            windows.append({
+                "start": self._date(first),
+                "end": self._date(end + 1),
+                "slices": end - first + 1,
+                "messages": records,
+                "mentions": to_count + cc_count,
+                "to": to_count,
+                "cc": cc_count,
+                "active_users": len(activity),
+                "edges": len(edges),
+                "reciprocity": round(reciprocal / len(edges), 4) if edges else 0.0,
+                "new_edges": appeared,
+                "lost_edges": disappeared,
+                "top_users": [
+                    {"id": user, "name": names.get(user, user), "activity": count}
+                    for user, count in heapq.nlargest(TOP_USERS, activity.items(), key=lambda item: item[1])
+                ],
+            })
+
+        return {"unit": self.unit, "window": window, "windows": windows}
+
+    def _date(self, index: int) -> str:
+        return datetime.fromtimestamp(self.start_ts + index * self.slice_seconds).strftime("%Y-%m-%d")
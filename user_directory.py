@@ -0,0 +1,206 @@
+"""Slack ユーザーディレクトリ (表示名 + メールドメイン) の永続キャッシュ.
+
+users.list をページングして一括ロードし、表示名とメールドメインを
+TTL 付きで JSON ファイルに保存する。起動をまたいでキャッシュが有効なため、
+2 回目以降の実行ではほとんど API を呼ばない。キャッシュに無いユーザーだけ
+呼び出し側 (resolve_user) が users.info で個別に解決して put() する。
+
+ディスクに保存するのは表示名とメールのドメイン部分のみ (メールアドレス全体は保存しない)。
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# users.list / conversations.members の 1 ページあたり件数 (Slack 推奨上限)
+PAGE_LIMIT = 200
+
+
+def _direct_call(api_method, **kwargs):
+    return api_method(**kwargs)
+
+
+def _email_domain(email: str) -> str:
+    return email.split("@")[-1].lower() if email else ""
+
+
+class UserDirectory:
+    """user_id → (表示名, メールドメイン) のキャッシュ (スレッドセーフ)."""
+
+    def __init__(self, path: str | None = None, ttl_seconds: float = 24 * 3600):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.names: dict[str, str] = {}
+        self.domains: dict[str, str] = {}
+        self._fetched_at: dict[str, float] = {}
+        self._listed_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # 複数の分析ジョブからの同時保存を直列化
+        if path:
+            self.load()
+
+    # --- 永続化 -------------------------------------------------------------
+
+    def load(self):
+        """ディスクから読み込む (期限切れのエントリは捨てる)。"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            log.warning("ユーザーキャッシュを読み込めませんでした (%s): %s", self.path, e)
+            return
+
+        now = time.time()
+        with self._lock:
+            for user_id, entry in data.get("users", {}).items():
+                fetched_at = entry.get("fetched_at", 0)
+                if now - fetched_at > self.ttl_seconds:
+                    continue
+                self.names[user_id] = entry.get("name", "")
+                if entry.get("domain"):
+                    self.domains[user_id] = entry["domain"]
+                self._fetched_at[user_id] = fetched_at
+            self._listed_at = data.get("listed_at", 0)
+        log.info("ユーザーキャッシュ: %d 人を読み込み", len(self.names))
+
+    def save(self):
+        """ディスクに書き出す (一時ファイル経由で置き換え)。"""
+        if not self.path:
+            return
+        with self._lock:
+            data = {
+                "listed_at": self._listed_at,
+                "users": {
+                    user_id: {
+                        "name": name,
+                        "domain": self.domains.get(user_id, ""),
+                        "fetched_at": self._fetched_at.get(user_id, 0),
+                    }
+                    for user_id, name in self.names.items()
+                },
+            }
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with self._save_lock:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.warning("ユーザーキャッシュを保存できませんでした (%s): %s", self.path, e)
+
+    # --- 参照・更新 ---------------------------------------------------------
+
+    def _is_fresh(self, user_id: str, now: float) -> bool:
+        return now - self._fetched_at.get(user_id, 0) <= self.ttl_seconds
+
+    def get_name(self, user_id: str) -> str | None:
+        """TTL 内の表示名を返す。未登録・期限切れなら None。"""
+        with self._lock:
+            if user_id in self.names and self._is_fresh(user_id, time.time()):
+                self.hits += 1
+                return self.names[user_id]
+            self.misses += 1
+        return None
+
+    def put(self, user_id: str, name: str, email: str = ""):
+        with self._lock:
+            self.names[user_id] = name
+            domain = _email_domain(email)
+            if domain:
+                self.domains[user_id] = domain
+            self._fetched_at[user_id] = time.time()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self.names), "hits": self.hits, "misses": self.misses}
+
+    # --- 一括ロード ---------------------------------------------------------
+
+    def preload(self, client, channel_id: str | list[str] | None = None, api_call=_direct_call) -> int:
+        """users.list で一括ロードする。
+
+        channel_id (複数チャンネルならそのリスト) を渡すと conversations.members で
+        メンバーを取得し、全員がキャッシュ済み (TTL 内) であれば users.list を呼ばない。
+        channel_id なしの場合は前回の一括ロードが TTL 内なら何もしない。
+
+        Returns:
+            ロードしたユーザー数 (スキップ時は 0)
+        """
+        now = time.time()
+        if channel_id is not None:
+            channel_ids = [channel_id] if isinstance(channel_id, str) else channel_id
+            members = {
+                member for cid in channel_ids for member in self._channel_members(client, cid, api_call)
+            }
+            with self._lock:
+                missing = [m for m in members if not (m in self.names and self._is_fresh(m, now))]
+            if not missing:
+                log.info("ユーザーディレクトリ: チャンネルメンバー %d 人はすべてキャッシュ済み", len(members))
+                return 0
+        elif now - self._listed_at <= self.ttl_seconds:
+            return 0
+
+        loaded = 0
+        cursor = None
+        while True:
+            params = {"limit": PAGE_LIMIT}
+            if cursor:
+                params["cursor"] = cursor
+            response = api_call(client.users_list, **params)
+            for member in response.get("members", []):
+                user_id = member.get("id")
+                if not user_id:
+                    continue
+                name = member.get("real_name") or f"User {user_id}"
+                self.put(user_id, name, member.get("profile", {}).get("email", ""))
+                loaded += 1
+            cursor = response.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+
+        with self._lock:
+            self._listed_at = time.time()
+        log.info("ユーザーディレクトリ: users.list で %d 人をロード", loaded)
+        self.save()
+        return loaded
+
+    @staticmethod
+    def _channel_members(client, channel_id: str, api_call) -> list[str]:
+        members = []
+        cursor = None
+        while True:
+            params = {"channel": channel_id, "limit": PAGE_LIMIT}
+            if cursor:
+                params["cursor"] = cursor
+            response = api_call(client.conversations_members, **params)
+            members.extend(response.get("members", []))
+            cursor = response.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                break
+        return members
+
+
+def open_directory_from_env(default_dir: str) -> UserDirectory:
+    """環境変数からユーザーディレクトリを作成する。
+
+    MENTION_MAP_USER_CACHE            (str)   キャッシュファイルのパス ("off" で永続化しない)
+    MENTION_MAP_USER_CACHE_TTL_HOURS  (float) キャッシュの有効期間 (時間)
+    """
+    path = os.environ.get("MENTION_MAP_USER_CACHE", os.path.join(default_dir, "users.json")).strip()
+    if path.lower() in ("", "off"):
+        path = None
+    try:
+        ttl_hours = float(os.environ.get("MENTION_MAP_USER_CACHE_TTL_HOURS", "24"))
+    except ValueError:
+        log.warning("Invalid value for MENTION_MAP_USER_CACHE_TTL_HOURS")
+        ttl_hours = 24.0
+    return UserDirectory(path, ttl_hours * 3600)
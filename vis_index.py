@@ -0,0 +1,217 @@
+"""vis.js 用 JSON の索引 (サーバー側のフィルタ・ページング・ego グラフ).
+
+分析結果 1 件につき 1 回だけ構築し、ダッシュボードの部分取得に使う:
+  - ノードは活動量 (sent + received + cc_count) の降順、エッジは重みの降順で並べておく
+  - ノードごとの出・入エッジ、コミュニティごとのノードを索引化
+  - ego グラフ (k ホップ近傍) と絞り込み結果は小さな LRU に EncodedBody で保持
+    (件数とバイト数の両方に上限。size で索引と LRU のおおよそのメモリ量を返す)
+
+ノード・エッジの dict は vis_data のものをそのまま参照する (コピーしない)。
+"""
+
+import itertools
+import json
+import sys
+import threading
+from collections import OrderedDict
+
+from result_cache import EncodedBody, encode_body
+
+# ego グラフの最大ホップ数
+MAX_HOPS = 3
+# 絞り込み・ego の結果を保持する件数
+RESPONSE_CACHE_SIZE = 64
+# 絞り込み・ego の結果を保持する合計バイト数 (raw + gzip)
+RESPONSE_CACHE_BYTES = 8 * 1024 * 1024
+
+
+class VisIndex:
+    """generate_vis_data の結果に対する索引 (読み取り専用・スレッドセーフ)."""
+
+    def __init__(self, vis_data: dict, meta: dict | None = None):
+        # meta: channel_name / days / timestamp など、すべての応答に付ける値
+        self.meta = dict(meta or {})
+        self.communities = vis_data.get("communities", [])
+        self.analysis = vis_data.get("analysis", {})
+        self.wordcloud_data = vis_data.get("wordcloud_data", [])
+        self.nodes = sorted(
+            vis_data.get("nodes", []),
+            key=lambda n: n.get("sent", 0) + n.get("received", 0) + n.get("cc_count", 0),
+            reverse=True,
+        )
+        self.edges = sorted(vis_data.get("edges", []), key=lambda e: e["weight"], reverse=True)
+        self.node_by_id = {n["id"]: n for n in self.nodes}
+        self.node_rank = {n["id"]: i for i, n in enumerate(self.nodes)}
+
+        # 隣接索引 (エッジは重みの降順のまま)
+        self.out_edges: dict[str, list[dict]] = {}
+        self.in_edges: dict[str, list[dict]] = {}
+        for edge in self.edges:
+            self.out_edges.setdefault(edge["from"], []).append(edge)
+            self.in_edges.setdefault(edge["to"], []).append(edge)
+
+        self.community_nodes: dict[int, list[dict]] = {}
+        for node in self.nodes:
+            self.community_nodes.setdefault(node.get("community", 0), []).append(node)
+
+        self._responses: OrderedDict[tuple, EncodedBody] = OrderedDict()
+        self._response_bytes = 0
+        self._lock = threading.Lock()
+        # 索引の入れ物 (list / dict) 自体の大きさ。ノード・エッジの dict は vis_data と共有なので数えない
+        containers = [self.nodes, self.edges, self.node_by_id, self.node_rank,
+                      self.out_edges, self.in_edges, self.community_nodes]
+        containers += [*self.out_edges.values(), *self.in_edges.values(), *self.community_nodes.values()]
+        self._index_bytes = sum(sys.getsizeof(c) for c in containers)
+
+    @property
+    def size(self) -> int:
+        """索引と応答キャッシュのおおよそのバイト数 (ResultCache の max_bytes に算入する)."""
+        with self._lock:
+            return self._index_bytes + self._response_bytes
+
+    # --- 応答キャッシュ -----------------------------------------------------
+
+    def _cached(self, key: tuple, build) -> EncodedBody:
+        with self._lock:
+            body = self._responses.get(key)
+            if body is not None:
+                self._responses.move_to_end(key)
+                return body
+        body = encode_body(json.dumps(build(), ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            previous = self._responses.pop(key, None)
+            if previous is not None:
+                self._response_bytes -= previous.size
+            self._responses[key] = body
+            self._response_bytes += body.size
+            # 最新の 1 件は上限を超えていても残す
+            while len(self._responses) > 1 and (
+                len(self._responses) > RESPONSE_CACHE_SIZE or self._response_bytes > RESPONSE_CACHE_BYTES
+            ):
+                _, evicted = self._responses.popitem(last=False)
+                self._response_bytes -= evicted.size
+        return body
+
+    # --- 絞り込み・ページング -----------------------------------------------
+
+    def query(
+        self, min_weight: float = 0, community: int | None = None,
+        node_offset: int = 0, node_limit: int | None = None,
+        edge_offset: int = 0, edge_limit: int | None = None,
+    ) -> EncodedBody:
+        """条件に合うノード・エッジの 1 ページを返す。
+
+        - community: そのコミュニティのノードと、その内部のエッジに限定
+        - min_weight: 重み (to + cc) がこれ未満のエッジを除外
+        - ノードは活動量の降順でページングし、エッジは返すノード同士のものを重みの降順でページングする
+        """
+        key = ("query", min_weight, community, node_offset, node_limit, edge_offset, edge_limit)
+        return self._cached(key, lambda: self._query(
+            min_weight, community, node_offset, node_limit, edge_offset, edge_limit,
+        ))
+
+    def _query(self, min_weight, community, node_offset, node_limit, edge_offset, edge_limit):
+        return {
+            **self.meta,
+            "communities": self.communities,
+            "analysis": self.analysis,
+            "wordcloud_data": self.wordcloud_data,
+            **self.page(min_weight, community, node_offset, node_limit, edge_offset, edge_limit),
+        }
+
+    def page(
+        self, min_weight: float = 0, community: int | None = None,
+        node_offset: int = 0, node_limit: int | None = None,
+        edge_offset: int = 0, edge_limit: int | None = None,
+    ) -> dict:
+        """query の nodes / edges / page 部分だけを dict で返す (エンコード・キャッシュしない)."""
+        candidates = self.nodes if community is None else self.community_nodes.get(community, [])
+        node_end = None if node_limit is None else node_offset + node_limit
+        page_nodes = candidates[node_offset:node_end]
+
+        if community is None and node_offset == 0 and node_limit is None:
+            edges = [e for e in self.edges if e["weight"] >= min_weight]
+        else:
+            selected = {n["id"] for n in page_nodes}
+            edges = [
+                e for e in self.edges
+                if e["weight"] >= min_weight and e["from"] in selected and e["to"] in selected
+            ]
+        edge_end = None if edge_limit is None else edge_offset + edge_limit
+
+        return {
+            "nodes": page_nodes,
+            "edges": edges[edge_offset:edge_end],
+            "page": {
+                "node_offset": node_offset,
+                "node_limit": node_limit,
+                "matched_nodes": len(candidates),
+                "edge_offset": edge_offset,
+                "edge_limit": edge_limit,
+                "matched_edges": len(edges),
+            },
+        }
+
+    # --- ego グラフ ---------------------------------------------------------
+
+    def ego(self, user_id: str, hops: int = 1, min_weight: float = 0) -> EncodedBody | None:
+        """user_id から hops ホップ以内のノードとエッジ、サイドパネル用の接続一覧を返す。
+
+        未知の user_id なら None。
+        """
+        if user_id not in self.node_by_id:
+            return None
+        hops = max(1, min(MAX_HOPS, hops))
+        return self._cached(("ego", user_id, hops, min_weight), lambda: self._ego(user_id, hops, min_weight))
+
+    def _incident(self, node_id, min_weight):
+        for edge in itertools.chain(self.out_edges.get(node_id, ()), self.in_edges.get(node_id, ())):
+            if edge["weight"] >= min_weight:
+                yield edge
+
+    def _ego(self, user_id, hops, min_weight):
+        # 向きを無視した幅優先探索。内側 (距離 < hops) のノードに接するエッジを集める
+        # (hops=1 なら中心ノードの接続エッジ)
+        distance = {user_id: 0}
+        frontier = [user_id]
+        edges = []
+        seen = set()
+        for depth in range(1, hops + 1):
+            next_frontier = []
+            for node_id in frontier:
+                for edge in self._incident(node_id, min_weight):
+                    if id(edge) not in seen:
+                        seen.add(id(edge))
+                        edges.append(edge)
+                    peer = edge["to"] if edge["from"] == node_id else edge["from"]
+                    if peer not in distance:
+                        distance[peer] = depth
+                        next_frontier.append(peer)
+            frontier = next_frontier
+        edges.sort(key=lambda e: e["weight"], reverse=True)
+
+        def connection(edge, peer_key, count):
+            peer = edge[peer_key]
+            return {"email": peer, "name": self.node_by_id.get(peer, {}).get("name", peer), "count": count}
+
+        out_edges = [e for e in self.out_edges.get(user_id, ()) if e["weight"] >= min_weight]
+        in_edges = [e for e in self.in_edges.get(user_id, ()) if e["weight"] >= min_weight]
+        connections = {
+            "to": sorted(
+                (connection(e, "to", e["to_weight"]) for e in out_edges if e["to_weight"] > 0),
+                key=lambda c: c["count"], reverse=True,
+            ),
+            "cc": sorted(
+                (connection(e, "to", e["cc_weight"]) for e in out_edges if e["cc_weight"] > 0),
+                key=lambda c: c["count"], reverse=True,
+            ),
+            "from": [connection(e, "from", e["weight"]) for e in in_edges],
+        }
+
+        return {
+            "center": user_id,
+            "hops": hops,
+            "nodes": sorted((self.node_by_id[n] for n in distance), key=lambda n: self.node_rank[n["id"]]),
+            "edges": edges,
+            "connections": connections,
+        }